@@ -0,0 +1,202 @@
+from array import array
+import sys
+from cache import LRUCache
+from repositories import get_repository
+from models import Question, Result
+
+# NumPy is optional; without it the same passes run over array.array buffers. It is
+# imported on first use so worker start-up does not pay for it.
+np = None
+_numpy_checked = False
+
+def _load_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+        _numpy_checked = True
+    return np
+
+# Option letters in the order of their indexes; -1 marks an unanswered question
+OPTION_FIELDS = ('option_a', 'option_b', 'option_c', 'option_d')
+UNANSWERED = -1
+
+# Share of attempts in each of the top and bottom groups for the discrimination index
+DISCRIMINATION_GROUP = 0.27
+
+# Rows read per fetch while loading answers
+LOAD_BATCH_SIZE = 5000
+
+# Computed analytics keyed by (bank version, total quizzes)
+_analytics_cache = LRUCache(maxsize=4)
+
+def pack_attempt(question_ids, answer_indexes):
+    """Pack question IDs and chosen option indexes into compact BLOBs for the results table
+
+    IDs are stored as little-endian uint32 and answers as one signed byte each.
+    """
+    ids = array('I', question_ids)
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids.tobytes(), array('b', answer_indexes).tobytes()
+
+def unpack_attempt(ids_blob, answers_blob):
+    """Inverse of pack_attempt"""
+    ids = array('I')
+    ids.frombytes(ids_blob)
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    answers = array('b')
+    answers.frombytes(answers_blob)
+    return ids, answers
+
+def option_index(question, answer):
+    """Index of the option an answer picked, or UNANSWERED"""
+    for i, field in enumerate(OPTION_FIELDS):
+        if question[field] == answer:
+            return i
+    return UNANSWERED
+
+def load_answers():
+    """Read every stored attempt as (percentages, ids_blobs, answers_blobs)"""
+    percentages = []
+    id_blobs = []
+    answer_blobs = []
+    for percentage, ids_blob, answers_blob in get_repository().iter_answers(LOAD_BATCH_SIZE):
+        percentages.append(percentage)
+        id_blobs.append(ids_blob)
+        answer_blobs.append(answers_blob)
+    return percentages, id_blobs, answer_blobs
+
+def _group_cutoffs(percentages):
+    """Attempt percentages at or below which attempts are in the bottom group, and at or above the top"""
+    ordered = sorted(percentages)
+    k = max(1, int(len(ordered) * DISCRIMINATION_GROUP))
+    return ordered[k - 1], ordered[-k]
+
+def _compute_numpy(questions, percentages, id_blobs, answer_blobs):
+    n = len(questions)
+    bank_ids = np.array([q['id'] for q in questions], dtype=np.int64)
+    correct = np.array([option_index(q, q['correct_ans']) for q in questions], dtype=np.int8)
+    order = np.argsort(bank_ids)
+
+    # One long column per field, one entry per answer across every attempt
+    lengths = np.fromiter((len(blob) for blob in answer_blobs), dtype=np.int64, count=len(answer_blobs))
+    ids = np.frombuffer(b''.join(id_blobs), dtype='<u4').astype(np.int64)
+    chosen = np.frombuffer(b''.join(answer_blobs), dtype=np.int8)
+    attempt_pct = np.repeat(np.asarray(percentages, dtype=np.float64), lengths)
+
+    # Map question IDs to rows of the bank and drop answers to deleted questions
+    slots = np.searchsorted(bank_ids, ids, sorter=order).clip(0, n - 1)
+    item = order[slots]
+    known = bank_ids[item] == ids
+    item, chosen, attempt_pct = item[known], chosen[known], attempt_pct[known]
+    is_correct = ((chosen == correct[item]) & (chosen != UNANSWERED)).astype(np.float64)
+
+    attempts = np.bincount(item, minlength=n)
+    correct_counts = np.bincount(item, weights=is_correct, minlength=n)
+    # Column 0 counts unanswered questions, columns 1-4 the options
+    option_counts = np.bincount(item * 5 + (chosen.astype(np.int64) + 1), minlength=n * 5).reshape(n, 5)
+
+    low_cut, high_cut = _group_cutoffs(percentages)
+    group_rates = []
+    for mask in (attempt_pct >= high_cut, attempt_pct <= low_cut):
+        counts = np.bincount(item[mask], minlength=n)
+        hits = np.bincount(item[mask], weights=is_correct[mask], minlength=n)
+        group_rates.append(np.divide(hits, counts, out=np.full(n, np.nan), where=counts > 0))
+    discrimination = group_rates[0] - group_rates[1]
+
+    return attempts.tolist(), correct_counts.tolist(), option_counts.tolist(), discrimination.tolist()
+
+def _compute_arrays(questions, percentages, id_blobs, answer_blobs):
+    n = len(questions)
+    slot = {q['id']: i for i, q in enumerate(questions)}
+    correct = [option_index(q, q['correct_ans']) for q in questions]
+    low_cut, high_cut = _group_cutoffs(percentages)
+
+    attempts = array('l', [0]) * n
+    correct_counts = array('l', [0]) * n
+    option_counts = array('l', [0]) * (n * 5)
+    # Answers and hits in the top and bottom groups
+    groups = [array('l', [0]) * n for _ in range(4)]
+
+    for percentage, ids_blob, answers_blob in zip(percentages, id_blobs, answer_blobs):
+        top = percentage >= high_cut
+        bottom = percentage <= low_cut
+        ids, chosen = unpack_attempt(ids_blob, answers_blob)
+        for question_id, option in zip(ids, chosen):
+            i = slot.get(question_id)
+            if i is None:
+                continue
+            hit = option == correct[i] and option != UNANSWERED
+            attempts[i] += 1
+            correct_counts[i] += hit
+            option_counts[i * 5 + option + 1] += 1
+            if top:
+                groups[0][i] += 1
+                groups[1][i] += hit
+            if bottom:
+                groups[2][i] += 1
+                groups[3][i] += hit
+
+    discrimination = []
+    for i in range(n):
+        if groups[0][i] and groups[2][i]:
+            discrimination.append(groups[1][i] / groups[0][i] - groups[3][i] / groups[2][i])
+        else:
+            discrimination.append(float('nan'))
+    rows = [option_counts[i * 5:(i + 1) * 5].tolist() for i in range(n)]
+    return attempts.tolist(), correct_counts.tolist(), rows, discrimination
+
+def compute_item_analysis(questions, percentages, id_blobs, answer_blobs):
+    """Item statistics for each question over the given attempts
+
+    difficulty     -- share of answers that were correct (the item's p-value)
+    discrimination -- correct rate in the top 27% of attempts minus the bottom 27%
+    option_rates   -- share of answers picking each option, and unanswered
+    """
+    if not questions:
+        return []
+    if percentages:
+        compute = _compute_numpy if _load_numpy() is not None else _compute_arrays
+        attempts, correct_counts, option_counts, discrimination = compute(
+            questions, percentages, id_blobs, answer_blobs
+        )
+    else:
+        attempts = correct_counts = [0] * len(questions)
+        option_counts = [[0] * 5 for _ in questions]
+        discrimination = [float('nan')] * len(questions)
+
+    items = []
+    for i, question in enumerate(questions):
+        answered = attempts[i]
+        rates = [count / answered if answered else 0.0 for count in option_counts[i]]
+        d = discrimination[i]
+        items.append({
+            'id': question['id'],
+            'question': question['question'],
+            'category': question['category'],
+            'correct_option': option_index(question, question['correct_ans']),
+            'attempts': int(answered),
+            'difficulty': correct_counts[i] / answered if answered else None,
+            'discrimination': None if d != d else round(d, 3),
+            'option_rates': rates[1:],
+            'unanswered_rate': rates[0],
+        })
+    return items
+
+def get_item_analysis():
+    """Item statistics for every question in the bank over all stored attempts
+
+    Cached until a question changes or a new result is saved.
+    """
+    bank = Question.get_bank()
+    key = (bank.version, Result.get_stats()['total_quizzes'])
+    items = _analytics_cache.get(key)
+    if items is None:
+        items = compute_item_analysis(bank.questions, *load_answers())
+        _analytics_cache.set(key, items)
+    return items
@@ -1,41 +1,124 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import sqlite3
-import os
-from werkzeug.security import generate_password_hash, check_password_hash
-import datetime
-from functools import wraps
+import hmac
+from flask import Flask, abort, render_template, request, session
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Import routes
 from routes.auth import auth_bp
 from routes.quiz import quiz_bp
 from routes.admin import admin_bp
+from routes.api import api_bp
 
-# Create Flask app
-app = Flask(__name__)
-app.secret_key = os.urandom(24)  # Set a secure secret key for sessions
+from config import load_config
+from sessions import init_sessions
+from sampling import QuizConfig
+from commands import register_commands
+import database
+import repositories
+import writer
+import security
+import instrumentation
+import caching
+import finalizer
+import events
+import assets
 
-# Register blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(quiz_bp)
-app.register_blueprint(admin_bp)
+def create_app(config=None):
+    """Create the Flask app; config overrides the Config defaults
 
-# Initialize database
-from database import init_db
-init_db()
+    Creating the app opens no database connections and starts no threads
+    beyond one read-only schema check, so it is cheap in every worker and
+    safe to run before forking (gunicorn --preload). With AUTO_MIGRATE off
+    the schema is only created or upgraded by 'flask init-db'.
+    """
+    app = Flask(__name__)
 
-# Root route
-@app.route('/')
-def index():
-    return render_template('index.html')
+    # Load settings; the session signing keys come from QUIZ_SECRET_KEY or QUIZ_SECRET_KEY_FILE
+    load_config(app, config)
 
-# Error handlers
-@app.errorhandler(404)
-def page_not_found(e):
-    return render_template('error.html', error="404 - Page Not Found"), 404
+    # Quiz quotas that do not fit QUIZ_SIZE fail here rather than on the first quiz
+    QuizConfig.from_mapping(app.config)
 
-@app.errorhandler(500)
-def internal_server_error(e):
-    return render_template('error.html', error="500 - Internal Server Error"), 500
+    # Take the client address and scheme from the headers of trusted proxies
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
+
+    # Use the session backend named by SESSION_BACKEND
+    init_sessions(app)
+
+    # Password hashing pool and login limits
+    security.init_app(app)
+
+    # Time SQL statements per request; set up before the first database connection is opened
+    instrumentation.init_app(app)
+
+    # Fingerprinted static files from 'flask build-assets' (read once, at start-up)
+    assets.init_app(app)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(quiz_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+
+    # Database settings and results backend, and the schema on first run
+    database.init_app(app)
+    writer.init_app(app)
+    repositories.init_app(app)
+    if app.config['AUTO_MIGRATE']:
+        database.ensure_schema()
+        repositories.get_repository().ensure_schema()
+    elif not database.schema_is_current():
+        app.logger.warning("The database schema is out of date; run 'flask init-db'")
+
+    # Close timed attempts whose quiz takers never submitted (started with the first request)
+    finalizer.init_app(app)
+
+    # Apply new attempt events to the tables built from them (started with the first request)
+    events.init_app(app)
+
+    # Register command line commands
+    register_commands(app)
+
+    # Root route
+    @app.route('/')
+    @caching.cached_page('pages', lambda: (bool(session.get('user_id')), bool(session.get('is_admin'))))
+    def index():
+        return render_template('index.html')
+
+    # Request instrumentation
+    @app.before_request
+    def start_request_timing():
+        if app.config['INSTRUMENTATION']:
+            instrumentation.start_request(request.endpoint)
+
+    @app.after_request
+    def add_server_timing(response):
+        if app.config['INSTRUMENTATION']:
+            instrumentation.finish_request(response, request.endpoint, request.method)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        # Counters of this worker process in the Prometheus text format, for scrapers with the token
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        credentials = request.authorization
+        if (credentials is None or credentials.type != 'bearer'
+                or not hmac.compare_digest((credentials.token or '').encode(), token.encode())):
+            return 'Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}
+        return instrumentation.metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    # Error handlers
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return render_template('error.html', error="404 - Page Not Found"), 404
+
+    @app.errorhandler(500)
+    def internal_server_error(e):
+        return render_template('error.html', error="500 - Internal Server Error"), 500
+
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+import caching
+
+# Files under static/ that get fingerprinted copies
+ASSET_SOURCES = ('css/style.css', 'js/main.js')
+
+# Build output under static/ and its manifest (the same format as Vite's build manifest)
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Hex digits of the content hash put in file names
+HASH_LENGTH = 10
+
+# Names of fingerprinted files, as build_assets writes them (the precompressed
+# variants and the manifest do not match)
+FINGERPRINTED = re.compile(rf'[^/]+\.[0-9a-f]{{{HASH_LENGTH}}}\.[A-Za-z0-9]+')
+
+# Fingerprinted files never change, so browsers keep them for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants in order of preference, as (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Manifest of the current build, read by init_app; empty until 'flask build-assets' has run
+_manifest = {}
+
+def load_brotli():
+    # Brotli is optional; without it only gzip variants are built
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+def _write(path, data):
+    # Write next to the target and rename, so running workers never serve a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as output:
+        output.write(data)
+    os.replace(tmp_path, path)
+
+def build_assets(static_folder, sources=ASSET_SOURCES):
+    """Write content-hashed, precompressed copies of the sources and their manifest
+
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy can still load them. Returns the manifest.
+    """
+    build_dir = os.path.join(static_folder, BUILD_DIR)
+    brotli = load_brotli()
+    manifest = {}
+    for source in sources:
+        with open(os.path.join(static_folder, source), 'rb') as source_file:
+            data = source_file.read()
+
+        stem, extension = os.path.splitext(source)
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{extension}"
+        path = os.path.join(build_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, data)
+        # mtime=0 makes the gzip output the same on every build
+        _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[source] = {'file': name, 'src': source}
+
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+def load_manifest(static_folder):
+    """Read the build manifest, or an empty one if the assets were never built"""
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+def asset_url(filename):
+    """URL of a static file: its fingerprinted build if there is one, else the plain static URL
+
+    In debug mode the plain file is always used, so edits show up without a rebuild.
+    """
+    entry = None if current_app.debug else _manifest.get(filename)
+    if entry:
+        return url_for('asset', filename=entry['file'])
+    return url_for('static', filename=filename)
+
+def serve_asset(filename):
+    """Serve a fingerprinted file, precompressed when the client accepts it
+
+    Files of earlier builds are served too; anything else under the build
+    directory is not, since it would be cached as immutable.
+    """
+    if not FINGERPRINTED.fullmatch(os.path.basename(filename)):
+        abort(404)
+    directory = os.path.join(current_app.static_folder, BUILD_DIR)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(directory, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_app(app):
+    """Serve built assets under /assets and add asset_url() to the templates"""
+    global _manifest
+    _manifest = load_manifest(app.static_folder)
+    caching.set_asset_manifest(_manifest)
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(asset_url)
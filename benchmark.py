@@ -0,0 +1,332 @@
+"""Benchmark the quiz flow end to end with Flask's test client
+
+Usage: python benchmark.py [--users N] [--questions M] [--results R] [--output bench.json]
+                           [--compare previous.json] [--results-backend sqlite|sharded]
+
+Builds a throwaway database with synthetic users, questions and results,
+then drives the real request flow (login, start quiz, answer every
+question, result page, admin dashboard and results pages) and reports
+latency percentiles, throughput, SQL statements per request and peak RSS.
+It also times saving results from many threads at once, the write path
+that --results-backend changes; run it once per backend to compare.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Statements run by the current thread, counted by the SQLite trace callback
+_counter = threading.local()
+
+PASSWORD = 'benchmark'
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def count_queries():
+    """Count the statements each thread runs on the app's database connections"""
+    import database
+
+    def trace(statement):
+        # Statements run by triggers are reported as comments; they belong to the statement that fired them
+        if not statement.startswith('--'):
+            _counter.queries = getattr(_counter, 'queries', 0) + 1
+
+    connect = database.get_db_connection
+
+    def get_db_connection(path=None):
+        conn = connect(path)
+        conn.set_trace_callback(trace)
+        return conn
+
+    database.get_db_connection = get_db_connection
+
+def generate_data(users, questions, results, seed):
+    """Fill the database with synthetic users, questions and results"""
+    from database import get_db_connection
+    from models import Question
+    from repositories import get_repository, result_row
+    from security import hash_password
+
+    rng = random.Random(seed)
+    password_hash = hash_password(PASSWORD)
+    categories = ['Science', 'History', 'Geography', 'Maths', 'Literature']
+    difficulties = ['easy', 'medium', 'hard']
+
+    Question.bulk_create([
+        (
+            f"Synthetic question {i}?",
+            f"Option A{i}", f"Option B{i}", f"Option C{i}", f"Option D{i}",
+            f"Option {rng.choice('ABCD')}{i}",
+            rng.choice(categories), rng.choice(difficulties)
+        )
+        for i in range(questions)
+    ])
+
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+        ((f"User {i}", f"user{i}@bench.test", password_hash) for i in range(users))
+    )
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE is_admin = 0")]
+
+    start = datetime.datetime(2024, 1, 1)
+    rows = []
+    for _ in range(results):
+        total = rng.randint(5, 20)
+        quiz_date = start + datetime.timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        rows.append(result_row(
+            rng.choice(user_ids), rng.randint(0, total), total, quiz_date=quiz_date.strftime('%Y-%m-%d %H:%M:%S')
+        ))
+    conn.commit()
+    conn.close()
+    get_repository().add(rows)
+
+class Recorder:
+    """Collects latency and statement counts per endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def request(self, client, name, method, url, **kwargs):
+        _counter.queries = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+        with self._lock:
+            self.samples.setdefault(name, []).append((elapsed, _counter.queries))
+        return response
+
+    def report(self):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = [elapsed * 1000 for elapsed, _ in samples]
+            endpoints[name] = {
+                'requests': len(samples),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_per_request': round(sum(q for _, q in samples) / len(samples), 2),
+            }
+        return endpoints
+
+def take_quiz(app, recorder, email):
+    """Log in as a user and take one whole quiz"""
+    client = app.test_client()
+    recorder.request(client, 'auth.login', 'POST', '/login', data={'email': email, 'password': PASSWORD})
+    recorder.request(client, 'quiz.start_quiz', 'GET', '/start-quiz')
+
+    response = recorder.request(client, 'quiz.question GET', 'GET', '/question')
+    while response.status_code == 200:
+        html = response.get_data(as_text=True)
+        question_id = re.search(r'name="question_id" value="(\d+)"', html).group(1)
+        answer = re.search(r'name="answer" value="([^"]*)"', html).group(1)
+        response = recorder.request(
+            client, 'quiz.question POST', 'POST', '/question',
+            data={'question_id': question_id, 'answer': answer}, follow_redirects=False
+        )
+        if response.status_code == 200:
+            continue
+        # The last answer redirects to the result page
+        if response.headers['Location'].endswith('/result'):
+            break
+        response = recorder.request(client, 'quiz.question GET', 'GET', '/question')
+
+    recorder.request(client, 'quiz.result', 'GET', '/result')
+
+def browse_admin(app, recorder, pages):
+    """Log in as the admin and load the dashboard and results pages"""
+    client = app.test_client()
+    recorder.request(client, 'auth.login', 'POST', '/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    for _ in range(pages):
+        recorder.request(client, 'admin.dashboard', 'GET', '/admin')
+        response = recorder.request(client, 'admin.results', 'GET', '/admin/results')
+        # Follow the "Older" link once to include a keyset page
+        match = re.search(r'href="([^"]*/admin/results\?[^"]*cursor=[^"]*)"', response.get_data(as_text=True))
+        if match:
+            recorder.request(client, 'admin.results', 'GET', match.group(1).replace('&amp;', '&'))
+
+def measure_result_writes(writes, threads, seed):
+    """Time saving results one commit each from several threads at once"""
+    from database import get_db_connection
+    from models import Result
+
+    conn = get_db_connection()
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE is_admin = 0")]
+    conn.close()
+
+    rng = random.Random(seed)
+    rows = [(rng.choice(user_ids), rng.randint(0, 10), 10) for _ in range(writes)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda row: Result.save(*row), rows))
+    seconds = time.perf_counter() - started
+    return {
+        'writes': writes,
+        'threads': threads,
+        'seconds': round(seconds, 3),
+        'writes_per_second': round(writes / seconds, 1) if seconds else 0,
+    }
+
+# Run in a fresh interpreter: import the app and create it, as a worker does on start
+STARTUP_SCRIPT = (
+    "import time; started = time.perf_counter(); import app; app.create_app(); "
+    "print(time.perf_counter() - started)"
+)
+
+def measure_startup(runs):
+    """Time worker cold start (import and create_app) against the benchmark database"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True, cwd=here
+        ).stdout
+        times.append(float(output.split()[-1]) * 1000)
+    return {
+        'runs': runs,
+        'p50_ms': round(percentile(times, 50), 2),
+        'max_ms': round(max(times), 2),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(report, previous_path):
+    """Print the change in p95 latency and statements per request against an earlier run"""
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    print(f"\nCompared with {previous_path} ({previous.get('commit') or 'unknown commit'}):")
+    for name, stats in report['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        print(f"  {name:<22} p95 {before['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms ({change:+.1f}%)"
+              f"  queries {before['queries_per_request']} -> {stats['queries_per_request']}")
+    if report.get('result_writes') and previous.get('result_writes'):
+        print(f"  {'result writes':<22} {previous['result_writes']['writes_per_second']:>13.1f} -> "
+              f"{report['result_writes']['writes_per_second']:>9.1f} writes/s "
+              f"({previous.get('parameters', {}).get('results_backend', 'sqlite')} -> {report['parameters']['results_backend']})")
+    if report.get('startup') and previous.get('startup'):
+        print(f"  {'cold start':<22} p50 {previous['startup']['p50_ms']:>9.2f} -> {report['startup']['p50_ms']:>9.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='synthetic users (default 50)')
+    parser.add_argument('--questions', type=int, default=500, help='synthetic questions (default 500)')
+    parser.add_argument('--results', type=int, default=10000, help='synthetic past results (default 10000)')
+    parser.add_argument('--quizzes', type=int, default=50, help='quizzes to take (default 50)')
+    parser.add_argument('--quiz-size', type=int, default=10, help='questions per quiz (default 10)')
+    parser.add_argument('--admin-pages', type=int, default=50, help='admin page rounds (default 50)')
+    parser.add_argument('--concurrency', type=int, default=1, help='clients running at once (default 1)')
+    parser.add_argument('--startup-runs', type=int, default=5, help='worker cold starts to time (default 5)')
+    parser.add_argument('--results-backend', choices=['sqlite', 'sharded'], default='sqlite',
+                        help='where results are stored (default sqlite)')
+    parser.add_argument('--results-shards', type=int, default=4, help='shards for --results-backend sharded (default 4)')
+    parser.add_argument('--result-writes', type=int, default=2000, help='results saved in the write test (default 2000)')
+    parser.add_argument('--write-threads', type=int, default=8, help='threads saving results at once (default 8)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the synthetic data')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='quiz-bench-')
+    # Settings are read when config is imported, so they have to be in place first
+    os.environ['QUIZ_DATABASE'] = os.path.join(workdir, 'bench.db')
+    os.environ['QUIZ_SIZE'] = str(args.quiz_size)
+    os.environ['QUIZ_RESULTS_BACKEND'] = args.results_backend
+    os.environ['QUIZ_RESULTS_SHARDS'] = str(args.results_shards)
+    os.environ.setdefault('QUIZ_SECRET_KEY', 'benchmark')
+    # Every simulated user logs in from the same address
+    os.environ['QUIZ_LOGIN_IP_BURST'] = str(10 ** 9)
+    os.environ['QUIZ_LOGIN_IP_PER_MINUTE'] = str(10 ** 9)
+
+    try:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        count_queries()
+        from app import create_app
+        app = create_app()
+
+        setup_started = time.perf_counter()
+        generate_data(args.users, args.questions, args.results, args.seed)
+        setup_seconds = time.perf_counter() - setup_started
+        startup = measure_startup(args.startup_runs) if args.startup_runs else None
+
+        recorder = Recorder()
+        emails = [f"user{i % args.users}@bench.test" for i in range(args.quizzes)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            jobs = [executor.submit(take_quiz, app, recorder, email) for email in emails]
+            jobs.append(executor.submit(browse_admin, app, recorder, args.admin_pages))
+            for job in jobs:
+                job.result()
+        seconds = time.perf_counter() - started
+        result_writes = measure_result_writes(args.result_writes, args.write_threads, args.seed) if args.result_writes else None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    endpoints = recorder.report()
+    requests = sum(stats['requests'] for stats in endpoints.values())
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': vars(args),
+        'setup_seconds': round(setup_seconds, 3),
+        'startup': startup,
+        'result_writes': result_writes,
+        'requests': requests,
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(requests / seconds, 1) if seconds else 0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'endpoints': endpoints,
+    }
+
+    print(f"{'endpoint':<22} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for name, stats in endpoints.items():
+        print(f"{name:<22} {stats['requests']:>8} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['queries_per_request']:>8}")
+    print(f"\n{requests} requests in {seconds:.2f}s ({report['requests_per_second']} req/s), "
+          f"peak RSS {report['peak_rss_kb'] / 1024:.1f} MB")
+    if result_writes:
+        print(f"Result writes ({args.results_backend}): {result_writes['writes_per_second']} writes/s "
+              f"from {result_writes['threads']} threads")
+    if startup:
+        print(f"Worker cold start (import + create_app): p50 {startup['p50_ms']:.1f} ms, "
+              f"max {startup['max_ms']:.1f} ms over {startup['runs']} runs")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import threading
+import time
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache for process-local data"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove a value from the cache"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Remove every cached value"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class TTLCache(LRUCache):
+    """LRU cache whose entries also expire a fixed number of seconds after they are set"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return default
+        return value
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+    def pop(self, key, default=None):
+        entry = super().pop(key)
+        return default if entry is None else entry[1]
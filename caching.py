@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from functools import wraps
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+from cache import LRUCache
+import models
+
+# Rendered pages and fragments, one cache per kind of data they show so a write
+# only drops the entries that depend on it
+_caches = {
+    'pages': LRUCache(maxsize=64),
+    'questions': LRUCache(maxsize=64),
+    'results': LRUCache(maxsize=2048),
+}
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+def _build_id(manifest=None):
+    # Changes whenever a template is edited or the assets are rebuilt, and is the same
+    # in every worker of a deploy; file contents and relative paths are hashed rather
+    # than mtimes, which differ between hosts that checked out the same release
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(TEMPLATE_DIR)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, TEMPLATE_DIR).encode() + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    if manifest:
+        digest.update(json.dumps(manifest, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+BUILD_ID = _build_id()
+
+def set_asset_manifest(manifest):
+    """Make ETags change with the asset build that pages link to (see assets.py)"""
+    global BUILD_ID
+    BUILD_ID = _build_id(manifest)
+
+def invalidate(namespace):
+    """Drop every cached page and fragment built from one kind of data"""
+    _caches[namespace].clear()
+
+# Question and result writes in this process drop their entries at once; other
+# processes see the new bank or results version in the cache keys instead
+models.on_write('questions', lambda: invalidate('questions'))
+models.on_write('results', lambda: invalidate('results'))
+
+def make_etag(key):
+    """Strong ETag for everything a cached response depends on"""
+    return hashlib.sha1(repr((BUILD_ID, key)).encode()).hexdigest()
+
+def viewer_key():
+    """What the navigation bar depends on: who is logged in and as what"""
+    return (session.get('user_id'), session.get('user_name'), bool(session.get('is_admin')))
+
+def cached_value(namespace, key, compute):
+    """Call compute() once per key and reuse its result until its data changes"""
+    cache = _caches[namespace]
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+def render_fragment(namespace, key, template, **context):
+    """Render a template once per key and reuse the HTML until its data changes"""
+    return cached_value(namespace, key, lambda: Markup(render_template(template, **context)))
+
+def cached_page(namespace, key_func):
+    """Cache a view's rendered HTML and answer conditional GETs without running it
+
+    key_func() returns everything the page depends on (data versions, user,
+    arguments). The response carries a strong ETag derived from that key, so a
+    matching If-None-Match gets a 304 before the view runs. Pages with pending
+    flash messages are always rendered.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return f(*args, **kwargs)
+
+            key = (request.endpoint, key_func())
+            etag = make_etag(key)
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                cache = _caches[namespace]
+                body = cache.get(key)
+                if body is None:
+                    body = f(*args, **kwargs)
+                    # Redirects and other responses are passed through uncached
+                    if not isinstance(body, str):
+                        return body
+                    cache.set(key, body)
+                response = make_response(body)
+
+            response.set_etag(etag)
+            # Browsers keep the page but must check it is still current before using it
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,92 @@
+import click
+from flask import current_app
+import assets
+import database
+import events
+import question_io
+import repositories
+import scoring
+from migrations import LATEST_VERSION
+
+@click.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema and add the default admin and sample questions."""
+    database.init_db()
+    repositories.get_repository().ensure_schema()
+    click.echo(f"Database {database.DATABASE_PATH} is at schema version {LATEST_VERSION}")
+
+@click.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'json']), help='File format (default: from the file name).')
+@click.option('--batch-size', default=question_io.IMPORT_BATCH_SIZE, show_default=True, help='Rows per transaction.')
+def import_questions_command(path, file_format, batch_size):
+    """Import questions from a CSV or JSON file."""
+    file_format = file_format or question_io.detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = question_io.import_questions(stream, file_format, batch_size)
+
+    for number, message in report['errors']:
+        click.echo(f"Row {number}: {message}", err=True)
+    if report['error_count'] > len(report['errors']):
+        click.echo(f"... and {report['error_count'] - len(report['errors'])} more errors", err=True)
+    click.echo(
+        f"Imported {report['inserted']} of {report['rows']} rows in {report['seconds']:.2f}s "
+        f"({report['rows_per_second']:.0f} rows/s)"
+    )
+
+@click.command('export-questions')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'json']), help='File format (default: from the file name).')
+def export_questions_command(path, file_format):
+    """Export the question bank to a CSV or JSON file."""
+    file_format = file_format or question_io.detect_format(path)
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        for chunk in question_io.export_questions(file_format):
+            stream.write(chunk)
+    click.echo(f"Exported questions to {path}")
+
+@click.command('finalize-attempts')
+@click.option('--batch-size', default=500, show_default=True, help='Attempts per transaction.')
+def finalize_attempts_command(batch_size):
+    """Score and close timed attempts whose deadline has passed, and delete abandoned untimed ones."""
+    closed = scoring.finalize_expired(batch_size)
+    click.echo(f"Finalized {closed} expired attempts")
+    ttl = current_app.config.get('ATTEMPT_TTL')
+    if ttl:
+        deleted = scoring.purge_abandoned(ttl, batch_size)
+        click.echo(f"Deleted {deleted} abandoned attempts")
+
+@click.command('process-events')
+@click.option('--batch-size', default=500, show_default=True, help='Events per transaction.')
+def process_events_command(batch_size):
+    """Apply every pending attempt event to the event consumers."""
+    for name in events.CONSUMERS:
+        handled = events.drain(name, batch_size)
+        click.echo(f"{name}: applied {handled} events")
+
+@click.command('replay-events')
+@click.argument('consumer', type=click.Choice(sorted(events.CONSUMERS)))
+@click.option('--batch-size', default=500, show_default=True, help='Events per transaction.')
+def replay_events_command(consumer, batch_size):
+    """Rebuild a consumer's tables from the whole attempt event log."""
+    handled = events.replay(consumer, batch_size)
+    click.echo(f"{consumer}: rebuilt from {handled} events")
+
+@click.command('build-assets')
+def build_assets_command():
+    """Write content-hashed, precompressed copies of the static CSS and JS; restart the workers afterwards."""
+    manifest = assets.build_assets(current_app.static_folder)
+    for source, entry in manifest.items():
+        click.echo(f"{source} -> {assets.BUILD_DIR}/{entry['file']}")
+    if assets.load_brotli() is None:
+        click.echo("Brotli is not installed; only gzip variants were written", err=True)
+
+def register_commands(app):
+    """Add the command line commands to the Flask app"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(import_questions_command)
+    app.cli.add_command(export_questions_command)
+    app.cli.add_command(finalize_attempts_command)
+    app.cli.add_command(process_events_command)
+    app.cli.add_command(replay_events_command)
+    app.cli.add_command(build_assets_command)
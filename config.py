@@ -0,0 +1,120 @@
+import json
+import os
+import warnings
+from datetime import timedelta
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def load_secret_keys():
+    """Read the accepted session signing keys, newest first
+
+    Keys come from QUIZ_SECRET_KEY (comma separated for rotation) and/or a key
+    file named by QUIZ_SECRET_KEY_FILE with one key per line. The first key
+    signs new sessions; the others are still accepted so sessions signed
+    before a rotation stay valid until they expire.
+    """
+    keys = [key.strip() for key in os.environ.get('QUIZ_SECRET_KEY', '').split(',') if key.strip()]
+
+    path = os.environ.get('QUIZ_SECRET_KEY_FILE')
+    if path:
+        with open(path) as key_file:
+            keys.extend(line.strip() for line in key_file if line.strip() and not line.startswith('#'))
+    return keys
+
+class Config:
+    """Default settings, overridable through QUIZ_* environment variables"""
+
+    # SQLite database file
+    DATABASE = os.environ.get('QUIZ_DATABASE', 'quiz.db')
+    # Create or upgrade the schema when the app starts; turn off to leave it to 'flask init-db'
+    AUTO_MIGRATE = os.environ.get('QUIZ_AUTO_MIGRATE', '1') == '1'
+
+    # Group commit (see writer.py): result writes from many requests share one transaction,
+    # committed after waiting up to GROUP_COMMIT_INTERVAL seconds for more writes or once
+    # GROUP_COMMIT_MAX_BATCH are queued
+    GROUP_COMMIT = os.environ.get('QUIZ_GROUP_COMMIT') == '1'
+    GROUP_COMMIT_INTERVAL = float(os.environ.get('QUIZ_GROUP_COMMIT_INTERVAL', '0.005'))
+    GROUP_COMMIT_MAX_BATCH = _env_int('QUIZ_GROUP_COMMIT_MAX_BATCH', 500)
+
+    # Where results live (see repositories.py): 'sqlite' keeps them in DATABASE, 'sharded'
+    # spreads them by user over RESULTS_SHARDS files, named by RESULTS_SHARD_PATH with a
+    # {shard} placeholder (default: next to DATABASE). Changing either does not move
+    # existing results.
+    RESULTS_BACKEND = os.environ.get('QUIZ_RESULTS_BACKEND', 'sqlite')
+    RESULTS_SHARDS = _env_int('QUIZ_RESULTS_SHARDS', 4)
+    RESULTS_SHARD_PATH = os.environ.get('QUIZ_RESULTS_SHARD_PATH')
+
+    # 'cookie' keeps the session in a signed cookie, 'server' keeps it in the database
+    SESSION_BACKEND = os.environ.get('QUIZ_SESSION_BACKEND', 'cookie')
+    PERMANENT_SESSION_LIFETIME = timedelta(seconds=_env_int('QUIZ_SESSION_LIFETIME', 7 * 24 * 3600))
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = os.environ.get('QUIZ_SESSION_COOKIE_SECURE') == '1'
+
+    # Password hashing (see security.py); raise the cost as far as login latency allows
+    PASSWORD_HASH_METHOD = os.environ.get('QUIZ_PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = _env_int('QUIZ_PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+    PASSWORD_HASH_MAX_PENDING = _env_int('QUIZ_PASSWORD_HASH_MAX_PENDING')
+
+    # Reverse proxies in front of the app (nginx, a load balancer) that set X-Forwarded-For
+    # and X-Forwarded-Proto. With 0 the client IP is the connecting address, so behind a
+    # proxy every client shares the proxy's login limit. Never count more proxies than
+    # are really there: clients can send X-Forwarded-For themselves.
+    TRUSTED_PROXIES = _env_int('QUIZ_TRUSTED_PROXIES', 0)
+
+    # Login rate limits per client IP (see TRUSTED_PROXIES) and per email, as token buckets
+    LOGIN_IP_PER_MINUTE = _env_int('QUIZ_LOGIN_IP_PER_MINUTE', 30)
+    LOGIN_IP_BURST = _env_int('QUIZ_LOGIN_IP_BURST', 20)
+    LOGIN_EMAIL_PER_MINUTE = _env_int('QUIZ_LOGIN_EMAIL_PER_MINUTE', 5)
+    LOGIN_EMAIL_BURST = _env_int('QUIZ_LOGIN_EMAIL_BURST', 10)
+    LOGIN_FAILURE_TTL = _env_int('QUIZ_LOGIN_FAILURE_TTL', 300)
+
+    # Per-request SQL timing, the Server-Timing header and /metrics
+    INSTRUMENTATION = os.environ.get('QUIZ_INSTRUMENTATION', '1') == '1'
+    SLOW_QUERY_MS = _env_int('QUIZ_SLOW_QUERY_MS', 100)
+    # Bearer token Prometheus sends to scrape /metrics; unset, /metrics answers 404
+    METRICS_TOKEN = os.environ.get('QUIZ_METRICS_TOKEN')
+
+    # Quiz drawing (see sampling.QuizConfig)
+    QUIZ_SIZE = _env_int('QUIZ_SIZE')
+    QUIZ_SEED = _env_int('QUIZ_SEED')
+    QUIZ_STRATIFY_BY = os.environ.get('QUIZ_STRATIFY_BY', 'category')
+    QUIZ_QUOTAS = json.loads(os.environ.get('QUIZ_QUOTAS', '{}'))
+
+    # Timed quizzes: seconds allowed per attempt (unset for untimed; a quiz can set
+    # its own), and how often and in what batches the finalizer closes attempts
+    # past their deadline (0 to leave them to 'flask finalize-attempts')
+    QUIZ_DURATION = _env_int('QUIZ_DURATION')
+    FINALIZER_INTERVAL = _env_int('QUIZ_FINALIZER_INTERVAL', 5)
+    FINALIZER_BATCH_SIZE = _env_int('QUIZ_FINALIZER_BATCH_SIZE', 500)
+    # Untimed attempts left unfinished are deleted by the same sweep this many
+    # seconds after they started (0 to keep them)
+    ATTEMPT_TTL = _env_int('QUIZ_ATTEMPT_TTL', 86400)
+
+    # Background consumers of the attempt event log (see events.py): how often each
+    # worker polls for events from other processes (0 to leave them to
+    # 'flask process-events') and how many events go in one transaction
+    EVENT_CONSUMER_INTERVAL = _env_int('QUIZ_EVENT_CONSUMER_INTERVAL', 2)
+    EVENT_BATCH_SIZE = _env_int('QUIZ_EVENT_BATCH_SIZE', 500)
+
+def load_config(app, overrides=None):
+    """Load the settings and session signing keys into the app config"""
+    app.config.from_object(Config)
+    if overrides:
+        app.config.update(overrides)
+
+    if not app.config.get('SECRET_KEY'):
+        keys = load_secret_keys()
+        if keys:
+            app.config['SECRET_KEY'] = keys[0]
+            app.config['SECRET_KEY_FALLBACKS'] = keys[1:]
+        else:
+            # Fine for a single development process, but every worker would sign with its own key
+            warnings.warn(
+                'QUIZ_SECRET_KEY is not set; using a random key, so sessions are lost on restart '
+                'and not shared between workers'
+            )
+            app.config['SECRET_KEY'] = os.urandom(24)
+    app.config.setdefault('SECRET_KEY_FALLBACKS', [])
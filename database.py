@@ -1,63 +1,205 @@
 import sqlite3
-from werkzeug.security import generate_password_hash
+import queue
+import threading
+from contextlib import contextmanager
+from flask import g, has_app_context
+from security import hash_password
+from migrations import migrate, LATEST_VERSION
 import os
 
 DATABASE_PATH = 'quiz.db'
 
-def get_db_connection():
-    """Create a database connection and return it"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# Maximum number of open connections and how long to wait for a free one
+POOL_SIZE = 10
+POOL_TIMEOUT = 30
+
+# Per-connection SQLite tuning
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+SYNCHRONOUS = 'NORMAL'
+
+# sqlite3.Connection subclass used for new connections (see instrumentation.py)
+CONNECTION_FACTORY = sqlite3.Connection
+
+def get_db_connection(path=None):
+    """Create a connection to the database (or another database file) and return it"""
+    # Pooled connections are handed from thread to thread, but only one uses them at a time
+    conn = sqlite3.connect(
+        path or DATABASE_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=CONNECTION_FACTORY
+    )
     conn.row_factory = sqlite3.Row
+    
+    # NORMAL is safe in WAL mode: a crash can lose the last commits but never corrupts the database
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)}")
     return conn
 
+class ConnectionPool:
+    """Bounded, thread-safe pool of pre-configured database connections"""
+    
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, path=None):
+        self.timeout = timeout
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+    
+    def acquire(self):
+        """Check out a connection, opening a new one if none is idle"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError('Timed out waiting for a database connection')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return get_db_connection(self.path)
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def _reset_after_fork():
+    # Connections opened before a fork (gunicorn --preload) belong to the parent;
+    # the child opens its own
+    global _pool, _pool_lock, _local
+    _pool = None
+    _pool_lock = threading.Lock()
+    _local = threading.local()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(POOL_SIZE, POOL_TIMEOUT)
+    return _pool
+
+def close_pool():
+    """Close the pooled connections; the next use opens new ones to DATABASE_PATH"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+def get_db():
+    """Get the connection of the current request, checking one out on first use"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+def close_db(e=None):
+    """Return the connection of the current request to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+@contextmanager
+def db_connection():
+    """Provide a pooled connection, shared by everything in the same request or thread"""
+    if has_app_context():
+        yield get_db()
+        return
+    
+    # Outside a request, reuse the connection this thread already holds
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        yield conn
+        return
+    
+    conn = _local.conn = get_pool().acquire()
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+        get_pool().release(conn)
+
+def init_app(app):
+    """Register database handling with the Flask app"""
+    global DATABASE_PATH
+    DATABASE_PATH = app.config.get('DATABASE', DATABASE_PATH)
+    app.teardown_appcontext(close_db)
+
+def schema_is_current(path=None):
+    """Check, without writing, whether every migration has been applied"""
+    path = path or DATABASE_PATH
+    if path != ':memory:' and not os.path.exists(path):
+        return False
+    conn = get_db_connection(path)
+    try:
+        version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+    return version is not None and version >= LATEST_VERSION
+
+def migrate_file(path=None):
+    """Create or upgrade the schema of a database file, without seeding it"""
+    conn = get_db_connection(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL").fetchall()
+        migrate(conn)
+    finally:
+        conn.close()
+
+def ensure_schema():
+    """Run init_db unless the schema is already current
+
+    Workers starting against an initialized database only read the schema
+    version, so restarting many at once takes no write locks.
+    """
+    if not schema_is_current():
+        init_db()
+
 def init_db():
     """Initialize the database with tables if they don't exist"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        is_admin INTEGER DEFAULT 0
-    )
-    ''')
+    # Write-ahead logging lets readers run while a writer commits (persists in the database file)
+    cursor.execute("PRAGMA journal_mode = WAL").fetchall()
     
-    # Create questions table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question TEXT NOT NULL,
-        option_a TEXT NOT NULL,
-        option_b TEXT NOT NULL,
-        option_c TEXT NOT NULL,
-        option_d TEXT NOT NULL,
-        correct_ans TEXT NOT NULL
-    )
-    ''')
+    # Create or upgrade the schema
+    migrate(conn)
     
-    # Create results table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        score INTEGER NOT NULL,
-        total INTEGER NOT NULL,
-        quiz_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
+    # Seed under the write lock so processes starting together add the admin only once
+    cursor.execute("BEGIN IMMEDIATE")
     
     # Check if admin exists, if not create default admin
-    cursor.execute("SELECT * FROM users WHERE is_admin = 1")
+    cursor.execute("SELECT id FROM users WHERE is_admin = 1 LIMIT 1")
     admin = cursor.fetchone()
     
     if not admin:
         # Create default admin user
-        hashed_password = generate_password_hash('admin123')
+        hashed_password = hash_password('admin123')
         cursor.execute(
             "INSERT INTO users (name, email, password, is_admin) VALUES (?, ?, ?, ?)",
             ('Admin', 'admin@example.com', hashed_password, 1)
@@ -65,10 +207,10 @@ def init_db():
         print("Default admin created: email=admin@example.com, password=admin123")
     
     # Add some sample questions if none exist
-    cursor.execute("SELECT COUNT(*) FROM questions")
-    question_count = cursor.fetchone()[0]
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM questions)")
+    has_questions = cursor.fetchone()[0]
     
-    if question_count == 0:
+    if not has_questions:
         sample_questions = [
             (
                 "What is the capital of France?",
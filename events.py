@@ -0,0 +1,197 @@
+import atexit
+import logging
+import threading
+import models
+from database import db_connection
+from models import EventLog
+
+logger = logging.getLogger(__name__)
+
+# Consumers by name, as (handle(conn, events), reset(conn))
+CONSUMERS = {}
+
+# Shortest pause between two passes of a consumer thread, so that under load the
+# events of many requests are applied in one transaction instead of one each
+MIN_PASS_INTERVAL = 0.1
+
+def consumer(name, reset):
+    """Register handle(conn, events) as the consumer `name`
+
+    handle updates derived tables from a batch of attempt_events rows, in the
+    transaction that also checkpoints the consumer, so every event is applied
+    exactly once. reset(conn) empties what the consumer builds, for replay.
+    """
+    def register(handle):
+        CONSUMERS[name] = (handle, reset)
+        return handle
+    return register
+
+def process_batch(name, batch_size=500):
+    """Apply the next batch of events to a consumer and checkpoint it
+
+    Returns the number of events handled. Threads and processes may run the
+    same consumer: the position is read again under the write lock, so a
+    batch is only applied once. Event IDs are assigned under the same lock,
+    so a later commit never adds events behind a consumer's position.
+    """
+    handle, _ = CONSUMERS[name]
+    with db_connection() as conn:
+        # Skip the write lock when there is nothing new
+        position = EventLog.get_position(conn, name)
+        if not EventLog.read(conn, position, 1):
+            return 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            events = EventLog.read(conn, EventLog.get_position(conn, name), batch_size)
+            if events:
+                handle(conn, events)
+                EventLog.set_position(conn, name, events[-1]['id'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(events)
+
+def drain(name, batch_size=500):
+    """Apply every pending event to a consumer, a batch per transaction; returns the count"""
+    handled = 0
+    while True:
+        count = process_batch(name, batch_size)
+        handled += count
+        if count < batch_size:
+            return handled
+
+def replay(name, batch_size=500):
+    """Rebuild a consumer's tables from the start of the log; returns the events applied
+
+    The tables are emptied and the position reset in one transaction, then
+    the log is applied in batches, so the write lock is only held briefly
+    and requests keep being served while the rebuild runs.
+    """
+    _, reset = CONSUMERS[name]
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            reset(conn)
+            EventLog.set_position(conn, name, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return drain(name, batch_size)
+
+def get_lag():
+    """Get the number of events each consumer has yet to handle"""
+    last_id = EventLog.get_last_id()
+    with db_connection() as conn:
+        return {name: last_id - EventLog.get_position(conn, name) for name in CONSUMERS}
+
+def reset_quiz_totals(conn):
+    conn.execute("DELETE FROM quiz_totals")
+
+@consumer('quiz_totals', reset_quiz_totals)
+def update_quiz_totals(conn, events):
+    """Count attempts, average and best percentage per quiz"""
+    conn.executemany(
+        """
+        INSERT INTO quiz_totals (quiz_id, attempts, percentage_sum, best_percentage, last_attempt_at)
+        VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT (quiz_id) DO UPDATE SET
+            attempts = attempts + 1,
+            percentage_sum = percentage_sum + excluded.percentage_sum,
+            best_percentage = MAX(best_percentage, excluded.best_percentage),
+            last_attempt_at = MAX(last_attempt_at, excluded.last_attempt_at)
+        """,
+        [
+            (event['quiz_id'], event['score'] * 100.0 / event['total'], event['score'] * 100.0 / event['total'],
+             event['created_at'])
+            for event in events if event['quiz_id'] is not None and event['total'] > 0
+        ]
+    )
+
+class ConsumerPool:
+    """Background threads, one per consumer, that apply new events in batches
+
+    Each thread drains its consumer soon after this process saves a result
+    (at most every MIN_PASS_INTERVAL seconds) and every `interval` seconds
+    otherwise, which picks up events written by other processes. Nothing runs
+    on the request path beyond the event insert in the result transaction.
+    """
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._wake = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def _running(self):
+        threads = self._threads
+        return len(threads) == len(CONSUMERS) and all(thread.is_alive() for thread in threads.values())
+
+    def start(self):
+        """Start the consumer threads that are not running"""
+        if self._running():
+            return
+        with self._lock:
+            self._stopping.clear()
+            for name in CONSUMERS:
+                thread = self._threads.get(name)
+                if thread is None or not thread.is_alive():
+                    self._wake.setdefault(name, threading.Event())
+                    thread = threading.Thread(target=self._run, args=(name,), name=f'event-consumer-{name}', daemon=True)
+                    self._threads[name] = thread
+                    thread.start()
+
+    def stop(self):
+        """Stop the consumer threads after their current batch"""
+        with self._lock:
+            threads = list(self._threads.values())
+            self._threads = {}
+        self._stopping.set()
+        self.wake()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+
+    def wake(self):
+        """Have every consumer look for new events now"""
+        for wake in list(self._wake.values()):
+            wake.set()
+
+    def _run(self, name):
+        wake = self._wake[name]
+        while not self._stopping.is_set():
+            wake.clear()
+            try:
+                handled = drain(name, self.batch_size)
+            except Exception:
+                # Keep going; the batch was rolled back and is retried on the next pass
+                logger.exception('Event consumer %s failed', name)
+            else:
+                if handled:
+                    logger.debug('Event consumer %s handled %d events', name, handled)
+            if self._stopping.wait(MIN_PASS_INTERVAL):
+                break
+            wake.wait(max(self.interval - MIN_PASS_INTERVAL, 0))
+
+_pool = None
+
+def init_app(app):
+    """Run the event consumers in the background of every worker
+
+    The threads start with the first request a process serves, so a parent
+    process that forks workers (gunicorn --preload) never runs them. With
+    EVENT_CONSUMER_INTERVAL set to 0 they do not run at all and the events
+    wait for 'flask process-events'.
+    """
+    global _pool
+    if not app.config.get('EVENT_CONSUMER_INTERVAL'):
+        return
+    if _pool is None:
+        _pool = ConsumerPool(app.config['EVENT_CONSUMER_INTERVAL'], app.config['EVENT_BATCH_SIZE'])
+        atexit.register(_pool.stop)
+        models.on_write('results', _pool.wake)
+    app.before_request(_pool.start)
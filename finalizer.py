@@ -0,0 +1,78 @@
+import atexit
+import logging
+import threading
+import scoring
+
+logger = logging.getLogger(__name__)
+
+class Finalizer:
+    """Background thread that scores and closes timed attempts once their deadline passes
+
+    Quiz takers who close the tab never submit, so without it their attempts
+    would stay open and never reach the results. Every worker process may run
+    one; each batch is claimed under the write lock, so attempts are only
+    scored once. Untimed attempts have no deadline; they are deleted once
+    they are attempt_ttl seconds old, unless attempt_ttl is 0.
+    """
+
+    def __init__(self, interval, batch_size, attempt_ttl=0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.attempt_ttl = attempt_ttl
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the finalizer thread if it is not running"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='attempt-finalizer', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the finalizer thread after its current batch"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._stopping.set()
+            thread.join()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                closed = scoring.finalize_expired(self.batch_size)
+                deleted = scoring.purge_abandoned(self.attempt_ttl, self.batch_size) if self.attempt_ttl else 0
+            except Exception:
+                # Keep going; the attempts are picked up again on the next pass
+                logger.exception('Finalizing expired attempts failed')
+                continue
+            if closed:
+                logger.info('Finalized %d expired attempts', closed)
+            if deleted:
+                logger.info('Deleted %d abandoned attempts', deleted)
+
+_finalizer = None
+
+def init_app(app):
+    """Run the finalizer unless FINALIZER_INTERVAL is 0
+
+    Any attempt can have a deadline, from QUIZ_DURATION or from the time
+    limit of its quiz, so the finalizer does not depend on either. The
+    thread starts with the first request a process serves, so a parent
+    process that forks workers (gunicorn --preload) never runs one.
+    """
+    global _finalizer
+    if not app.config.get('FINALIZER_INTERVAL'):
+        return
+    if _finalizer is None:
+        _finalizer = Finalizer(
+            app.config['FINALIZER_INTERVAL'], app.config['FINALIZER_BATCH_SIZE'], app.config.get('ATTEMPT_TTL', 0)
+        )
+        atexit.register(_finalizer.stop)
+    app.before_request(_finalizer.start)
@@ -0,0 +1,201 @@
+import logging
+import sqlite3
+import threading
+import time
+import database
+
+# Statements slower than this are written to the slow-query log
+SLOW_QUERY_MS = 100
+
+# Upper bounds of the request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+slow_query_log = logging.getLogger('quiz.slow_queries')
+
+# Statistics of the request running on the current thread
+_local = threading.local()
+
+class RequestStats:
+    """SQL statements run while handling one request"""
+
+    __slots__ = ('started', 'queries', 'sql_seconds', 'slowest_seconds', 'slowest_sql')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+    def record(self, sql, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_sql = sql
+
+def _record(sql, seconds):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.record(sql, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        metrics.count_slow_query()
+        slow_query_log.warning(
+            "Slow query (%.1f ms, %s): %s",
+            seconds * 1000, getattr(_local, 'endpoint', None) or 'background', ' '.join(sql.split())[:500]
+        )
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times every statement it runs"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements are timed and counted against the current request
+
+    A statement is timed until it completes or returns its first row; rows
+    fetched afterwards are not included.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _record('COMMIT', time.perf_counter() - started)
+
+class Metrics:
+    """Process-wide request and SQL counters, exported in the Prometheus text format
+
+    Each worker process keeps its own counters; Prometheus sums them when
+    every worker is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.durations = {}
+        self.queries = {}
+        self.sql_seconds = {}
+        self.slow_queries = 0
+
+    def observe(self, endpoint, method, status, seconds, stats):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            buckets = self.durations.get(endpoint)
+            if buckets is None:
+                # Per-bucket counts followed by the total count and sum
+                buckets = self.durations[endpoint] = [0] * len(DURATION_BUCKETS) + [0, 0.0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-2] += 1
+            buckets[-1] += seconds
+
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + stats.queries
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + stats.sql_seconds
+
+    def count_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self):
+        """Format every metric in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP quiz_http_requests_total Requests handled, by endpoint, method and status.',
+                '# TYPE quiz_http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'quiz_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}'
+                )
+
+            lines += [
+                '# HELP quiz_http_request_duration_seconds Time to handle a request.',
+                '# TYPE quiz_http_request_duration_seconds histogram',
+            ]
+            for endpoint, buckets in sorted(self.durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'quiz_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'quiz_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {buckets[-2]}')
+                lines.append(f'quiz_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {buckets[-2]}')
+                lines.append(f'quiz_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {buckets[-1]:.6f}')
+
+            lines += [
+                '# HELP quiz_sql_queries_total SQL statements run while handling requests.',
+                '# TYPE quiz_sql_queries_total counter',
+            ]
+            for endpoint, count in sorted(self.queries.items()):
+                lines.append(f'quiz_sql_queries_total{{endpoint="{endpoint}"}} {count}')
+
+            lines += [
+                '# HELP quiz_sql_seconds_total Time spent in SQL statements while handling requests.',
+                '# TYPE quiz_sql_seconds_total counter',
+            ]
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'quiz_sql_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+
+            lines += [
+                '# HELP quiz_slow_queries_total SQL statements slower than the slow-query threshold.',
+                '# TYPE quiz_slow_queries_total counter',
+                f'quiz_slow_queries_total {self.slow_queries}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def init_app(app):
+    """Time every SQL statement on connections opened from now on"""
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    if app.config.get('INSTRUMENTATION', True):
+        database.CONNECTION_FACTORY = InstrumentedConnection
+
+def start_request(endpoint):
+    """Start collecting statistics for the request on this thread"""
+    _local.stats = RequestStats()
+    _local.endpoint = endpoint
+
+def finish_request(response, endpoint, method):
+    """Record the request in the metrics and add its Server-Timing header"""
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    _local.endpoint = None
+    if stats is None:
+        return response
+
+    seconds = time.perf_counter() - stats.started
+    metrics.observe(endpoint or 'none', method, response.status_code, seconds, stats)
+
+    timings = [
+        f'sql;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries"',
+        f'app;dur={seconds * 1000:.2f}',
+    ]
+    if stats.slowest_sql is not None:
+        timings.append(f'sql-slowest;dur={stats.slowest_seconds * 1000:.2f}')
+    response.headers.add('Server-Timing', ', '.join(timings))
+    return response
@@ -1,146 +1,820 @@
 import sqlite3
-from database import get_db_connection
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
+import re
+import threading
+import time
+from database import db_connection
+from cache import LRUCache
+import writer
+from repositories import get_repository, result_row
+from security import hash_password, verify_password
 import datetime
 
+# Process-local cache of the immutable part of quiz attempts (owner and question IDs)
+_attempt_cache = LRUCache(maxsize=4096)
+
+# Callbacks run after this process writes questions or results, e.g. to drop cached pages
+_write_listeners = {'questions': [], 'results': []}
+
+def on_write(table, callback):
+    """Register callback() to run after every write to 'questions' or 'results'"""
+    _write_listeners[table].append(callback)
+
+def _notify_write(table):
+    for callback in _write_listeners[table]:
+        callback()
+
 class User:
     """User model to handle user-related operations"""
-    
+
     @staticmethod
     def create(name, email, password):
         """Create a new user"""
-        conn = get_db_connection()
-        hashed_password = generate_password_hash(password)
-        
-        try:
-            conn.execute(
-                "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
-                (name, email, hashed_password)
-            )
-            conn.commit()
-            success = True
-        except sqlite3.IntegrityError:
-            # Email already exists
-            success = False
-        finally:
-            conn.close()
-            
+        hashed_password = hash_password(password)
+
+        with db_connection() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+                    (name, email, hashed_password)
+                )
+                conn.commit()
+                success = True
+            except sqlite3.IntegrityError:
+                # Email already exists
+                conn.rollback()
+                success = False
+
         return success
-    
+
     @staticmethod
     def authenticate(email, password):
         """Authenticate a user"""
-        conn = get_db_connection()
-        user = conn.execute(
-            "SELECT * FROM users WHERE email = ?", (email,)
-        ).fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user['password'], password):
+        with db_connection() as conn:
+            user = conn.execute(
+                "SELECT * FROM users WHERE email = ?", (email,)
+            ).fetchone()
+
+        if user and verify_password(user['password'], password):
             return user
         return None
-    
+
     @staticmethod
     def get_by_id(user_id):
         """Get user by ID"""
-        conn = get_db_connection()
-        user = conn.execute(
-            "SELECT * FROM users WHERE id = ?", (user_id,)
-        ).fetchone()
-        conn.close()
+        with db_connection() as conn:
+            user = conn.execute(
+                "SELECT * FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
         return user
 
+class QuestionRecord:
+    """Compact, read-only question kept in the process-wide question bank cache"""
+
+    __slots__ = ('id', 'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_ans',
+                 'category', 'difficulty')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, row[name])
+
+    def __getitem__(self, key):
+        # Allow row-style access like sqlite3.Row
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def keys(self):
+        return self.__slots__
+
+class QuestionBank:
+    """Every question of one bank version, in ID order and indexed by ID"""
+
+    __slots__ = ('version', 'questions', 'by_id', 'ids', '_groups', '_lock')
+
+    def __init__(self, version, questions):
+        self.version = version
+        self.questions = tuple(questions)
+        self.by_id = {question.id: question for question in self.questions}
+        self.ids = tuple(self.by_id)
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def ids_by(self, field):
+        """Get question IDs grouped by a field such as category, built once per bank version"""
+        groups = self._groups.get(field)
+        if groups is None:
+            with self._lock:
+                groups = self._groups.get(field)
+                if groups is None:
+                    grouped = {}
+                    for question in self.questions:
+                        grouped.setdefault(question[field], []).append(question.id)
+                    groups = {value: tuple(ids) for value, ids in grouped.items()}
+                    self._groups[field] = groups
+        return groups
+
+# Process-local question bank, replaced whenever the bank version in the database changes
+_question_bank = None
+_question_bank_lock = threading.Lock()
+
+# Whether the full-text index exists (see migrations.create_question_search), checked once
+_has_search_index = None
+
+# Near-duplicate detection: candidates come from the full-text index, then the
+# closest are kept by word overlap (Jaccard similarity of their word sets)
+DUPLICATE_THRESHOLD = 0.8
+DUPLICATE_CANDIDATES = 20
+DUPLICATE_QUERY_TERMS = 16
+
+def _words(text):
+    """Lowercase words of a text, as used for search and duplicate detection"""
+    return re.findall(r'\w+', (text or '').lower())
+
+def _search_index_available(conn):
+    global _has_search_index
+    if _has_search_index is None:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'").fetchone()
+        _has_search_index = row is not None
+    return _has_search_index
+
+def _similarity(words, other):
+    words, other = set(words), set(other)
+    if not words or not other:
+        return 0.0
+    return len(words & other) / len(words | other)
+
 class Question:
     """Question model to handle question-related operations"""
-    
+
+    @staticmethod
+    def get_bank_version():
+        """Get the question bank version, bumped by triggers on every question write"""
+        with db_connection() as conn:
+            row = conn.execute("SELECT version FROM bank_version WHERE id = 1").fetchone()
+        return row['version'] if row else 0
+
+    @staticmethod
+    def get_bank():
+        """Get the cached question bank, reloading it if another write changed the version"""
+        global _question_bank
+        version = Question.get_bank_version()
+        bank = _question_bank
+        if bank is not None and bank.version == version:
+            return bank
+
+        with _question_bank_lock:
+            # Another thread may have reloaded it while we waited
+            bank = _question_bank
+            if bank is not None and bank.version == version:
+                return bank
+
+            with db_connection() as conn:
+                rows = conn.execute("SELECT * FROM questions ORDER BY id").fetchall()
+            bank = QuestionBank(version, [QuestionRecord(row) for row in rows])
+            _question_bank = bank
+        return bank
+
     @staticmethod
     def get_all():
         """Get all questions"""
-        conn = get_db_connection()
-        questions = conn.execute("SELECT * FROM questions").fetchall()
-        conn.close()
-        return questions
-    
+        # Shared by every caller, never copied
+        return Question.get_bank().questions
+
+    @staticmethod
+    def get_recent(limit=5):
+        """Get the most recently added questions"""
+        return Question.get_bank().questions[:-limit - 1:-1]
+
     @staticmethod
     def get_by_id(question_id):
         """Get question by ID"""
-        conn = get_db_connection()
-        question = conn.execute(
-            "SELECT * FROM questions WHERE id = ?", (question_id,)
-        ).fetchone()
-        conn.close()
-        return question
-    
-    @staticmethod
-    def create(question_text, option_a, option_b, option_c, option_d, correct_ans):
+        return Question.get_bank().by_id.get(question_id)
+
+    @staticmethod
+    def get_many(question_ids):
+        """Get questions by ID, in the order the IDs are given"""
+        by_id = Question.get_bank().by_id
+        return [by_id[q_id] for q_id in question_ids if q_id in by_id]
+
+    @staticmethod
+    def get_ids():
+        """Get the IDs of all questions"""
+        return list(Question.get_bank().ids)
+
+    @staticmethod
+    def get_categories():
+        """Get the distinct question categories"""
+        return sorted(value for value in Question.get_bank().ids_by('category') if value)
+
+    @staticmethod
+    def search(query, page=1, per_page=50):
+        """Find questions whose text or options contain every word of the query
+
+        The last word also matches as a prefix, for search-as-you-type. Results
+        are ranked by relevance, matches in the question text first. Returns
+        (questions, total matches).
+        """
+        words = _words(query)
+        if not words:
+            return [], 0
+        offset = (max(page, 1) - 1) * per_page
+
+        with db_connection() as conn:
+            if _search_index_available(conn):
+                # Quote every word so user input is never read as FTS5 syntax
+                match = ' '.join(f'"{word}"' for word in words) + '*'
+                total = conn.execute(
+                    "SELECT COUNT(*) FROM questions_fts WHERE questions_fts MATCH ?", (match,)
+                ).fetchone()[0]
+                ids = [row[0] for row in conn.execute(
+                    "SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                    (match, per_page, offset)
+                )]
+                return Question.get_many(ids), total
+
+        # Without FTS5, scan the cached bank; question text matches rank first
+        head, last = words[:-1], words[-1]
+        matches = []
+        for question in Question.get_bank().questions:
+            fields = [_words(question[field]) for field in ('question', 'option_a', 'option_b', 'option_c', 'option_d')]
+            found = set(word for field in fields for word in field)
+            if all(word in found for word in head) and any(word.startswith(last) for word in found):
+                in_question = sum(1 for word in head if word in fields[0])
+                in_question += any(word.startswith(last) for word in fields[0])
+                matches.append((-in_question, question.id, question))
+        matches.sort(key=lambda match: match[:2])
+        return [match[2] for match in matches[offset:offset + per_page]], len(matches)
+
+    @staticmethod
+    def find_similar(question_text, exclude_id=None, threshold=DUPLICATE_THRESHOLD):
+        """Find existing questions whose text is nearly the same, most similar first
+
+        Returns (question, similarity) pairs with a similarity of at least threshold.
+        """
+        words = _words(question_text)
+        if not words:
+            return []
+
+        with db_connection() as conn:
+            if _search_index_available(conn):
+                # Rare (long) words find the candidates; common ones add nothing to the match
+                terms = sorted(set(words), key=len, reverse=True)[:DUPLICATE_QUERY_TERMS]
+                match = 'question : (' + ' OR '.join(f'"{term}"' for term in terms) + ')'
+                ids = [row[0] for row in conn.execute(
+                    "SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (match, DUPLICATE_CANDIDATES)
+                )]
+                candidates = Question.get_many(ids)
+            else:
+                candidates = Question.get_bank().questions
+
+        similar = []
+        for question in candidates:
+            if question.id == exclude_id:
+                continue
+            similarity = _similarity(words, _words(question['question']))
+            if similarity >= threshold:
+                similar.append((question, similarity))
+        similar.sort(key=lambda pair: -pair[1])
+        return similar
+
+    @staticmethod
+    def create(question_text, option_a, option_b, option_c, option_d, correct_ans, category=None, difficulty=None):
         """Create a new question"""
-        conn = get_db_connection()
-        conn.execute(
-            "INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_ans) VALUES (?, ?, ?, ?, ?, ?)",
-            (question_text, option_a, option_b, option_c, option_d, correct_ans)
-        )
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_ans, category, difficulty) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (question_text, option_a, option_b, option_c, option_d, correct_ans, category, difficulty)
+            )
+            conn.commit()
+        _notify_write('questions')
         return True
-    
+
     @staticmethod
-    def update(question_id, question_text, option_a, option_b, option_c, option_d, correct_ans):
+    def bulk_create(rows):
+        """Create many questions in a single transaction and return how many were added
+
+        Each row is (question, option_a, option_b, option_c, option_d, correct_ans, category, difficulty).
+        """
+        with db_connection() as conn:
+            conn.executemany(
+                "INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_ans, category, difficulty) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        _notify_write('questions')
+        return len(rows)
+
+    @staticmethod
+    def iter_all(batch_size=1000):
+        """Yield every question in ID order, one batch in memory at a time"""
+        last_id = 0
+        while True:
+            with db_connection() as conn:
+                questions = conn.execute(
+                    "SELECT * FROM questions WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            yield from questions
+            if len(questions) < batch_size:
+                break
+            last_id = questions[-1]['id']
+
+    @staticmethod
+    def update(question_id, question_text, option_a, option_b, option_c, option_d, correct_ans, category=None, difficulty=None):
         """Update an existing question"""
-        conn = get_db_connection()
-        conn.execute(
-            "UPDATE questions SET question = ?, option_a = ?, option_b = ?, option_c = ?, option_d = ?, correct_ans = ? WHERE id = ?",
-            (question_text, option_a, option_b, option_c, option_d, correct_ans, question_id)
-        )
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE questions SET question = ?, option_a = ?, option_b = ?, option_c = ?, option_d = ?, correct_ans = ?, category = ?, difficulty = ? WHERE id = ?",
+                (question_text, option_a, option_b, option_c, option_d, correct_ans, category, difficulty, question_id)
+            )
+            conn.commit()
+        _notify_write('questions')
         return True
-    
+
     @staticmethod
     def delete(question_id):
         """Delete a question"""
-        conn = get_db_connection()
-        conn.execute("DELETE FROM questions WHERE id = ?", (question_id,))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute("DELETE FROM questions WHERE id = ?", (question_id,))
+            conn.commit()
+        _notify_write('questions')
+        return True
+
+class Quiz:
+    """Quiz model: a named set of questions drawn from the bank"""
+
+    @staticmethod
+    def get_all():
+        """Get all quizzes with their question counts"""
+        with db_connection() as conn:
+            return conn.execute("SELECT * FROM quizzes ORDER BY id").fetchall()
+
+    @staticmethod
+    def get_totals():
+        """Get attempt totals per quiz ID, as built from the event log by the quiz_totals consumer"""
+        with db_connection() as conn:
+            rows = conn.execute("SELECT * FROM quiz_totals").fetchall()
+        return {row['quiz_id']: row for row in rows}
+
+    @staticmethod
+    def get_by_id(quiz_id):
+        """Get quiz by ID"""
+        with db_connection() as conn:
+            return conn.execute("SELECT * FROM quizzes WHERE id = ?", (quiz_id,)).fetchone()
+
+    @staticmethod
+    def get_question_ids(quiz_id):
+        """Get the IDs of a quiz's questions, read from its own index range"""
+        with db_connection() as conn:
+            rows = conn.execute("SELECT question_id FROM quiz_questions WHERE quiz_id = ?", (quiz_id,)).fetchall()
+        return [row['question_id'] for row in rows]
+
+    @staticmethod
+    def get_bank(quiz_id):
+        """Get a quiz's questions as a QuestionBank, for drawing an attempt from"""
+        return QuestionBank(Question.get_bank_version(), Question.get_many(Quiz.get_question_ids(quiz_id)))
+
+    @staticmethod
+    def _set_questions(conn, quiz_id, question_ids):
+        question_ids = sorted(set(question_ids))
+        conn.execute("DELETE FROM quiz_questions WHERE quiz_id = ?", (quiz_id,))
+        conn.executemany(
+            "INSERT INTO quiz_questions (quiz_id, question_id) VALUES (?, ?)",
+            [(quiz_id, question_id) for question_id in question_ids]
+        )
+        conn.execute("UPDATE quizzes SET question_count = ? WHERE id = ?", (len(question_ids), quiz_id))
+
+    @staticmethod
+    def create(title, description, question_ids, category=None, difficulty=None, size=None, duration=None):
+        """Create a quiz over the given questions and return its ID"""
+        with db_connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO quizzes (title, description, category, difficulty, size, duration) VALUES (?, ?, ?, ?, ?, ?)",
+                (title, description, category, difficulty, size, duration)
+            )
+            quiz_id = cursor.lastrowid
+            Quiz._set_questions(conn, quiz_id, question_ids)
+            conn.commit()
+        _notify_write('questions')
+        return quiz_id
+
+    @staticmethod
+    def update(quiz_id, title, description, question_ids, category=None, difficulty=None, size=None, duration=None):
+        """Update a quiz and replace its questions"""
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE quizzes SET title = ?, description = ?, category = ?, difficulty = ?, size = ?, duration = ? WHERE id = ?",
+                (title, description, category, difficulty, size, duration, quiz_id)
+            )
+            Quiz._set_questions(conn, quiz_id, question_ids)
+            conn.commit()
+        _notify_write('questions')
+        return True
+
+    @staticmethod
+    def delete(quiz_id):
+        """Delete a quiz; its results are kept"""
+        with db_connection() as conn:
+            conn.execute("DELETE FROM quizzes WHERE id = ?", (quiz_id,))
+            conn.commit()
+        _notify_write('questions')
         return True
 
 class Result:
-    """Result model to handle quiz result operations"""
-    
+    """Result model to handle quiz result operations, stored by the results repository"""
+
     @staticmethod
-    def save(user_id, score, total):
-        """Save quiz result"""
-        conn = get_db_connection()
-        conn.execute(
-            "INSERT INTO results (user_id, score, total) VALUES (?, ?, ?)",
-            (user_id, score, total)
+    def save(user_id, score, total, question_ids=None, answers=None, quiz_id=None):
+        """Save quiz result, with the packed answers used for question analytics"""
+        get_repository().add(
+            [result_row(user_id, score, total, question_ids, answers, quiz_id)],
+            on_main=lambda conn: EventLog.append(conn, [('result_saved', None, user_id, quiz_id, score, total)])
         )
-        conn.commit()
-        conn.close()
+        _notify_write('results')
         return True
-    
-    @staticmethod
-    def get_by_user(user_id):
-        """Get results for a specific user"""
-        conn = get_db_connection()
-        results = conn.execute(
-            "SELECT * FROM results WHERE user_id = ? ORDER BY quiz_date DESC",
-            (user_id,)
-        ).fetchall()
-        conn.close()
-        return results
-    
+
+    @staticmethod
+    def get_version():
+        """Get a number that grows with every saved result, for cache keys"""
+        return get_repository().get_version()
+
+    @staticmethod
+    def get_history(user_id, cursor=None, limit=10):
+        """Get one page of a user's results, newest first, after a (quiz_date, id) cursor
+
+        Returns the rows and the cursor of the next page (None on the last page).
+        """
+        return get_repository().get_history(user_id, cursor, limit)
+
+    @staticmethod
+    def get_recent(limit=5):
+        """Get the most recent results with user information"""
+        return get_repository().get_page(None, limit)[0]
+
+    @staticmethod
+    def get_stats():
+        """Get the dashboard counters kept up to date by the quiz_stats triggers"""
+        row = get_repository().get_stats()
+
+        if not row:
+            return {'total_questions': 0, 'total_quizzes': 0, 'unique_users': 0, 'average_score': 0}
+
+        average_score = 0
+        if row['total_quizzes'] > 0:
+            average_score = round(row['percentage_sum'] / row['total_quizzes'], 1)
+
+        return {
+            'total_questions': row['total_questions'],
+            'total_quizzes': row['total_quizzes'],
+            'unique_users': row['unique_users'],
+            'average_score': average_score
+        }
+
+    @staticmethod
+    def get_page(cursor=None, limit=50, **filters):
+        """Get one page of results, newest first, after a (quiz_date, id) cursor
+
+        Filters are user_id, email, quiz_id, date_from, date_to, min_percentage
+        and max_percentage. Returns the rows and the cursor of the next page
+        (None on the last page).
+        """
+        return get_repository().get_page(cursor, limit, **filters)
+
+    @staticmethod
+    def iter_all(batch_size=500, **filters):
+        """Yield results page by page so only one batch is held in memory"""
+        cursor = None
+        while True:
+            results, cursor = Result.get_page(cursor, batch_size, **filters)
+            yield from results
+            if cursor is None:
+                break
+
+    @staticmethod
+    def get_summary(**filters):
+        """Get count, average, extremes and score bands of the filtered results"""
+        return get_repository().get_summary(**filters)
+
     @staticmethod
     def get_all():
         """Get all results with user information"""
-        conn = get_db_connection()
-        results = conn.execute(
-            """
-            SELECT r.*, u.name, u.email 
-            FROM results r
-            JOIN users u ON r.user_id = u.id
-            ORDER BY r.quiz_date DESC
-            """
+        return list(Result.iter_all())
+
+class UserSummary:
+    """Per-user totals, kept up to date by a trigger on every saved result"""
+
+    @staticmethod
+    def get(user_id, now=None):
+        """Get a user's summary, or None before their first result
+
+        Percentages are rounded; streak is the number of consecutive days
+        with a quiz, and 0 once a whole day has passed without one (UTC).
+        """
+        row = get_repository().get_user_summary(user_id)
+        if not row:
+            return None
+
+        today = (now or datetime.datetime.now(datetime.timezone.utc)).date()
+        last_day = datetime.date.fromisoformat(row['streak_last_day'])
+        return {
+            'attempts': row['attempts'],
+            'average_percentage': round(row['total_score'] * 100 / row['total_questions']) if row['total_questions'] else 0,
+            'recent_percentage': round(row['recent_percentage']),
+            'best_score': row['best_score'],
+            'best_total': row['best_total'],
+            'best_percentage': round(row['best_percentage']),
+            'last_score': row['last_score'],
+            'last_total': row['last_total'],
+            'last_percentage': round(row['last_score'] * 100 / row['last_total']) if row['last_total'] else 0,
+            'last_quiz_date': row['last_quiz_date'],
+            'streak': row['streak_days'] if (today - last_day).days <= 1 else 0,
+        }
+
+class Leaderboard:
+    """Best result per user, kept up to date by the leaderboard triggers"""
+
+    PERIODS = ('all', 'week', 'day')
+
+    @staticmethod
+    def period_start(period, now=None):
+        """Get the key of the current window of a period, as the triggers compute it (UTC)"""
+        today = (now or datetime.datetime.now(datetime.timezone.utc)).date()
+        if period == 'day':
+            return today.isoformat()
+        if period == 'week':
+            return (today - datetime.timedelta(days=today.weekday())).isoformat()
+        return ''
+
+    @staticmethod
+    def get_top(period='all', limit=10):
+        """Get the best users of the current window, best first"""
+        return get_repository().get_leaderboard(period, Leaderboard.period_start(period), limit)
+
+    @staticmethod
+    def get_rank(user_id, period='all'):
+        """Get a user's best result and rank in the current window, or None if they have none"""
+        return get_repository().get_leaderboard_rank(period, Leaderboard.period_start(period), user_id)
+
+class Attempt:
+    """Attempt model to handle the server-side state of a quiz in progress"""
+
+    @staticmethod
+    def create(user_id, question_ids, duration=None, quiz_id=None):
+        """Start a new attempt over the given questions and return its ID
+
+        A duration in seconds makes it a timed attempt that closes at its deadline.
+        """
+        expires_at = int(time.time() + duration) if duration else None
+        with db_connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO attempts (user_id, question_ids, expires_at, quiz_id) VALUES (?, ?, ?, ?)",
+                (user_id, json.dumps(question_ids), expires_at, quiz_id)
+            )
+            conn.commit()
+            attempt_id = cursor.lastrowid
+
+        _attempt_cache.set(attempt_id, (user_id, tuple(question_ids)))
+        return attempt_id
+
+    @staticmethod
+    def get(attempt_id):
+        """Get an attempt with its question IDs and current position"""
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT user_id, question_ids, current_question, expires_at FROM attempts WHERE id = ?",
+                (attempt_id,)
+            ).fetchone()
+
+        if not row:
+            _attempt_cache.pop(attempt_id)
+            return None
+
+        # The question list never changes, so only decode it once per process
+        cached = _attempt_cache.get(attempt_id)
+        if cached is None:
+            cached = (row['user_id'], tuple(json.loads(row['question_ids'])))
+            _attempt_cache.set(attempt_id, cached)
+
+        return {
+            'id': attempt_id,
+            'user_id': cached[0],
+            'question_ids': cached[1],
+            'current_question': row['current_question'],
+            'expires_at': row['expires_at']
+        }
+
+    @staticmethod
+    def save_answer(attempt_id, question_id, answer, next_question):
+        """Store an answer and move the attempt to the next question"""
+        with db_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO attempt_answers (attempt_id, question_id, answer) VALUES (?, ?, ?)
+                ON CONFLICT (attempt_id, question_id) DO UPDATE SET answer = excluded.answer
+                """,
+                (attempt_id, question_id, answer)
+            )
+            conn.execute(
+                "UPDATE attempts SET current_question = ? WHERE id = ?",
+                (next_question, attempt_id)
+            )
+            conn.commit()
+        return True
+
+    @staticmethod
+    def save_answers(attempt_id, answers, next_question):
+        """Store a batch of (question_id, answer) pairs and move the attempt on, in one commit"""
+        with db_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO attempt_answers (attempt_id, question_id, answer) VALUES (?, ?, ?)
+                ON CONFLICT (attempt_id, question_id) DO UPDATE SET answer = excluded.answer
+                """,
+                [(attempt_id, question_id, answer) for question_id, answer in answers]
+            )
+            conn.execute(
+                "UPDATE attempts SET current_question = ? WHERE id = ?",
+                (next_question, attempt_id)
+            )
+            conn.commit()
+        return True
+
+    @staticmethod
+    def set_position(attempt_id, current_question):
+        """Move the attempt to another question without answering"""
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE attempts SET current_question = ? WHERE id = ?",
+                (current_question, attempt_id)
+            )
+            conn.commit()
+        return True
+
+    @staticmethod
+    def get_answers(attempt_id):
+        """Get the answers of an attempt keyed by question ID"""
+        with db_connection() as conn:
+            rows = conn.execute(
+                "SELECT question_id, answer FROM attempt_answers WHERE attempt_id = ?",
+                (attempt_id,)
+            ).fetchall()
+        return {row['question_id']: row['answer'] for row in rows}
+
+    @staticmethod
+    def finalize(grade, attempt_id=None, expired_before=None, limit=500):
+        """Score attempts, save their results and events and delete them, all in one transaction
+
+        Works on one attempt by ID or on up to `limit` attempts whose deadline
+        is before `expired_before`. grade(attempt, answers) returns a dict with
+        score, total, question_ids and answers for the results row, or None to
+        close the attempt without a result. Attempts closed concurrently by
+        another request or process are skipped, so each is scored exactly once.
+        Returns (attempt, graded) pairs. With the sharded results backend the
+        results are committed to their shards just before the attempts are
+        deleted, not in the same transaction; if deleting them fails, the
+        next finalize skips the results already saved (see result_row).
+        """
+        def close(conn):
+            if attempt_id is not None:
+                rows = conn.execute(
+                    "SELECT id, user_id, question_ids, quiz_id FROM attempts WHERE id = ?", (attempt_id,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, user_id, question_ids, quiz_id FROM attempts WHERE expires_at < ? ORDER BY expires_at LIMIT ?",
+                    (expired_before, limit)
+                ).fetchall()
+            if not rows:
+                return []
+
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join('?' * len(ids))
+            answers = {}
+            for row in conn.execute(
+                f"SELECT attempt_id, question_id, answer FROM attempt_answers WHERE attempt_id IN ({placeholders})",
+                ids
+            ):
+                answers.setdefault(row['attempt_id'], {})[row['question_id']] = row['answer']
+
+            finished = []
+            for row in rows:
+                attempt = {
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'question_ids': tuple(json.loads(row['question_ids'])),
+                    'quiz_id': row['quiz_id']
+                }
+                finished.append((attempt, grade(attempt, answers.get(row['id'], {}))))
+
+            # The default backend saves the results in this transaction
+            get_repository().add(
+                [
+                    result_row(attempt['user_id'], graded['score'], graded['total'], graded['question_ids'],
+                               graded['answers'], attempt['quiz_id'], attempt_id=attempt['id'])
+                    for attempt, graded in finished if graded
+                ],
+                conn
+            )
+            EventLog.append(conn, [
+                ('attempt_expired' if attempt_id is None else 'attempt_finished', attempt['id'],
+                 attempt['user_id'], attempt['quiz_id'], graded['score'], graded['total'])
+                for attempt, graded in finished if graded
+            ])
+            conn.execute(f"DELETE FROM attempt_answers WHERE attempt_id IN ({placeholders})", ids)
+            conn.execute(f"DELETE FROM attempts WHERE id IN ({placeholders})", ids)
+            return finished
+
+        # Result inserts share the group-commit batches when they are enabled
+        if writer.ENABLED:
+            finished = writer.get_writer().submit(close)
+        else:
+            with db_connection() as conn:
+                # Take the write lock before reading so two finalizers never claim the same attempt
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    finished = close(conn)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+        for attempt, _ in finished:
+            _attempt_cache.pop(attempt['id'])
+        if finished:
+            _notify_write('results')
+        return finished
+
+    @staticmethod
+    def delete_abandoned(started_before, limit=500):
+        """Delete up to limit untimed attempts started before a Unix time, with their answers
+
+        Timed attempts are left to finalize, which scores them. Returns the
+        number of attempts deleted.
+        """
+        with db_connection() as conn:
+            attempt_ids = [row['id'] for row in conn.execute(
+                "SELECT id FROM attempts WHERE expires_at IS NULL AND started_at < datetime(?, 'unixepoch') LIMIT ?",
+                (int(started_before), limit)
+            )]
+            if attempt_ids:
+                placeholders = ', '.join('?' * len(attempt_ids))
+                conn.execute(f"DELETE FROM attempt_answers WHERE attempt_id IN ({placeholders})", attempt_ids)
+                conn.execute(f"DELETE FROM attempts WHERE id IN ({placeholders})", attempt_ids)
+                conn.commit()
+        for attempt_id in attempt_ids:
+            _attempt_cache.pop(attempt_id)
+        return len(attempt_ids)
+
+    @staticmethod
+    def delete(attempt_id):
+        """Delete an attempt and its answers"""
+        with db_connection() as conn:
+            conn.execute("DELETE FROM attempt_answers WHERE attempt_id = ?", (attempt_id,))
+            conn.execute("DELETE FROM attempts WHERE id = ?", (attempt_id,))
+            conn.commit()
+        _attempt_cache.pop(attempt_id)
+        return True
+
+class EventLog:
+    """Append-only log of saved results, read in order by the consumers in events.py"""
+
+    @staticmethod
+    def append(conn, events):
+        """Add (type, attempt_id, user_id, quiz_id, score, total) events in the caller's transaction"""
+        conn.executemany(
+            "INSERT INTO attempt_events (type, attempt_id, user_id, quiz_id, score, total) VALUES (?, ?, ?, ?, ?, ?)",
+            events
+        )
+
+    @staticmethod
+    def read(conn, after, limit):
+        """Get up to `limit` events with an ID above `after`, oldest first"""
+        return conn.execute(
+            "SELECT * FROM attempt_events WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
         ).fetchall()
-        conn.close()
-        return results
\ No newline at end of file
+
+    @staticmethod
+    def get_position(conn, consumer):
+        """Get the ID of the last event a consumer has handled (0 before its first)"""
+        row = conn.execute("SELECT position FROM consumer_offsets WHERE consumer = ?", (consumer,)).fetchone()
+        return row['position'] if row else 0
+
+    @staticmethod
+    def set_position(conn, consumer, position):
+        """Checkpoint a consumer in the caller's transaction"""
+        conn.execute(
+            """
+            INSERT INTO consumer_offsets (consumer, position) VALUES (?, ?)
+            ON CONFLICT (consumer) DO UPDATE SET position = excluded.position, updated_at = CURRENT_TIMESTAMP
+            """,
+            (consumer, position)
+        )
+
+    @staticmethod
+    def get_last_id():
+        """Get the ID of the newest event (0 when the log is empty)"""
+        with db_connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM attempt_events").fetchone()[0]
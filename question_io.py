@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import time
+from models import Question
+
+QUESTION_FIELDS = ['question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_ans']
+OPTION_FIELDS = ['option_a', 'option_b', 'option_c', 'option_d']
+OPTIONAL_FIELDS = ['category', 'difficulty']
+EXPORT_FIELDS = ['id'] + QUESTION_FIELDS + OPTIONAL_FIELDS
+
+# Rows per executemany transaction and the most row errors kept for the report
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# Leading characters that make a spreadsheet read a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_cell(value):
+    """Make a value safe to open in a spreadsheet by quoting would-be formulas with a '"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def read_csv_cell(value):
+    """Undo csv_cell, so exported questions import unchanged"""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+def validate_question(row):
+    """Check an imported row against the question form rules
+
+    Returns (values, None) for a valid row, or (None, error message). The
+    correct answer may be given as the text of an option or as its letter A-D.
+    """
+    if not isinstance(row, dict):
+        return None, 'Row is not an object'
+
+    values = {}
+    for field in QUESTION_FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            return None, f'Missing {field}'
+        values[field] = value
+
+    options = [values[field] for field in OPTION_FIELDS]
+    correct_ans = values['correct_ans']
+    if correct_ans not in options:
+        letter = correct_ans.upper()
+        if len(letter) == 1 and 'A' <= letter <= 'D':
+            correct_ans = options[ord(letter) - ord('A')]
+        else:
+            return None, 'correct_ans must match one of the options'
+
+    # Category and difficulty are optional
+    extra = []
+    for field in OPTIONAL_FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        extra.append(value or None)
+
+    return (values['question'], *options, correct_ans, *extra), None
+
+def read_csv(stream):
+    """Yield (line number, row) pairs from a CSV text stream with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {field: read_csv_cell(value) for field, value in row.items()}
+
+def read_json(stream, chunk_size=65536):
+    """Yield (row number, row) pairs from a JSON array or JSON Lines text stream
+
+    Objects are decoded one at a time as chunks arrive, so the whole file is
+    never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    number = 0
+    while True:
+        # Skip what separates objects: array brackets, commas and whitespace
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise ValueError(f'Invalid JSON after row {number}')
+            # The object continues in the next chunk
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        number += 1
+        buffer = buffer[end:]
+        yield number, row
+
+def import_questions(stream, file_format='csv', batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert questions from a CSV or JSON text stream in batches
+
+    Returns a report with the number of rows read and inserted, the row
+    errors and the throughput in rows per second.
+    """
+    reader = read_json if file_format == 'json' else read_csv
+    report = {'rows': 0, 'inserted': 0, 'error_count': 0, 'errors': []}
+    started = time.perf_counter()
+    batch = []
+
+    def add_error(number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append((number, message))
+
+    try:
+        for number, row in reader(stream):
+            report['rows'] += 1
+            values, error = validate_question(row)
+            if error:
+                add_error(number, error)
+                continue
+
+            batch.append(values)
+            if len(batch) >= batch_size:
+                report['inserted'] += Question.bulk_create(batch)
+                batch = []
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        # The file itself is malformed; keep what was read before the problem
+        add_error(report['rows'] + 1, str(e))
+
+    if batch:
+        report['inserted'] += Question.bulk_create(batch)
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0
+    return report
+
+def export_questions(file_format='csv'):
+    """Yield the question bank as CSV or JSON text chunks"""
+    if file_format == 'json':
+        yield '['
+        separator = ''
+        for question in Question.iter_all():
+            yield separator + json.dumps({field: question[field] for field in EXPORT_FIELDS})
+            separator = ','
+        yield ']'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for question in Question.iter_all():
+        writer.writerow([csv_cell(question[field]) for field in EXPORT_FIELDS])
+        # Flush the buffer now and then instead of yielding every row
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def detect_format(filename, default='csv'):
+    """Guess the file format from a file name"""
+    filename = (filename or '').lower()
+    if filename.endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    if filename.endswith('.csv'):
+        return 'csv'
+    return default
@@ -0,0 +1,646 @@
+import heapq
+import math
+import os
+import threading
+from contextlib import contextmanager
+import database
+from database import db_connection
+import writer
+
+# Rounded percentage of a result row, as shown on the results pages
+RESULT_PERCENTAGE = "ROUND(r.score * 100.0 / r.total)"
+
+# Result columns shown in listings; the packed answers are only read by analytics
+RESULT_COLUMNS = "r.id, r.user_id, r.score, r.total, r.quiz_date"
+
+# Columns of a row passed to ResultRepository.add, in order (see result_row). A
+# second result for the same attempt is skipped, so saving one again is harmless.
+INSERT_RESULT = """
+    INSERT INTO results (user_id, score, total, question_ids, answers, quiz_id, quiz_date, attempt_id)
+    VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+    ON CONFLICT (attempt_id) WHERE attempt_id IS NOT NULL DO NOTHING
+"""
+
+# Scores per shard in the summary query, combined across shards in Python
+SUMMARY_QUERY = f"""
+    SELECT COUNT(*) AS total_quizzes,
+           SUM(pct) AS pct_sum,
+           MAX(pct) AS highest,
+           MIN(pct) AS lowest,
+           COALESCE(SUM(pct >= 80), 0) AS excellent,
+           COALESCE(SUM(pct >= 60 AND pct < 80), 0) AS good,
+           COALESCE(SUM(pct >= 40 AND pct < 60), 0) AS average_band,
+           COALESCE(SUM(pct < 40), 0) AS poor
+    FROM (
+        SELECT CAST({RESULT_PERCENTAGE} AS INTEGER) AS pct
+        FROM results r
+        {{join}}
+        {{where}}
+    )
+"""
+
+# The same columns for all results, from the counters the quiz_stats triggers keep
+SUMMARY_COUNTERS = """
+    SELECT total_quizzes,
+           rounded_percentage_sum AS pct_sum,
+           highest_percentage AS highest,
+           lowest_percentage AS lowest,
+           excellent, good, average_band, poor
+    FROM quiz_stats
+    WHERE id = 1
+"""
+
+SUMMARY_BANDS = ('excellent', 'good', 'average_band', 'poor')
+
+def result_row(user_id, score, total, question_ids=None, answers=None, quiz_id=None, quiz_date=None,
+               attempt_id=None):
+    """Build a row for ResultRepository.add; quiz_date defaults to now
+
+    attempt_id is set for results of an attempt, which are saved at most once.
+    """
+    return (user_id, score, total, question_ids, answers, quiz_id, quiz_date, attempt_id)
+
+def run_in_main_transaction(write):
+    """Run write(conn) on the main database and commit
+
+    With group commit on, the writer thread commits it together with the
+    writes of other requests.
+    """
+    if writer.ENABLED:
+        return writer.get_writer().submit(write)
+    with db_connection() as conn:
+        value = write(conn)
+        conn.commit()
+    return value
+
+def filter_clauses(user_id=None, email=None, date_from=None, date_to=None,
+                   min_percentage=None, max_percentage=None, quiz_id=None):
+    """Build the WHERE clauses and parameters for result filters"""
+    clauses = []
+    params = []
+    if user_id is not None:
+        clauses.append("r.user_id = ?")
+        params.append(user_id)
+    if quiz_id is not None:
+        clauses.append("r.quiz_id = ?")
+        params.append(quiz_id)
+    if email:
+        clauses.append("u.email = ?")
+        params.append(email)
+    if date_from:
+        clauses.append("r.quiz_date >= date(?)")
+        params.append(date_from)
+    if date_to:
+        # The end date is inclusive
+        clauses.append("r.quiz_date < date(?, '+1 day')")
+        params.append(date_to)
+    if min_percentage is not None:
+        clauses.append(f"{RESULT_PERCENTAGE} >= ?")
+        params.append(min_percentage)
+    if max_percentage is not None:
+        clauses.append(f"{RESULT_PERCENTAGE} < ?")
+        params.append(max_percentage)
+    return clauses, params
+
+def split_page(rows, limit):
+    """Cut a page fetched with limit + 1 rows; returns the rows and the next (quiz_date, id) cursor"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['quiz_date'], rows[-1]['id'])
+    return rows, next_cursor
+
+class ResultRepository:
+    """Storage of quiz results and the per-user tables derived from them
+
+    Results, user_summary, leaderboard and the result counters of quiz_stats
+    live behind this interface so they can be stored apart from users and
+    questions. Rows come back as sqlite3.Row or dict, read by column name.
+    """
+
+    def ensure_schema(self):
+        """Create or upgrade whatever storage the backend needs besides the main database"""
+
+    def close(self):
+        """Close the backend's own connections"""
+
+    def add(self, rows, conn=None, on_main=None):
+        """Save result rows built by result_row
+
+        conn is an open transaction on the main database; backends that keep
+        results there write in it so the caller commits both together.
+        Without one, the save is committed before add returns. on_main(conn)
+        runs in the main database transaction that goes with the save, for
+        rows such as events that live next to users and attempts.
+        """
+        raise NotImplementedError
+
+    def get_version(self):
+        """Get a number that grows with every saved result"""
+        raise NotImplementedError
+
+    def get_stats(self):
+        """Get the quiz_stats counters (total_questions, total_quizzes, unique_users, percentage_sum) or None"""
+        raise NotImplementedError
+
+    def get_history(self, user_id, cursor, limit):
+        """Get one page of a user's results, newest first, and the next cursor"""
+        raise NotImplementedError
+
+    def get_page(self, cursor, limit, **filters):
+        """Get one page of results with user name and email, newest first, and the next cursor"""
+        raise NotImplementedError
+
+    def get_summary(self, **filters):
+        """Get count, average, extremes and score bands of the filtered results
+
+        Without filters this reads the quiz_stats counters; filtered summaries
+        aggregate the matching results, so callers should cache them.
+        """
+        raise NotImplementedError
+
+    def get_user_summary(self, user_id):
+        """Get a user's user_summary row, or None"""
+        raise NotImplementedError
+
+    def get_leaderboard(self, period, period_start, limit):
+        """Get the best users of a leaderboard window with their names, best first"""
+        raise NotImplementedError
+
+    def get_leaderboard_rank(self, period, period_start, user_id):
+        """Get a user's leaderboard entry with its rank, or None"""
+        raise NotImplementedError
+
+    def iter_answers(self, batch_size):
+        """Yield (percentage, question_ids, answers) of every result with packed answers"""
+        raise NotImplementedError
+
+class SQLiteResultRepository(ResultRepository):
+    """Results in the main database, next to users and questions (the default)"""
+
+    def add(self, rows, conn=None, on_main=None):
+        rows = list(rows)
+
+        def insert(conn):
+            if rows:
+                conn.executemany(INSERT_RESULT, rows)
+            if on_main is not None:
+                on_main(conn)
+
+        if conn is not None:
+            insert(conn)
+        elif rows or on_main is not None:
+            run_in_main_transaction(insert)
+
+    def get_version(self):
+        with db_connection() as conn:
+            row = conn.execute("SELECT total_quizzes FROM quiz_stats WHERE id = 1").fetchone()
+        return row['total_quizzes'] if row else 0
+
+    def get_stats(self):
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT total_questions, total_quizzes, unique_users, percentage_sum FROM quiz_stats WHERE id = 1"
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_history(self, user_id, cursor, limit):
+        cursor = cursor or ('9999-12-31', 0)
+        with db_connection() as conn:
+            results = conn.execute(
+                f"""
+                SELECT {RESULT_COLUMNS}
+                FROM results r
+                WHERE r.user_id = ? AND (r.quiz_date, r.id) < (?, ?)
+                ORDER BY r.quiz_date DESC, r.id DESC
+                LIMIT ?
+                """,
+                (user_id, cursor[0], cursor[1], limit + 1)
+            ).fetchall()
+        return split_page(results, limit)
+
+    def get_page(self, cursor, limit, **filters):
+        clauses, params = filter_clauses(**filters)
+        if cursor:
+            # Keyset pagination: continue strictly after the last row of the previous page
+            clauses.append("(r.quiz_date, r.id) < (?, ?)")
+            params.extend(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with db_connection() as conn:
+            results = conn.execute(
+                f"""
+                SELECT {RESULT_COLUMNS}, u.name, u.email
+                FROM results r
+                JOIN users u ON r.user_id = u.id
+                {where}
+                ORDER BY r.quiz_date DESC, r.id DESC
+                LIMIT ?
+                """,
+                params + [limit + 1]
+            ).fetchall()
+        return split_page(results, limit)
+
+    def get_summary(self, **filters):
+        clauses, params = filter_clauses(**filters)
+        if clauses:
+            # Users are only needed to match an email
+            join = 'JOIN users u ON r.user_id = u.id' if filters.get('email') else ''
+            query = SUMMARY_QUERY.format(join=join, where=f"WHERE {' AND '.join(clauses)}")
+        else:
+            query = SUMMARY_COUNTERS
+
+        with db_connection() as conn:
+            row = conn.execute(
+                f"""
+                SELECT total_quizzes, ROUND(pct_sum * 1.0 / total_quizzes, 1) AS average,
+                       highest, lowest, {', '.join(SUMMARY_BANDS)}
+                FROM ({query})
+                """,
+                params
+            ).fetchone()
+        return dict(row)
+
+    def get_user_summary(self, user_id):
+        with db_connection() as conn:
+            return conn.execute("SELECT * FROM user_summary WHERE user_id = ?", (user_id,)).fetchone()
+
+    def get_leaderboard(self, period, period_start, limit):
+        with db_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT l.user_id, u.name, l.best_score, l.best_total, l.best_percentage, l.achieved_at
+                FROM leaderboard l
+                JOIN users u ON l.user_id = u.id
+                WHERE l.period = ? AND l.period_start = ?
+                ORDER BY l.best_percentage DESC, l.achieved_at
+                LIMIT ?
+                """,
+                (period, period_start, limit)
+            ).fetchall()
+        return rows
+
+    def get_leaderboard_rank(self, period, period_start, user_id):
+        with db_connection() as conn:
+            row = conn.execute(
+                """
+                SELECT best_score, best_total, best_percentage, achieved_at FROM leaderboard
+                WHERE period = ? AND period_start = ? AND user_id = ?
+                """,
+                (period, period_start, user_id)
+            ).fetchone()
+            if not row:
+                return None
+            ahead = _count_ahead(conn, period, period_start, row)
+
+        result = dict(row)
+        result['rank'] = ahead + 1
+        return result
+
+    def iter_answers(self, batch_size):
+        with db_connection() as conn:
+            yield from _iter_answers(conn, batch_size)
+
+def _count_ahead(conn, period, period_start, entry):
+    # Count the users ahead through the rank index; equal scores set earlier rank higher
+    return conn.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM leaderboard
+             WHERE period = ? AND period_start = ? AND best_percentage > ?) +
+            (SELECT COUNT(*) FROM leaderboard
+             WHERE period = ? AND period_start = ? AND best_percentage = ? AND achieved_at < ?)
+        """,
+        (period, period_start, entry['best_percentage'],
+         period, period_start, entry['best_percentage'], entry['achieved_at'])
+    ).fetchone()[0]
+
+def _iter_answers(conn, batch_size):
+    cursor = conn.execute(
+        "SELECT score * 100.0 / total, question_ids, answers FROM results "
+        "WHERE answers IS NOT NULL AND total > 0"
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def _round_half_up(value, digits):
+    # Matches SQLite's ROUND for the non-negative percentages summarised here
+    scale = 10 ** digits
+    return math.floor(value * scale + 0.5) / scale
+
+class ShardedResultRepository(ResultRepository):
+    """Results spread over several SQLite files by user_id, each with its own write lock
+
+    Every shard carries the full schema, so the result triggers keep its
+    user_summary, leaderboard and quiz_stats rows up to date; only the result
+    tables are used there. A user's results, summary and leaderboard entries
+    all live in shard user_id % N, so per-user reads touch one file while
+    admin listings, totals and the leaderboard read every shard and merge.
+    Result IDs are assigned per shard as shard + 1 + k * N, so they stay
+    unique across shards. Users and questions stay in the main database.
+    """
+
+    def __init__(self, paths, pool_size=database.POOL_SIZE, pool_timeout=database.POOL_TIMEOUT):
+        self.paths = list(paths)
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._pools = None
+        self._lock = threading.Lock()
+
+    def ensure_schema(self):
+        for path in self.paths:
+            if not database.schema_is_current(path):
+                database.migrate_file(path)
+
+    def close(self):
+        pools, self._pools = self._pools, None
+        for pool in pools or ():
+            pool.close()
+
+    def reset_pools(self):
+        """Forget every pooled connection without closing it (after a fork)"""
+        self._pools = None
+        self._lock = threading.Lock()
+
+    def _get_pools(self):
+        if self._pools is None:
+            with self._lock:
+                if self._pools is None:
+                    self._pools = [
+                        database.ConnectionPool(self.pool_size, self.pool_timeout, path) for path in self.paths
+                    ]
+        return self._pools
+
+    @contextmanager
+    def _connection(self, shard):
+        pool = self._get_pools()[shard]
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    def shard_of(self, user_id):
+        """Index of the shard holding a user's results"""
+        return user_id % len(self.paths)
+
+    def _query_shards(self, sql, params=(), shards=None):
+        """Run a query on each shard (all by default) and return the rows of each"""
+        results = []
+        for shard in range(len(self.paths)) if shards is None else shards:
+            with self._connection(shard) as conn:
+                results.append(conn.execute(sql, params).fetchall())
+        return results
+
+    def _add_users(self, rows):
+        """Copy rows into dicts with the name and email of their user from the main database"""
+        user_ids = list({row['user_id'] for row in rows})
+        users = {}
+        if user_ids:
+            placeholders = ', '.join('?' * len(user_ids))
+            with db_connection() as conn:
+                for user in conn.execute(f"SELECT id, name, email FROM users WHERE id IN ({placeholders})", user_ids):
+                    users[user['id']] = user
+
+        merged = []
+        for row in rows:
+            row = dict(row)
+            user = users.get(row['user_id'])
+            row['name'] = user['name'] if user else None
+            row['email'] = user['email'] if user else None
+            merged.append(row)
+        return merged
+
+    def _route(self, filters):
+        """Resolve an email filter to a user and pick the shards to read
+
+        Returns the filters to run on the shards and their indexes, or None
+        when no result can match.
+        """
+        filters = dict(filters)
+        email = filters.pop('email', None)
+        if email:
+            with db_connection() as conn:
+                user = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+            if not user or filters.get('user_id') not in (None, user['id']):
+                return None
+            filters['user_id'] = user['id']
+        if filters.get('user_id') is not None:
+            return filters, [self.shard_of(filters['user_id'])]
+        return filters, None
+
+    def add(self, rows, conn=None, on_main=None):
+        # Results are committed to their shards right away, not in the caller's transaction.
+        # If that transaction then fails, the attempt is finalized again later and its
+        # result, already in the shard, is skipped by attempt_id.
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self.shard_of(row[0]), []).append(row)
+
+        count = len(self.paths)
+        for shard, shard_rows in by_shard.items():
+            with self._connection(shard) as shard_conn:
+                shard_conn.execute("BEGIN IMMEDIATE")
+                try:
+                    shard_conn.executemany(
+                        """
+                        INSERT INTO results (id, user_id, score, total, question_ids, answers, quiz_id, quiz_date,
+                                             attempt_id)
+                        VALUES ((SELECT COALESCE(MAX(id), ?) + ? FROM results), ?, ?, ?, ?, ?, ?,
+                                COALESCE(?, CURRENT_TIMESTAMP), ?)
+                        ON CONFLICT (attempt_id) WHERE attempt_id IS NOT NULL DO NOTHING
+                        """,
+                        [(shard + 1 - count, count) + tuple(row) for row in shard_rows]
+                    )
+                    shard_conn.commit()
+                except Exception:
+                    shard_conn.rollback()
+                    raise
+
+        if on_main is not None:
+            if conn is not None:
+                on_main(conn)
+            else:
+                run_in_main_transaction(on_main)
+
+    def get_version(self):
+        return sum(
+            rows[0]['total_quizzes'] if rows else 0
+            for rows in self._query_shards("SELECT total_quizzes FROM quiz_stats WHERE id = 1")
+        )
+
+    def get_stats(self):
+        with db_connection() as conn:
+            row = conn.execute("SELECT total_questions FROM quiz_stats WHERE id = 1").fetchone()
+        stats = {
+            'total_questions': row['total_questions'] if row else 0,
+            'total_quizzes': 0,
+            'unique_users': 0,
+            'percentage_sum': 0,
+        }
+        # Users never span shards, so unique users add up
+        for rows in self._query_shards(
+            "SELECT total_quizzes, unique_users, percentage_sum FROM quiz_stats WHERE id = 1"
+        ):
+            for key in ('total_quizzes', 'unique_users', 'percentage_sum'):
+                stats[key] += rows[0][key] if rows else 0
+        return stats
+
+    def get_history(self, user_id, cursor, limit):
+        cursor = cursor or ('9999-12-31', 0)
+        with self._connection(self.shard_of(user_id)) as conn:
+            results = conn.execute(
+                f"""
+                SELECT {RESULT_COLUMNS}
+                FROM results r
+                WHERE r.user_id = ? AND (r.quiz_date, r.id) < (?, ?)
+                ORDER BY r.quiz_date DESC, r.id DESC
+                LIMIT ?
+                """,
+                (user_id, cursor[0], cursor[1], limit + 1)
+            ).fetchall()
+        return split_page(results, limit)
+
+    def get_page(self, cursor, limit, **filters):
+        routed = self._route(filters)
+        if routed is None:
+            return [], None
+        filters, shards = routed
+
+        clauses, params = filter_clauses(**filters)
+        if cursor:
+            clauses.append("(r.quiz_date, r.id) < (?, ?)")
+            params.extend(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # Each shard returns its own newest rows; the page is the newest of all of them
+        pages = self._query_shards(
+            f"""
+            SELECT {RESULT_COLUMNS}
+            FROM results r
+            {where}
+            ORDER BY r.quiz_date DESC, r.id DESC
+            LIMIT ?
+            """,
+            params + [limit + 1],
+            shards
+        )
+        merged = list(heapq.merge(*pages, key=lambda row: (row['quiz_date'], row['id']), reverse=True))
+        return split_page(self._add_users(merged[:limit + 1]), limit)
+
+    def get_summary(self, **filters):
+        summary = {'total_quizzes': 0, 'average': None, 'highest': None, 'lowest': None}
+        summary.update(dict.fromkeys(SUMMARY_BANDS, 0))
+        routed = self._route(filters)
+        if routed is None:
+            return summary
+        filters, shards = routed
+
+        clauses, params = filter_clauses(**filters)
+        if clauses:
+            query = SUMMARY_QUERY.format(join='', where=f"WHERE {' AND '.join(clauses)}")
+        else:
+            query = SUMMARY_COUNTERS
+        pct_sum = 0
+        for rows in self._query_shards(query, params, shards):
+            row = rows[0] if rows else None
+            if not row or not row['total_quizzes']:
+                continue
+            summary['total_quizzes'] += row['total_quizzes']
+            pct_sum += row['pct_sum']
+            summary['highest'] = row['highest'] if summary['highest'] is None else max(summary['highest'], row['highest'])
+            summary['lowest'] = row['lowest'] if summary['lowest'] is None else min(summary['lowest'], row['lowest'])
+            for band in SUMMARY_BANDS:
+                summary[band] += row[band]
+        if summary['total_quizzes']:
+            summary['average'] = _round_half_up(pct_sum / summary['total_quizzes'], 1)
+        return summary
+
+    def get_user_summary(self, user_id):
+        with self._connection(self.shard_of(user_id)) as conn:
+            return conn.execute("SELECT * FROM user_summary WHERE user_id = ?", (user_id,)).fetchone()
+
+    def get_leaderboard(self, period, period_start, limit):
+        tops = self._query_shards(
+            """
+            SELECT user_id, best_score, best_total, best_percentage, achieved_at
+            FROM leaderboard
+            WHERE period = ? AND period_start = ?
+            ORDER BY best_percentage DESC, achieved_at
+            LIMIT ?
+            """,
+            (period, period_start, limit)
+        )
+        merged = list(heapq.merge(*tops, key=lambda row: (-row['best_percentage'], row['achieved_at'])))
+        return self._add_users(merged[:limit])
+
+    def get_leaderboard_rank(self, period, period_start, user_id):
+        with self._connection(self.shard_of(user_id)) as conn:
+            row = conn.execute(
+                """
+                SELECT best_score, best_total, best_percentage, achieved_at FROM leaderboard
+                WHERE period = ? AND period_start = ? AND user_id = ?
+                """,
+                (period, period_start, user_id)
+            ).fetchone()
+        if not row:
+            return None
+
+        ahead = 0
+        for shard in range(len(self.paths)):
+            with self._connection(shard) as conn:
+                ahead += _count_ahead(conn, period, period_start, row)
+
+        result = dict(row)
+        result['rank'] = ahead + 1
+        return result
+
+    def iter_answers(self, batch_size):
+        for shard in range(len(self.paths)):
+            with self._connection(shard) as conn:
+                yield from _iter_answers(conn, batch_size)
+
+def shard_paths(database_path, shards, pattern=None):
+    """Paths of the shard files; by default next to the main database (quiz-results-0.db, ...)"""
+    pattern = pattern or os.path.splitext(database_path)[0] + '-results-{shard}.db'
+    return [pattern.format(shard=shard) for shard in range(shards)]
+
+def create_repository(backend, database_path=None, shards=4, shard_path=None):
+    """Create the results repository named by backend"""
+    if backend == 'sqlite':
+        return SQLiteResultRepository()
+    if backend == 'sharded':
+        if shards < 1:
+            raise ValueError('RESULTS_SHARDS must be at least 1')
+        return ShardedResultRepository(shard_paths(database_path or database.DATABASE_PATH, shards, shard_path))
+    raise ValueError(f"Unknown RESULTS_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+BACKENDS = ('sqlite', 'sharded')
+
+_repository = SQLiteResultRepository()
+
+def _reset_after_fork():
+    # Shard connections opened before a fork belong to the parent
+    if isinstance(_repository, ShardedResultRepository):
+        _repository.reset_pools()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_repository():
+    """Get the results repository chosen by init_app"""
+    return _repository
+
+def init_app(app):
+    """Use the results backend named by the RESULTS_BACKEND setting"""
+    global _repository
+    _repository.close()
+    _repository = create_repository(
+        app.config.get('RESULTS_BACKEND', 'sqlite'),
+        database.DATABASE_PATH,
+        app.config.get('RESULTS_SHARDS', 4),
+        app.config.get('RESULTS_SHARD_PATH')
+    )
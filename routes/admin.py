@@ -1,9 +1,48 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import Question, Result, User
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, Response, stream_with_context
+from models import Question, Result, User, Leaderboard, Quiz
+from routes.quiz import get_leaderboard_period, parse_cursor
 from functools import wraps
+import question_io
+import caching
+import analytics
+import csv
+import datetime
+import io
+import json
+import re
 
 admin_bp = Blueprint('admin', __name__)
 
+# Results listing and export settings
+RESULTS_PER_PAGE = 50
+MAX_RESULTS_PER_PAGE = 200
+EXPORT_BATCH_SIZE = 1000
+
+# Questions per page of the question list and search results
+QUESTIONS_PER_PAGE = 50
+
+# Question difficulty levels offered in the admin forms
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+# Score bands as (minimum, maximum) rounded percentages, the maximum is exclusive
+SCORE_BANDS = {
+    'excellent': (80, None),
+    'good': (60, 80),
+    'average': (40, 60),
+    'poor': (None, 40),
+}
+
+# Item analysis thresholds for flagging questions on the analytics page
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+ANALYTICS_SORTS = {
+    'id': lambda item: item['id'],
+    'attempts': lambda item: -item['attempts'],
+    'difficulty': lambda item: (item['difficulty'] is None, item['difficulty'] or 0),
+    'discrimination': lambda item: (item['discrimination'] is None, item['discrimination'] or 0),
+}
+
 # Admin login required decorator
 def admin_required(f):
     @wraps(f)
@@ -17,39 +56,116 @@ def admin_required(f):
 @admin_bp.route('/admin')
 @admin_required
 def dashboard():
-    # Get stats for admin dashboard
-    questions = Question.get_all()
-    results = Result.get_all()
-    
-    # Calculate some stats
-    total_questions = len(questions)
-    total_quizzes = len(results)
-    
-    # Get unique users who took quizzes
-    unique_users = set()
-    for result in results:
-        unique_users.add(result['user_id'])
-    
-    # Calculate average score
-    average_score = 0
-    if total_quizzes > 0:
-        total_score_percentage = sum((r['score'] / r['total']) * 100 for r in results)
-        average_score = round(total_score_percentage / total_quizzes, 1)
-    
-    stats = {
-        'total_questions': total_questions,
-        'total_quizzes': total_quizzes,
-        'unique_users': len(unique_users),
-        'average_score': average_score
-    }
+    # Get stats for admin dashboard (counters maintained in the database)
+    stats = Result.get_stats()
     
-    return render_template('admin/dashboard.html', stats=stats, questions=questions, results=results)
+    # Only the few rows shown on the page
+    questions = Question.get_recent(5)
+    results = Result.get_recent(5)
+    board = get_leaderboard_period()
+    leaderboard = Leaderboard.get_top(board)
+    
+    return render_template(
+        'admin/dashboard.html',
+        stats=stats,
+        questions=questions,
+        results=results,
+        board=board,
+        leaderboard=leaderboard
+    )
+
+@admin_bp.route('/admin/analytics')
+@admin_required
+def question_analytics():
+    # Per-question statistics over every stored attempt, hardest and least discriminating first
+    items = analytics.get_item_analysis()
+    category = request.args.get('category') or None
+    if category:
+        items = [item for item in items if item['category'] == category]
+
+    sort = request.args.get('sort', 'difficulty')
+    if sort not in ANALYTICS_SORTS:
+        sort = 'difficulty'
+    items = sorted(items, key=ANALYTICS_SORTS[sort])
+
+    return render_template(
+        'admin/analytics.html',
+        items=items,
+        sort=sort,
+        category=category,
+        categories=Question.get_categories(),
+        too_easy=TOO_EASY,
+        too_hard=TOO_HARD,
+        low_discrimination=LOW_DISCRIMINATION
+    )
+
+def questions_cache_key():
+    return (
+        Question.get_bank_version(), caching.viewer_key(),
+        request.args.get('q', '').strip(), request.args.get('page', 1, type=int)
+    )
 
 @admin_bp.route('/admin/questions')
 @admin_required
+@caching.cached_page('questions', questions_cache_key)
 def questions():
-    questions = Question.get_all()
-    return render_template('admin/questions.html', questions=questions)
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    # Ranked full-text matches, or the whole bank a page at a time
+    bank = Question.get_bank()
+    if query:
+        page_questions, total = Question.search(query, page, QUESTIONS_PER_PAGE)
+    else:
+        start = (page - 1) * QUESTIONS_PER_PAGE
+        page_questions, total = bank.questions[start:start + QUESTIONS_PER_PAGE], len(bank.questions)
+    pages = max((total + QUESTIONS_PER_PAGE - 1) // QUESTIONS_PER_PAGE, 1)
+    
+    # The question table is the expensive part; it is shared by every admin until the bank changes
+    question_list = caching.render_fragment(
+        'questions', ('question_list', bank.version, query, page), 'admin/_question_list.html',
+        questions=page_questions, query=query
+    )
+    return render_template(
+        'admin/questions.html', question_list=question_list, query=query, page=page, pages=pages, total=total
+    )
+
+@admin_bp.route('/admin/questions/import', methods=['GET', 'POST'])
+@admin_required
+def import_questions():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        
+        # Validate data
+        if not upload or not upload.filename:
+            flash('Please choose a file to import', 'danger')
+            return render_template('admin/import_questions.html')
+        
+        file_format = request.form.get('format') or question_io.detect_format(upload.filename)
+        
+        # Read the upload as a text stream so it is processed in chunks
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = question_io.import_questions(stream, file_format)
+        
+        if report['inserted']:
+            flash(f"Imported {report['inserted']} of {report['rows']} questions", 'success')
+        else:
+            flash('No questions were imported', 'warning')
+        return render_template('admin/import_questions.html', report=report)
+    
+    return render_template('admin/import_questions.html')
+
+@admin_bp.route('/admin/questions/export')
+@admin_required
+def export_questions():
+    export_format = 'json' if request.args.get('format') == 'json' else 'csv'
+    mimetype = 'application/json' if export_format == 'json' else 'text/csv'
+    
+    return Response(
+        stream_with_context(question_io.export_questions(export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=questions.{export_format}'}
+    )
 
 @admin_bp.route('/admin/question/add', methods=['GET', 'POST'])
 @admin_required
@@ -62,6 +178,10 @@ def add_question():
         option_c = request.form.get('option_c')
         option_d = request.form.get('option_d')
         correct_ans = request.form.get('correct_ans')
+        category = request.form.get('category', '').strip() or None
+        difficulty = request.form.get('difficulty')
+        if difficulty not in DIFFICULTIES:
+            difficulty = None
         
         # Validate data
         if not all([question, option_a, option_b, option_c, option_d, correct_ans]):
@@ -71,14 +191,36 @@ def add_question():
                                   option_a=option_a,
                                   option_b=option_b,
                                   option_c=option_c,
-                                  option_d=option_d)
+                                  option_d=option_d,
+                                  category=category,
+                                  difficulty=difficulty,
+                                  categories=Question.get_categories(),
+                                  difficulties=DIFFICULTIES)
+        
+        # Warn about near-duplicates of existing questions unless the admin confirmed
+        if not request.form.get('allow_duplicate'):
+            duplicates = Question.find_similar(question)
+            if duplicates:
+                flash('A very similar question already exists. Check it or add this one anyway.', 'warning')
+                return render_template('admin/add_question.html',
+                                      question=question,
+                                      option_a=option_a,
+                                      option_b=option_b,
+                                      option_c=option_c,
+                                      option_d=option_d,
+                                      correct_ans=correct_ans,
+                                      category=category,
+                                      difficulty=difficulty,
+                                      duplicates=duplicates,
+                                      categories=Question.get_categories(),
+                                      difficulties=DIFFICULTIES)
         
         # Create question
-        Question.create(question, option_a, option_b, option_c, option_d, correct_ans)
+        Question.create(question, option_a, option_b, option_c, option_d, correct_ans, category, difficulty)
         flash('Question added successfully', 'success')
         return redirect(url_for('admin.questions'))
     
-    return render_template('admin/add_question.html')
+    return render_template('admin/add_question.html', categories=Question.get_categories(), difficulties=DIFFICULTIES)
 
 @admin_bp.route('/admin/question/edit/<int:question_id>', methods=['GET', 'POST'])
 @admin_required
@@ -98,18 +240,22 @@ def edit_question(question_id):
         option_c = request.form.get('option_c')
         option_d = request.form.get('option_d')
         correct_ans = request.form.get('correct_ans')
+        category = request.form.get('category', '').strip() or None
+        difficulty = request.form.get('difficulty')
+        if difficulty not in DIFFICULTIES:
+            difficulty = None
         
         # Validate data
         if not all([question_text, option_a, option_b, option_c, option_d, correct_ans]):
             flash('All fields are required', 'danger')
-            return render_template('admin/edit_question.html', question=question)
+            return render_template('admin/edit_question.html', question=question, categories=Question.get_categories(), difficulties=DIFFICULTIES)
         
         # Update question
-        Question.update(question_id, question_text, option_a, option_b, option_c, option_d, correct_ans)
+        Question.update(question_id, question_text, option_a, option_b, option_c, option_d, correct_ans, category, difficulty)
         flash('Question updated successfully', 'success')
         return redirect(url_for('admin.questions'))
     
-    return render_template('admin/edit_question.html', question=question)
+    return render_template('admin/edit_question.html', question=question, categories=Question.get_categories(), difficulties=DIFFICULTIES)
 
 @admin_bp.route('/admin/question/delete/<int:question_id>')
 @admin_required
@@ -126,8 +272,198 @@ def delete_question(question_id):
     flash('Question deleted successfully', 'success')
     return redirect(url_for('admin.questions'))
 
+def read_quiz_form():
+    """Read and check the quiz form
+
+    Returns the quiz fields and a list of error messages.
+    """
+    fields = {
+        'title': request.form.get('title', '').strip(),
+        'description': request.form.get('description', '').strip() or None,
+        'category': request.form.get('category', '').strip() or None,
+        'difficulty': request.form.get('difficulty') if request.form.get('difficulty') in DIFFICULTIES else None,
+        'size': request.form.get('size', type=int),
+        'duration': None,
+    }
+    errors = []
+    if not fields['title']:
+        errors.append('A title is required')
+    if fields['size'] is not None and fields['size'] < 1:
+        fields['size'] = None
+    minutes = request.form.get('duration', type=float)
+    if minutes and minutes > 0:
+        fields['duration'] = int(minutes * 60)
+    
+    # Questions listed by ID, plus every question tagged like the quiz if asked for
+    bank = Question.get_bank()
+    question_ids = [int(value) for value in re.findall(r'\d+', request.form.get('question_ids', ''))]
+    unknown = [question_id for question_id in question_ids if question_id not in bank.by_id]
+    if unknown:
+        errors.append(f"No questions with IDs {', '.join(map(str, unknown[:10]))}")
+    if request.form.get('include_matching'):
+        matching = set(bank.ids)
+        for field in ('category', 'difficulty'):
+            if fields[field]:
+                matching &= set(bank.ids_by(field).get(fields[field], ()))
+        question_ids.extend(matching)
+    fields['question_ids'] = sorted(set(question_ids) - set(unknown))
+    if not fields['question_ids']:
+        errors.append('Add at least one question to the quiz')
+    return fields, errors
+
+@admin_bp.route('/admin/quizzes')
+@admin_required
+def quizzes():
+    # Totals are built from the event log in the background, so they can trail new results by a moment
+    return render_template('admin/quizzes.html', quizzes=Quiz.get_all(), totals=Quiz.get_totals())
+
+@admin_bp.route('/admin/quiz/add', methods=['GET', 'POST'])
+@admin_required
+def add_quiz():
+    if request.method == 'POST':
+        fields, errors = read_quiz_form()
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+            return render_template('admin/quiz_form.html', quiz=fields, categories=Question.get_categories(), difficulties=DIFFICULTIES)
+        
+        Quiz.create(**fields)
+        flash('Quiz added successfully', 'success')
+        return redirect(url_for('admin.quizzes'))
+    
+    return render_template('admin/quiz_form.html', quiz={}, categories=Question.get_categories(), difficulties=DIFFICULTIES)
+
+@admin_bp.route('/admin/quiz/edit/<int:quiz_id>', methods=['GET', 'POST'])
+@admin_required
+def edit_quiz(quiz_id):
+    quiz = Quiz.get_by_id(quiz_id)
+    
+    if not quiz:
+        flash('Quiz not found', 'danger')
+        return redirect(url_for('admin.quizzes'))
+    
+    if request.method == 'POST':
+        fields, errors = read_quiz_form()
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+            return render_template('admin/quiz_form.html', quiz=dict(fields, id=quiz_id), categories=Question.get_categories(), difficulties=DIFFICULTIES)
+        
+        Quiz.update(quiz_id, **fields)
+        flash('Quiz updated successfully', 'success')
+        return redirect(url_for('admin.quizzes'))
+    
+    quiz = dict(quiz, question_ids=Quiz.get_question_ids(quiz_id))
+    return render_template('admin/quiz_form.html', quiz=quiz, categories=Question.get_categories(), difficulties=DIFFICULTIES)
+
+@admin_bp.route('/admin/quiz/delete/<int:quiz_id>')
+@admin_required
+def delete_quiz(quiz_id):
+    if not Quiz.get_by_id(quiz_id):
+        flash('Quiz not found', 'danger')
+        return redirect(url_for('admin.quizzes'))
+    
+    Quiz.delete(quiz_id)
+    flash('Quiz deleted successfully', 'success')
+    return redirect(url_for('admin.quizzes'))
+
+def get_result_filters():
+    """Read the results filters from the query string"""
+    filters = {}
+    
+    email = request.args.get('email', '').strip()
+    if email:
+        filters['email'] = email
+    
+    user_id = request.args.get('user_id', type=int)
+    if user_id is not None:
+        filters['user_id'] = user_id
+    
+    quiz_id = request.args.get('quiz_id', type=int)
+    if quiz_id is not None:
+        filters['quiz_id'] = quiz_id
+    
+    # Ignore dates that are not YYYY-MM-DD
+    for name in ('date_from', 'date_to'):
+        value = request.args.get(name, '').strip()
+        try:
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            continue
+        filters[name] = value
+    
+    band = request.args.get('band')
+    if band in SCORE_BANDS:
+        filters['min_percentage'], filters['max_percentage'] = SCORE_BANDS[band]
+    
+    return filters
+
 @admin_bp.route('/admin/results')
 @admin_required
 def results():
-    results = Result.get_all()
-    return render_template('admin/results.html', results=results)
\ No newline at end of file
+    filters = get_result_filters()
+    cursor = parse_cursor(request.args.get('cursor'))
+    per_page = min(max(request.args.get('per_page', RESULTS_PER_PAGE, type=int), 1), MAX_RESULTS_PER_PAGE)
+    
+    results, next_cursor = Result.get_page(cursor, per_page, **filters)
+    if filters:
+        # A filtered summary aggregates every matching result; keep it for the
+        # following pages until another result is saved
+        summary = caching.cached_value(
+            'results', ('result summary', Result.get_version(), tuple(sorted(filters.items()))),
+            lambda: Result.get_summary(**filters)
+        )
+    else:
+        summary = Result.get_summary()
+    
+    # Query string to carry over to the next page and export links
+    filter_args = {key: value for key, value in request.args.items() if key != 'cursor' and value}
+    
+    return render_template(
+        'admin/results.html',
+        results=results,
+        summary=summary,
+        next_cursor=f"{next_cursor[0]}|{next_cursor[1]}" if next_cursor else None,
+        is_first_page=cursor is None,
+        filter_args=filter_args,
+        quiz=Quiz.get_by_id(filters['quiz_id']) if 'quiz_id' in filters else None
+    )
+
+@admin_bp.route('/admin/results/export')
+@admin_required
+def export_results():
+    filters = get_result_filters()
+    export_format = request.args.get('format', 'csv')
+    columns = ['id', 'name', 'email', 'score', 'total', 'quiz_date']
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for result in Result.iter_all(EXPORT_BATCH_SIZE, **filters):
+            writer.writerow([question_io.csv_cell(result[column]) for column in columns])
+            # Flush the buffer now and then instead of yielding every row
+            if buffer.tell() > 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_json():
+        yield '['
+        separator = ''
+        for result in Result.iter_all(EXPORT_BATCH_SIZE, **filters):
+            yield separator + json.dumps({column: result[column] for column in columns})
+            separator = ','
+        yield ']'
+    
+    if export_format == 'json':
+        generate, mimetype = generate_json, 'application/json'
+    else:
+        export_format, generate, mimetype = 'csv', generate_csv, 'text/csv'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=results.{export_format}'}
+    )
\ No newline at end of file
@@ -0,0 +1,146 @@
+from flask import Blueprint, jsonify, request, session, url_for
+from models import Question, Attempt
+from routes.quiz import get_current_attempt
+import scoring
+from functools import wraps
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Option fields sent to the browser; correct_ans never leaves the server before the quiz ends
+OPTION_FIELDS = ('option_a', 'option_b', 'option_c', 'option_d')
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+# JSON counterpart of quiz.login_required and quiz.admin_not_allowed
+def quiz_taker_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return api_error('Login required', 401)
+        if session.get('is_admin'):
+            return api_error('Admin cannot access user features', 403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+def attempt_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        attempt = get_current_attempt()
+        if not attempt:
+            return api_error('No quiz in progress', 404)
+        return f(attempt, *args, **kwargs)
+    return decorated_function
+
+def parse_answers(attempt, payload):
+    """Validate the answers of a request body as a list of (question_id, answer) pairs
+
+    Returns (answers, position) or raises ValueError with a message for the client.
+    """
+    items = payload.get('answers') or []
+    if not isinstance(items, list) or len(items) > len(attempt['question_ids']):
+        raise ValueError('answers must be a list with at most one entry per question')
+
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('each answer must be an object with question_id and answer')
+        question_id = item.get('question_id')
+        answer = item.get('answer')
+        if not isinstance(question_id, int):
+            raise ValueError(f'question {question_id!r} is not part of this quiz')
+        # Deleted questions are skipped like in the form flow
+        if scoring.check_answer(attempt, question_id, answer) is None:
+            continue
+        # The last answer to a question in a batch wins
+        answers[question_id] = answer
+
+    position = payload.get('position', attempt['current_question'])
+    if not isinstance(position, int):
+        raise ValueError('position must be an integer')
+    position = max(0, min(position, len(attempt['question_ids'])))
+    return list(answers.items()), position
+
+def get_payload():
+    """Get the JSON body; requiring JSON also keeps plain cross-site form posts out"""
+    if not request.is_json:
+        return None
+    payload = request.get_json(silent=True)
+    return payload if isinstance(payload, dict) else None
+
+@api_bp.route('/attempt')
+@quiz_taker_required
+@attempt_required
+def attempt(attempt):
+    # All questions of the attempt at once, without their answers
+    questions = []
+    positions = {question_id: i for i, question_id in enumerate(attempt['question_ids'])}
+    for question in Question.get_many(list(attempt['question_ids'])):
+        questions.append({
+            'id': question['id'],
+            # Index in the attempt, counting questions deleted since it started
+            'position': positions[question['id']],
+            'question': question['question'],
+            'options': [question[field] for field in OPTION_FIELDS],
+        })
+
+    answers = Attempt.get_answers(attempt['id'])
+    return jsonify({
+        'id': attempt['id'],
+        'position': attempt['current_question'],
+        'total': len(attempt['question_ids']),
+        'time_left': scoring.seconds_left(attempt),
+        'questions': questions,
+        'answers': {str(question_id): answer for question_id, answer in answers.items()},
+        'answers_url': url_for('api.save_answers'),
+        'finish_url': url_for('api.finish'),
+        'result_url': url_for('quiz.result'),
+    })
+
+@api_bp.route('/attempt/answers', methods=['POST'])
+@quiz_taker_required
+@attempt_required
+def save_answers(attempt):
+    payload = get_payload()
+    if payload is None:
+        return api_error('Expected a JSON object', 415)
+
+    if scoring.is_expired(attempt):
+        return api_error('Time is up; the quiz is closed for answers', 409)
+
+    try:
+        answers, position = parse_answers(attempt, payload)
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    # One upsert batch and one commit however many answers arrived
+    Attempt.save_answers(attempt['id'], answers, position)
+    return jsonify({'saved': len(answers), 'position': position})
+
+@api_bp.route('/attempt/finish', methods=['POST'])
+@quiz_taker_required
+@attempt_required
+def finish(attempt):
+    # Any answers not synced yet can come along with the request, unless the deadline has passed
+    payload = get_payload() or {}
+    try:
+        answers, position = parse_answers(attempt, payload)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    if answers and not scoring.is_expired(attempt):
+        Attempt.save_answers(attempt['id'], answers, position)
+
+    session.pop('attempt_id', None)
+    try:
+        graded = scoring.finish_attempt(attempt['id'])
+    except LookupError:
+        return api_error('The quiz was already submitted', 409)
+    if not graded:
+        return api_error('No quiz results available', 404)
+
+    return jsonify({
+        'score': graded['score'],
+        'total': graded['total'],
+        'percentage': int((graded['score'] / graded['total']) * 100),
+        'results': graded['results'],
+    })
@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import User
+from models import Attempt, User
+from sessions import regenerate_session
+import security
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -33,7 +35,15 @@ def register():
             return render_template('register.html', name=name, email=email)
         
         # Create user
-        if User.create(name, email, password):
+        try:
+            created = User.create(name, email, password)
+        except security.HashingBusy:
+            flash('The server is busy, please try again in a moment', 'warning')
+            return render_template('register.html', name=name, email=email), 503
+
+        if created:
+            # A login tried before the account existed must not block the new password
+            security.forget_failure(email, password)
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('auth.login'))
         else:
@@ -53,11 +63,26 @@ def login():
             flash('All fields are required', 'danger')
             return render_template('login.html', email=email)
         
+        # Throttle per client and per account before doing any expensive hashing
+        if not security.ip_limiter.allow(request.remote_addr) or not security.email_limiter.allow(email.lower()):
+            flash('Too many login attempts, please wait a minute and try again', 'danger')
+            return render_template('login.html', email=email), 429
+        
+        # Repeats of a recently failed email and password are rejected without hashing
+        if security.is_known_failure(email, password):
+            flash('Invalid email or password', 'danger')
+            return render_template('login.html', email=email)
+        
         # Authenticate user
-        user = User.authenticate(email, password)
+        try:
+            user = User.authenticate(email, password)
+        except security.HashingBusy:
+            flash('The server is busy, please try again in a moment', 'warning')
+            return render_template('login.html', email=email), 503
         
         if user:
-            # Set session variables
+            # Set session variables under a new session ID
+            regenerate_session(session)
             session['user_id'] = user['id']
             session['user_name'] = user['name']
             session['is_admin'] = user['is_admin']
@@ -69,6 +94,7 @@ def login():
                 flash(f'Welcome back, {user["name"]}!', 'success')
                 return redirect(url_for('quiz.dashboard'))
         else:
+            security.remember_failure(email, password)
             flash('Invalid email or password', 'danger')
             return render_template('login.html', email=email)
     
@@ -76,7 +102,12 @@ def login():
 
 @auth_bp.route('/logout')
 def logout():
-    # Clear session
+    # Discard any unfinished attempt
+    if 'attempt_id' in session:
+        Attempt.delete(session['attempt_id'])
+    
+    # Clear session, and stop accepting its ID
     session.clear()
+    regenerate_session(session)
     flash('You have been logged out successfully', 'success')
     return redirect(url_for('index'))
\ No newline at end of file
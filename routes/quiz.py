@@ -1,5 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import Question, Result, User
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from models import Question, Result, User, Attempt, Leaderboard, Quiz, UserSummary
+from sampling import QuizConfig, sample_question_ids
+import caching
+import scoring
 from functools import wraps
 
 quiz_bp = Blueprint('quiz', __name__)
@@ -24,72 +27,164 @@ def admin_not_allowed(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Past results per page of the dashboard history
+HISTORY_PER_PAGE = 10
+
+def parse_cursor(value):
+    """Turn a 'quiz_date|id' cursor from the query string into a tuple"""
+    if not value or '|' not in value:
+        return None
+    quiz_date, result_id = value.rsplit('|', 1)
+    if not result_id.isdigit():
+        return None
+    return quiz_date, int(result_id)
+
+def get_leaderboard_period():
+    """Get the leaderboard window chosen with ?board=, all time by default"""
+    board = request.args.get('board', 'all')
+    return board if board in Leaderboard.PERIODS else 'all'
+
+def dashboard_cache_key():
+    # The user's history and the leaderboard change with any saved result, the quiz list
+    # with the bank; the leaderboard windows and the streak move with the date
+    return (
+        caching.viewer_key(), Result.get_version(), Question.get_bank_version(),
+        get_leaderboard_period(), Leaderboard.period_start('day'), request.args.get('cursor')
+    )
+
 @quiz_bp.route('/dashboard')
 @login_required
 @admin_not_allowed
+@caching.cached_page('results', dashboard_cache_key)
 def dashboard():
-    # Get user's past results
+    # The user's totals in one row, and one page of their past results
     user_id = session.get('user_id')
-    results = Result.get_by_user(user_id)
+    summary = UserSummary.get(user_id)
+    cursor = parse_cursor(request.args.get('cursor'))
+    results, next_cursor = Result.get_history(user_id, cursor, HISTORY_PER_PAGE)
+    
+    # Leaderboard for the chosen window, read from the incrementally maintained table
+    board = get_leaderboard_period()
+    leaderboard = Leaderboard.get_top(board)
+    my_rank = Leaderboard.get_rank(user_id, board)
+    
+    # Quizzes to choose from, besides the whole question bank
+    quizzes = [quiz for quiz in Quiz.get_all() if quiz['question_count']]
     
-    return render_template('dashboard.html', results=results)
+    return render_template(
+        'dashboard.html',
+        summary=summary,
+        results=results,
+        next_cursor=f"{next_cursor[0]}|{next_cursor[1]}" if next_cursor else None,
+        is_first_page=cursor is None,
+        board=board,
+        leaderboard=leaderboard,
+        my_rank=my_rank,
+        quizzes=quizzes
+    )
 
 @quiz_bp.route('/start-quiz')
+@quiz_bp.route('/start-quiz/<int:quiz_id>')
 @login_required
 @admin_not_allowed
-def start_quiz():
-    # Get all questions
-    questions = Question.get_all()
+def start_quiz(quiz_id=None):
+    config = QuizConfig.from_mapping(current_app.config)
+    duration = current_app.config.get('QUIZ_DURATION')
+    
+    # Draw the questions for this attempt, from one quiz or the whole bank
+    if quiz_id is None:
+        question_ids = sample_question_ids(config)
+    else:
+        quiz = Quiz.get_by_id(quiz_id)
+        if not quiz:
+            flash('Quiz not found', 'danger')
+            return redirect(url_for('quiz.dashboard'))
+        # The category quotas are for the whole bank; a quiz only sets its size
+        question_ids = sample_question_ids(QuizConfig(size=quiz['size'], seed=config.seed), Quiz.get_bank(quiz_id))
+        duration = quiz['duration'] or duration
     
-    if not questions:
+    if not question_ids:
         flash('No questions available for the quiz', 'warning')
         return redirect(url_for('quiz.dashboard'))
     
-    # Store questions in session
-    session['questions'] = [dict(q) for q in questions]
-    session['current_question'] = 0
-    session['answers'] = {}
+    # Discard any unfinished attempt
+    if 'attempt_id' in session:
+        Attempt.delete(session['attempt_id'])
+    
+    # Keep the quiz state on the server, the session only carries the attempt ID
+    session['attempt_id'] = Attempt.create(session['user_id'], question_ids, duration=duration, quiz_id=quiz_id)
     
     return redirect(url_for('quiz.question'))
 
+def get_current_attempt():
+    """Get the attempt referenced by the session if it belongs to the user"""
+    attempt_id = session.get('attempt_id')
+    if attempt_id is None:
+        return None
+    
+    attempt = Attempt.get(attempt_id)
+    if not attempt or attempt['user_id'] != session.get('user_id'):
+        session.pop('attempt_id', None)
+        return None
+    return attempt
+
 @quiz_bp.route('/question', methods=['GET', 'POST'])
 @login_required
 @admin_not_allowed
 def question():
     # Check if quiz is in progress
-    if 'questions' not in session:
+    attempt = get_current_attempt()
+    if not attempt:
         flash('No quiz in progress', 'warning')
         return redirect(url_for('quiz.dashboard'))
     
-    questions = session['questions']
-    current_index = session['current_question']
+    question_ids = attempt['question_ids']
+    current_index = attempt['current_question']
+    
+    # Answers after the deadline are not accepted; the attempt is scored as it stands
+    if scoring.is_expired(attempt):
+        flash('Time is up! Your quiz has been submitted.', 'warning')
+        return redirect(url_for('quiz.result'))
     
     # Handle answering a question
     if request.method == 'POST':
         # Save the answer
-        question_id = request.form.get('question_id')
+        question_id = request.form.get('question_id', type=int)
         answer = request.form.get('answer')
         
         if question_id and answer:
-            session['answers'][question_id] = answer
-            
-            # Move to next question
-            current_index += 1
-            session['current_question'] = current_index
-            
-            # Check if quiz is complete
-            if current_index >= len(questions):
-                return redirect(url_for('quiz.result'))
-    
-    # Get current question
-    if current_index < len(questions):
-        question = questions[current_index]
+            # Only options of the questions of this attempt are accepted
+            try:
+                scoring.check_answer(attempt, question_id, answer)
+            except ValueError:
+                flash('Please choose one of the answers shown', 'danger')
+            else:
+                # Move to next question
+                current_index += 1
+                Attempt.save_answer(attempt['id'], question_id, answer, current_index)
+                
+                # Check if quiz is complete
+                if current_index >= len(question_ids):
+                    return redirect(url_for('quiz.result'))
+    
+    # Get current question, skipping any deleted since the quiz started
+    question = None
+    while current_index < len(question_ids):
+        question = Question.get_by_id(question_ids[current_index])
+        if question:
+            break
+        current_index += 1
+        Attempt.set_position(attempt['id'], current_index)
+    
+    if question:
         progress = {
             'current': current_index + 1,
-            'total': len(questions),
-            'percent': int(((current_index + 1) / len(questions)) * 100)
+            'total': len(question_ids),
+            'percent': int(((current_index + 1) / len(question_ids)) * 100)
         }
-        return render_template('question.html', question=question, progress=progress)
+        return render_template(
+            'question.html', question=question, progress=progress, time_left=scoring.seconds_left(attempt)
+        )
     else:
         return redirect(url_for('quiz.result'))
 
@@ -98,38 +193,34 @@ def question():
 @admin_not_allowed
 def result():
     # Check if quiz is complete
-    if 'questions' not in session or 'answers' not in session:
-        flash('No quiz results available', 'warning')
+    attempt_id = session.get('attempt_id')
+    attempt = get_current_attempt()
+    if not attempt:
+        if attempt_id is not None:
+            # The finalizer scored it after the deadline
+            flash('Your quiz was already submitted. See your results below.', 'info')
+        else:
+            flash('No quiz results available', 'warning')
         return redirect(url_for('quiz.dashboard'))
     
-    questions = session['questions']
-    answers = session['answers']
+    # Score, save and close the attempt in one step so it is only counted once
+    session.pop('attempt_id', None)
+    try:
+        graded = scoring.finish_attempt(attempt['id'])
+    except LookupError:
+        # Closed by the finalizer or another request in the meantime
+        flash('Your quiz was already submitted. See your results below.', 'info')
+        return redirect(url_for('quiz.dashboard'))
     
-    # Calculate score
-    score = 0
-    question_results = []
+    if not graded:
+        flash('No quiz results available', 'warning')
+        return redirect(url_for('quiz.dashboard'))
     
-    for q in questions:
-        q_id = str(q['id'])
-        user_answer = answers.get(q_id, '')
-        is_correct = user_answer == q['correct_ans']
-        
-        if is_correct:
-            score += 1
-        
-        question_results.append({
-            'question': q['question'],
-            'user_answer': user_answer,
-            'correct_answer': q['correct_ans'],
-            'is_correct': is_correct
-        })
-    
-    # Save result to database
-    user_id = session.get('user_id')
-    Result.save(user_id, score, len(questions))
+    score = graded['score']
+    question_results = graded['results']
     
     # Calculate percentage
-    percentage = int((score / len(questions)) * 100) if questions else 0
+    percentage = int((score / len(question_results)) * 100)
     
     # Determine result message based on score
     if percentage >= 80:
@@ -141,15 +232,10 @@ def result():
     else:
         message = "You need more practice. Try again!"
     
-    # Clear quiz data
-    session.pop('questions', None)
-    session.pop('current_question', None)
-    session.pop('answers', None)
-    
     return render_template(
         'result.html',
         score=score,
-        total=len(questions),
+        total=len(question_results),
         percentage=percentage,
         message=message,
         results=question_results
@@ -0,0 +1,70 @@
+import random
+from models import Question
+
+class QuizConfig:
+    """How the questions of a quiz attempt are drawn from the bank
+
+    size     -- number of questions per attempt, None for the whole bank in order
+    seed     -- random seed, for the same draw on every attempt (None for a new draw each time)
+    stratify -- question field the quotas apply to ('category' or 'difficulty')
+    quotas   -- questions to draw per value of that field, e.g. {'Science': 5, 'History': 3}
+
+    Raises ValueError when the quotas ask for more questions than size.
+    """
+
+    def __init__(self, size=None, seed=None, stratify='category', quotas=None):
+        self.size = size
+        self.seed = seed
+        self.stratify = stratify
+        self.quotas = dict(quotas or {})
+        if any(count < 0 for count in self.quotas.values()):
+            raise ValueError('Quiz quotas must not be negative')
+        if size and sum(self.quotas.values()) > size:
+            raise ValueError(f"Quiz quotas add up to {sum(self.quotas.values())} questions, more than the quiz size of {size}")
+
+    @classmethod
+    def from_mapping(cls, config):
+        """Build the quiz settings from the app config"""
+        return cls(
+            size=config.get('QUIZ_SIZE'),
+            seed=config.get('QUIZ_SEED'),
+            stratify=config.get('QUIZ_STRATIFY_BY', 'category'),
+            quotas=config.get('QUIZ_QUOTAS')
+        )
+
+    @property
+    def is_full_bank(self):
+        return not self.size and not self.quotas
+
+def sample_question_ids(config, bank=None):
+    """Pick the question IDs of a new attempt
+
+    Works from the per-version ID index of the cached bank, so drawing k
+    questions costs O(k) no matter how large the bank is.
+    """
+    bank = bank or Question.get_bank()
+    if config.is_full_bank:
+        return list(bank.ids)
+
+    rng = random.Random(config.seed)
+    chosen = []
+
+    # Draw each quota from its own group first
+    if config.quotas:
+        groups = bank.ids_by(config.stratify)
+        for value, count in config.quotas.items():
+            pool = groups.get(value, ())
+            chosen.extend(rng.sample(pool, min(count, len(pool))))
+
+    # Fill the rest of the quiz from the whole bank
+    size = config.size or len(chosen)
+    remaining = min(size, len(bank.ids)) - len(chosen)
+    if remaining > 0:
+        taken = set(chosen)
+        # Oversample by the questions already taken so there are enough left after skipping them
+        extra = rng.sample(bank.ids, min(len(bank.ids), remaining + len(taken)))
+        chosen.extend([q_id for q_id in extra if q_id not in taken][:remaining])
+
+    # The quotas fit in size (see QuizConfig), so every quota pick is kept
+    rng.shuffle(chosen)
+    return chosen
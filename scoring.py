@@ -0,0 +1,101 @@
+import time
+from models import Question, Attempt
+import analytics
+
+# Answers posted this many seconds after the deadline still count, to allow for network delay
+DEADLINE_GRACE = 5
+
+def check_answer(attempt, question_id, answer):
+    """Check that an answer is one of the options of a question of the attempt
+
+    Returns the question, or None if it was deleted since the attempt began
+    (its answer is skipped). Raises ValueError with a message for the client.
+    """
+    if question_id not in attempt['question_ids']:
+        raise ValueError(f'question {question_id!r} is not part of this quiz')
+    question = Question.get_by_id(question_id)
+    if question is not None and answer not in [question[field] for field in analytics.OPTION_FIELDS]:
+        raise ValueError(f'answer to question {question_id} is not one of its options')
+    return question
+
+def grade(attempt, answers):
+    """Mark the answers of an attempt against the questions that still exist
+
+    Returns the graded attempt as a dict with score, total, the per-question
+    results and the packed answers for the results table, or None when none of
+    its questions exist any more.
+    """
+    question_results = []
+    for q in Question.get_many(list(attempt['question_ids'])):
+        user_answer = answers.get(q['id'], '')
+        question_results.append({
+            'question_id': q['id'],
+            'answer_index': analytics.option_index(q, user_answer),
+            'question': q['question'],
+            'user_answer': user_answer,
+            'correct_answer': q['correct_ans'],
+            'is_correct': user_answer == q['correct_ans']
+        })
+    if not question_results:
+        return None
+
+    question_ids, packed_answers = analytics.pack_attempt(
+        [r['question_id'] for r in question_results],
+        [r['answer_index'] for r in question_results]
+    )
+    return {
+        'score': sum(1 for r in question_results if r['is_correct']),
+        'total': len(question_results),
+        'results': question_results,
+        'question_ids': question_ids,
+        'answers': packed_answers,
+    }
+
+def finish_attempt(attempt_id):
+    """Score an attempt, save its result and close it
+
+    Returns the graded attempt, or None if it had no questions left. Raises
+    LookupError if the attempt was already closed, e.g. by the finalizer.
+    """
+    finished = Attempt.finalize(grade, attempt_id=attempt_id)
+    if not finished:
+        raise LookupError(attempt_id)
+    return finished[0][1]
+
+def is_expired(attempt, now=None):
+    """Check whether a timed attempt is past its deadline (with the grace period)"""
+    expires_at = attempt.get('expires_at')
+    return expires_at is not None and (now or time.time()) > expires_at + DEADLINE_GRACE
+
+def seconds_left(attempt, now=None):
+    """Seconds until the deadline of a timed attempt, None if it is untimed"""
+    expires_at = attempt.get('expires_at')
+    if expires_at is None:
+        return None
+    return max(0, int(expires_at - (now or time.time())))
+
+def finalize_expired(batch_size=500, now=None):
+    """Score and close every attempt whose deadline has passed, a batch per transaction
+
+    Returns the number of attempts closed.
+    """
+    cutoff = (now or time.time()) - DEADLINE_GRACE
+    closed = 0
+    while True:
+        finished = Attempt.finalize(grade, expired_before=cutoff, limit=batch_size)
+        closed += len(finished)
+        if len(finished) < batch_size:
+            return closed
+
+def purge_abandoned(ttl, batch_size=500, now=None):
+    """Delete untimed attempts started more than ttl seconds ago, a batch per transaction
+
+    Returns the number of attempts deleted.
+    """
+    cutoff = (now or time.time()) - ttl
+    deleted = 0
+    while True:
+        count = Attempt.delete_abandoned(cutoff, batch_size)
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import os
+import threading
+import time
+from cache import TTLCache
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug hash method for new passwords, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000';
+# cheaper parameters mean faster logins but cheaper offline attacks on a leaked database
+PASSWORD_HASH_METHOD = 'scrypt'
+
+# Hashing runs in worker processes so a burst of logins cannot tie up every request
+# thread; 0 hashes on the calling thread instead
+HASH_WORKERS = os.cpu_count() or 1
+
+# Hashes queued or running at once before new ones are turned away as busy
+HASH_MAX_PENDING = HASH_WORKERS * 8
+
+# How long failed email and password pairs are remembered
+FAILURE_TTL = 300
+FAILURE_CACHE_SIZE = 100000
+
+class HashingBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+class RateLimiter:
+    """Per-key token buckets: up to `burst` requests at once, refilled at `per_minute`
+
+    Buckets live in process memory, so each worker process limits on its own.
+    """
+
+    def __init__(self, per_minute, burst, maxsize=100000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Take a token for key; return False when its bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Re-inserted keys move to the end, so the oldest buckets are dropped first
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                del self._buckets[next(iter(self._buckets))]
+        return allowed
+
+    def reset(self):
+        """Forget every bucket"""
+        with self._lock:
+            self._buckets.clear()
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+_recent_failures = TTLCache(maxsize=FAILURE_CACHE_SIZE, ttl=FAILURE_TTL)
+
+def _reset_after_fork():
+    # A worker pool started before a fork cannot be used from the child
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Login limits, replaced from the app config by init_app
+ip_limiter = RateLimiter(per_minute=30, burst=20)
+email_limiter = RateLimiter(per_minute=5, burst=10)
+
+def init_app(app):
+    """Apply the hashing and login limit settings from the app config"""
+    global PASSWORD_HASH_METHOD, HASH_WORKERS, HASH_MAX_PENDING, _pending, _recent_failures
+    global ip_limiter, email_limiter
+    PASSWORD_HASH_METHOD = app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD)
+    HASH_WORKERS = app.config.get('PASSWORD_HASH_WORKERS', HASH_WORKERS)
+    HASH_MAX_PENDING = app.config.get('PASSWORD_HASH_MAX_PENDING') or max(HASH_WORKERS, 1) * 8
+    _pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+    _recent_failures = TTLCache(maxsize=FAILURE_CACHE_SIZE, ttl=app.config.get('LOGIN_FAILURE_TTL', FAILURE_TTL))
+    ip_limiter = RateLimiter(app.config['LOGIN_IP_PER_MINUTE'], app.config['LOGIN_IP_BURST'])
+    email_limiter = RateLimiter(app.config['LOGIN_EMAIL_PER_MINUTE'], app.config['LOGIN_EMAIL_BURST'])
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        return _pool
+
+def _run(func, *args):
+    """Run a hashing function in the worker pool, refusing work when the queue is full"""
+    if not HASH_WORKERS:
+        return func(*args)
+
+    if not _pending.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return _get_pool().submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool for the next call and hash this one here
+        global _pool
+        with _pool_lock:
+            _pool = None
+        return func(*args)
+    finally:
+        _pending.release()
+
+def shutdown():
+    """Stop the hashing worker processes"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+def _failure_key(email, password):
+    # Only a digest of the pair is kept in memory, never the password itself
+    return hashlib.sha256(f"{email.lower()}\0{password}".encode()).hexdigest()
+
+def is_known_failure(email, password):
+    """Check whether this email and password recently failed to log in"""
+    return _recent_failures.get(_failure_key(email, password), False)
+
+def remember_failure(email, password):
+    """Remember a failed login so repeats are rejected without hashing"""
+    _recent_failures.set(_failure_key(email, password), True)
+
+def forget_failure(email, password):
+    """Drop a remembered failure, e.g. once the account exists with that password"""
+    _recent_failures.pop(_failure_key(email, password))
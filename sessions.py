@@ -0,0 +1,138 @@
+import random
+import secrets
+import time
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from database import db_connection
+
+# Share of saves that also purge expired server-side sessions
+PURGE_PROBABILITY = 0.01
+
+def get_signing_keys(app):
+    """Get the accepted signing keys, oldest first as itsdangerous expects"""
+    keys = [app.secret_key] + list(app.config.get('SECRET_KEY_FALLBACKS') or [])
+    return [key for key in reversed(keys) if key]
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data kept in the database, identified by a random ID"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # ID the session was loaded under before regenerate(), deleted on save
+        self.stale_sid = None
+
+    def regenerate(self):
+        """Move the session to a new random ID"""
+        if not self.new and self.stale_sid is None:
+            self.stale_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class DatabaseSessionInterface(SessionInterface):
+    """Server-side sessions stored in the sessions table
+
+    The cookie only carries the signed session ID, so every worker and host
+    that shares the database and signing keys sees the same session.
+    """
+
+    serializer = TaggedJSONSerializer()
+    salt = 'quiz-session-id'
+
+    def _get_signer(self, app):
+        return Signer(get_signing_keys(app), salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._get_signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+
+            if sid:
+                with db_connection() as conn:
+                    row = conn.execute(
+                        "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+                        (sid, int(time.time()))
+                    ).fetchone()
+                if row:
+                    return ServerSideSession(self.serializer.loads(row['data']), sid=sid)
+
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            with db_connection() as conn:
+                conn.execute("DELETE FROM sessions WHERE id = ?", (session.stale_sid,))
+                conn.commit()
+
+        # An emptied session is deleted along with its cookie
+        if not session:
+            if session.modified:
+                with db_connection() as conn:
+                    conn.execute("DELETE FROM sessions WHERE id = ?", (session.sid,))
+                    conn.commit()
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        with db_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+                """,
+                (session.sid, self.serializer.dumps(dict(session)), int(time.time() + lifetime))
+            )
+            if random.random() < PURGE_PROBABILITY:
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (int(time.time()),))
+            conn.commit()
+
+        response.set_cookie(
+            name,
+            self._get_signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+SESSION_BACKENDS = {
+    # Flask accepts cookies signed with SECRET_KEY_FALLBACKS itself
+    'cookie': SecureCookieSessionInterface,
+    'server': DatabaseSessionInterface,
+}
+
+def init_sessions(app):
+    """Install the session backend named by the SESSION_BACKEND setting"""
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}, expected one of {', '.join(SESSION_BACKENDS)}")
+    app.session_interface = SESSION_BACKENDS[backend]()
+
+def regenerate_session(session):
+    """Give a server-side session a new ID, on login and logout
+
+    An ID someone obtained before (or planted with session fixation) stops
+    working. Cookie sessions have no ID to steal: the whole signed content
+    is replaced by the next response.
+    """
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
@@ -55,9 +55,13 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             if (timeLeft <= 0) {
-                // Auto-submit the form when time expires
+                // Time is up: hand in the quiz as it stands
                 const quizForm = document.getElementById('questionForm');
-                if (quizForm) {
+                if (quizForm && quizForm.onTimeUp) {
+                    quizForm.onTimeUp();
+                } else if (quizForm && quizForm.dataset.resultUrl) {
+                    window.location.href = quizForm.dataset.resultUrl;
+                } else if (quizForm) {
                     quizForm.submit();
                 }
                 return;
@@ -70,6 +74,12 @@ document.addEventListener('DOMContentLoaded', function() {
         updateTimer();
     }
     
+    // Answer quiz questions without a page load per question (if present on page)
+    const questionForm = document.getElementById('questionForm');
+    if (questionForm && questionForm.dataset.attemptUrl && window.fetch) {
+        initQuizSync(questionForm);
+    }
+    
     // Confirmation for delete actions
     const deleteButtons = document.querySelectorAll('.btn-delete');
     deleteButtons.forEach(button => {
@@ -91,4 +101,168 @@ document.addEventListener('DOMContentLoaded', function() {
             form.classList.add('was-validated');
         });
     });
-});
\ No newline at end of file
+});
+
+// Number of buffered answers that triggers a sync, and the longest an answer waits
+const SYNC_BATCH_SIZE = 5;
+const SYNC_DELAY_MS = 2000;
+
+// Load the whole attempt once, then show the questions in the page and save
+// the answers in the background through the JSON API. The form keeps working
+// as a normal POST if anything here fails.
+function initQuizSync(form) {
+    fetch(form.dataset.attemptUrl, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(attempt => startQuizSync(form, attempt))
+        .catch(() => {});
+}
+
+function startQuizSync(form, attempt) {
+    const questions = attempt.questions;
+    const answers = Object.assign({}, attempt.answers);
+    const currentId = parseInt(form.querySelector('input[name="question_id"]').value, 10);
+    let index = questions.findIndex(q => q.id === currentId);
+    if (index < 0) {
+        return;
+    }
+    
+    let buffer = [];
+    let inFlight = null;
+    let timer = null;
+    
+    const questionText = document.getElementById('question-text');
+    const counter = document.getElementById('question-counter');
+    const progressBar = document.querySelector('.progress-bar');
+    const previousButton = document.getElementById('previous-question');
+    const nextButton = document.getElementById('next-question');
+    const radios = form.querySelectorAll('input[name="answer"]');
+    
+    // Position of the next unanswered question in the attempt, as the server counts it
+    const serverPosition = () => index < questions.length ? questions[index].position : attempt.total;
+    
+    const sync = (keepalive) => {
+        clearTimeout(timer);
+        timer = null;
+        if (inFlight) {
+            // Wait for the running request, then send whatever was answered meanwhile
+            return inFlight.then(() => sync(keepalive));
+        }
+        if (buffer.length === 0) {
+            return Promise.resolve();
+        }
+        
+        const batch = buffer;
+        buffer = [];
+        inFlight = fetch(attempt.answers_url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+            credentials: 'same-origin',
+            keepalive: keepalive === true,
+            body: JSON.stringify({ answers: batch, position: serverPosition() })
+        }).then(response => {
+            if (!response.ok) {
+                return Promise.reject(response.status);
+            }
+        }).catch(error => {
+            // Keep the answers for the next try, behind any given since
+            buffer = batch.concat(buffer);
+            return Promise.reject(error);
+        }).finally(() => {
+            inFlight = null;
+        });
+        return inFlight;
+    };
+    
+    const scheduleSync = () => {
+        if (buffer.length >= SYNC_BATCH_SIZE) {
+            sync().catch(() => scheduleSync());
+        } else if (!timer) {
+            timer = setTimeout(() => sync().catch(() => scheduleSync()), SYNC_DELAY_MS);
+        }
+    };
+    
+    const render = () => {
+        const question = questions[index];
+        const number = index + 1;
+        form.querySelector('input[name="question_id"]').value = question.id;
+        questionText.textContent = question.question;
+        counter.textContent = `Question ${number}/${questions.length}`;
+        
+        const percent = Math.floor(number / questions.length * 100);
+        progressBar.style.width = `${percent}%`;
+        progressBar.setAttribute('aria-valuenow', percent);
+        
+        radios.forEach((radio, i) => {
+            radio.value = question.options[i];
+            radio.checked = answers[question.id] === question.options[i];
+            radio.closest('.form-check').querySelector('.option-text').textContent = question.options[i];
+            radio.closest('.option-card').classList.toggle('active-option', radio.checked);
+        });
+        
+        previousButton.classList.toggle('invisible', index === 0);
+        nextButton.innerHTML = number === questions.length
+            ? 'Finish Quiz <i class="fas fa-check ms-1"></i>'
+            : 'Next Question <i class="fas fa-arrow-right ms-1"></i>';
+    };
+    
+    previousButton.onclick = null;
+    previousButton.addEventListener('click', () => {
+        if (index > 0) {
+            index--;
+            render();
+        }
+    });
+    
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        const checked = form.querySelector('input[name="answer"]:checked');
+        if (!checked) {
+            return;
+        }
+        
+        const question = questions[index];
+        answers[question.id] = checked.value;
+        // Only the latest answer to a question needs sending
+        buffer = buffer.filter(item => item.question_id !== question.id);
+        buffer.push({ question_id: question.id, answer: checked.value });
+        index++;
+        
+        if (index < questions.length) {
+            render();
+            scheduleSync();
+            return;
+        }
+        
+        // Last answer: save everything, then let the result page score the attempt
+        nextButton.disabled = true;
+        sync().then(() => {
+            window.location.href = attempt.result_url;
+        }).catch(() => {
+            nextButton.disabled = false;
+            index--;
+            alert('Your answers could not be saved. Please check your connection and try again.');
+        });
+    });
+    
+    // Timed quizzes: save the current selection too, then score the attempt; answers
+    // arriving after the deadline are refused, so go to the result page either way
+    form.onTimeUp = () => {
+        const checked = form.querySelector('input[name="answer"]:checked');
+        if (checked && index < questions.length) {
+            const question = questions[index];
+            buffer = buffer.filter(item => item.question_id !== question.id);
+            buffer.push({ question_id: question.id, answer: checked.value });
+        }
+        nextButton.disabled = true;
+        sync().catch(() => {}).then(() => {
+            window.location.href = attempt.result_url;
+        });
+    };
+    
+    // Save what is buffered when the page is closed or hidden
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') {
+            sync(true).catch(() => {});
+        }
+    });
+}
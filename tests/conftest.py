@@ -0,0 +1,89 @@
+import sqlite3
+import time
+import pytest
+import analytics
+import caching
+import database
+import migrations
+import models
+import repositories
+import writer
+from app import create_app
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'SECRET_KEY': 'test',
+    # Cheap hashes on the calling thread keep registration and login fast
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'PASSWORD_HASH_WORKERS': 0,
+    # Background threads are started by the tests that need them
+    'FINALIZER_INTERVAL': 0,
+    'EVENT_CONSUMER_INTERVAL': 0,
+}
+
+def reset_process_state():
+    """Forget connections and cached data from an earlier test's database"""
+    # The writer thread keeps a connection to the database it started with
+    if writer._writer is not None:
+        writer._writer.stop()
+    database.close_pool()
+    repositories.get_repository().close()
+    for namespace in caching._caches:
+        caching.invalidate(namespace)
+    models._attempt_cache.clear()
+    models._question_bank = None
+    models._has_search_index = None
+    analytics._analytics_cache.clear()
+
+@pytest.fixture
+def conn():
+    """An empty in-memory database, for migrations and triggers"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+def wait_for(condition, timeout=5):
+    """Poll until a background thread has done its work; returns whether it did"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+def migrate_to(conn, version, monkeypatch):
+    """Apply the migrations up to a version, as a database created by that release"""
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in migrations.MIGRATIONS if m[0] <= version])
+    migrations.migrate(conn)
+    monkeypatch.undo()
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Create apps on a fresh database in a temporary directory, with config overrides"""
+    def make(**overrides):
+        reset_process_state()
+        return create_app({**TEST_CONFIG, 'DATABASE': str(tmp_path / 'quiz.db'), **overrides})
+
+    yield make
+    reset_process_state()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def register(client, email='user@example.com', password='secret1', name='User'):
+    """Register and log in a quiz taker"""
+    client.post('/register', data={'name': name, 'email': email, 'password': password, 'confirm_password': password})
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302
+    return response
+
+def login_admin(client):
+    response = client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    assert response.status_code == 302
+    return response
@@ -0,0 +1,28 @@
+from database import db_connection
+from models import Result, User
+from conftest import login_admin
+
+def test_results_summary_with_and_without_filters(app, client):
+    with app.app_context():
+        User.create('First', 'first@example.com', 'secret1')
+        User.create('Second', 'second@example.com', 'secret1')
+        with db_connection() as conn:
+            first, second = [row['id'] for row in conn.execute("SELECT id FROM users WHERE is_admin = 0 ORDER BY id")]
+        Result.save(first, 9, 10)
+        Result.save(first, 5, 10)
+        Result.save(second, 3, 10)
+    login_admin(client)
+
+    page = client.get('/admin/results').get_data(as_text=True)
+    assert '3 results' in page
+
+    page = client.get('/admin/results?email=first@example.com').get_data(as_text=True)
+    assert '2 results' in page
+
+    # A saved result shows up in the cached filtered summary
+    with app.app_context():
+        Result.save(first, 7, 10)
+    page = client.get('/admin/results?email=first@example.com').get_data(as_text=True)
+    assert '3 results' in page
+    page = client.get('/admin/results?band=excellent').get_data(as_text=True)
+    assert '1 result' in page
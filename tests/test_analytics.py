@@ -0,0 +1,100 @@
+import random
+import pytest
+import analytics
+import scoring
+from models import Attempt, Question
+from repositories import BACKENDS
+
+def make_questions(count):
+    return [
+        {
+            'id': 1000 + 7 * i, 'question': f'Question {i}', 'category': 'General',
+            'option_a': f'a{i}', 'option_b': f'b{i}', 'option_c': f'c{i}', 'option_d': f'd{i}',
+            'correct_ans': f'{"abcd"[i % 4]}{i}',
+        }
+        for i in range(count)
+    ]
+
+def make_attempts(questions, count, seed):
+    """Random packed attempts, with unanswered questions and answers to deleted ones"""
+    rng = random.Random(seed)
+    ids = [q['id'] for q in questions] + [5, 2 ** 32 - 1]
+    percentages, id_blobs, answer_blobs = [], [], []
+    for _ in range(count):
+        picked = rng.sample(ids, rng.randint(1, len(ids)))
+        chosen = [rng.randint(analytics.UNANSWERED, 3) for _ in picked]
+        ids_blob, answers_blob = analytics.pack_attempt(picked, chosen)
+        percentages.append(rng.randint(0, 100) * 1.0)
+        id_blobs.append(ids_blob)
+        answer_blobs.append(answers_blob)
+    return percentages, id_blobs, answer_blobs
+
+def without_numpy(monkeypatch):
+    monkeypatch.setattr(analytics, 'np', None)
+    monkeypatch.setattr(analytics, '_numpy_checked', True)
+
+def test_packed_answers_round_trip():
+    question_ids = [1, 255, 256, 70000, 2 ** 32 - 1]
+    chosen = [0, 3, analytics.UNANSWERED, 1, 2]
+    ids_blob, answers_blob = analytics.pack_attempt(question_ids, chosen)
+    # The stored layout does not depend on the host
+    assert ids_blob[:8] == b'\x01\x00\x00\x00\xff\x00\x00\x00'
+    assert answers_blob == b'\x00\x03\xff\x01\x02'
+    ids, answers = analytics.unpack_attempt(ids_blob, answers_blob)
+    assert (list(ids), list(answers)) == (question_ids, chosen)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_saved_results_round_trip(make_app, backend):
+    app = make_app(RESULTS_BACKEND=backend, RESULTS_SHARDS=3)
+    with app.app_context():
+        questions = [Question.get_by_id(question_id) for question_id in (3, 1, 2)]
+        attempt_id = Attempt.create(1, [q['id'] for q in questions])
+        Attempt.save_answer(attempt_id, 3, questions[0]['correct_ans'], 1)
+        Attempt.save_answer(attempt_id, 1, questions[1]['option_d'], 2)
+        scoring.finish_attempt(attempt_id)
+
+        percentages, id_blobs, answer_blobs = analytics.load_answers()
+        assert len(percentages) == 1
+        ids, answers = analytics.unpack_attempt(id_blobs[0], answer_blobs[0])
+        assert list(ids) == [3, 1, 2]
+        assert list(answers) == [
+            analytics.option_index(questions[0], questions[0]['correct_ans']), 3, analytics.UNANSWERED
+        ]
+
+def test_array_fallback_counts(monkeypatch):
+    without_numpy(monkeypatch)
+    questions = make_questions(2)
+    attempts = [
+        (100.0, [1000, 1007], [0, 1]),
+        (50.0, [1000, 1007], [0, analytics.UNANSWERED]),
+        (0.0, [1007, 5], [2, 0]),
+    ]
+    percentages = [percentage for percentage, _, _ in attempts]
+    packed = [analytics.pack_attempt(ids, chosen) for _, ids, chosen in attempts]
+    items = analytics.compute_item_analysis(questions, percentages, *zip(*packed))
+
+    assert [item['attempts'] for item in items] == [2, 3]
+    assert [item['difficulty'] for item in items] == [1.0, pytest.approx(1 / 3)]
+    assert items[1]['option_rates'] == [0.0, pytest.approx(1 / 3), pytest.approx(1 / 3), 0.0]
+    assert items[1]['unanswered_rate'] == pytest.approx(1 / 3)
+    # Only the top attempt answered the first question, so it has no bottom group
+    assert [item['discrimination'] for item in items] == [None, 1.0]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_numpy_and_array_fallback_agree(monkeypatch, seed):
+    pytest.importorskip('numpy')
+    questions = make_questions(12)
+    data = make_attempts(questions, 200, seed)
+
+    analytics._load_numpy()
+    assert analytics.np is not None
+    with_numpy = analytics.compute_item_analysis(questions, *data)
+    without_numpy(monkeypatch)
+    fallback = analytics.compute_item_analysis(questions, *data)
+
+    assert [item['attempts'] for item in with_numpy] == [item['attempts'] for item in fallback]
+    for fast, slow in zip(with_numpy, fallback):
+        assert fast == {**slow, 'difficulty': pytest.approx(slow['difficulty']),
+                        'option_rates': pytest.approx(slow['option_rates']),
+                        'unanswered_rate': pytest.approx(slow['unanswered_rate'])}
+        assert isinstance(fast['attempts'], int)
@@ -0,0 +1,105 @@
+import time
+import pytest
+from database import db_connection
+from models import Attempt, Question, Result
+from conftest import login_admin, register
+
+@pytest.fixture
+def started(app, client):
+    """A quiz taker with an attempt over the whole sample bank; yields the attempt and its questions"""
+    register(client)
+    client.get('/start-quiz')
+    with client.session_transaction() as session:
+        attempt_id = session['attempt_id']
+    with app.app_context():
+        attempt = Attempt.get(attempt_id)
+        questions = {question_id: Question.get_by_id(question_id) for question_id in attempt['question_ids']}
+    return attempt, questions
+
+def wrong_answer(question):
+    return next(question[field] for field in ('option_a', 'option_b', 'option_c', 'option_d')
+                if question[field] != question['correct_ans'])
+
+@pytest.mark.parametrize('payload, message', [
+    ({'answers': {'1': 'Paris'}}, 'answers must be a list'),
+    ({'answers': [{'question_id': 1, 'answer': 'Paris'}] * 5}, 'answers must be a list'),
+    ({'answers': ['Paris']}, 'each answer must be an object'),
+    ({'answers': [{'question_id': 99, 'answer': 'Paris'}]}, 'question 99 is not part of this quiz'),
+    ({'answers': [{'question_id': '1', 'answer': 'Paris'}]}, "question '1' is not part of this quiz"),
+    ({'answers': [{'question_id': 1, 'answer': 'Lyon'}]}, 'answer to question 1 is not one of its options'),
+    ({'answers': [{'question_id': 1}]}, 'answer to question 1 is not one of its options'),
+    ({'answers': [], 'position': '2'}, 'position must be an integer'),
+])
+def test_invalid_answers_are_rejected(app, client, started, payload, message):
+    attempt, _ = started
+    for url in ('/api/attempt/answers', '/api/attempt/finish'):
+        response = client.post(url, json=payload)
+        assert response.status_code == 400
+        assert response.get_json()['error'].startswith(message)
+    with app.app_context():
+        assert Attempt.get_answers(attempt['id']) == {}
+        assert Attempt.get(attempt['id']) is not None
+
+def test_answers_must_be_json(client, started):
+    response = client.post('/api/attempt/answers', data={'answers': '[]'})
+    assert response.status_code == 415
+
+def test_answers_to_deleted_questions_are_skipped(app, client, started):
+    attempt, questions = started
+    first, second = attempt['question_ids'][:2]
+    with app.app_context():
+        Question.delete(first)
+    response = client.post('/api/attempt/answers', json={'answers': [
+        {'question_id': first, 'answer': 'anything'},
+        {'question_id': second, 'answer': questions[second]['correct_ans']},
+    ], 'position': 2})
+    assert response.get_json() == {'saved': 1, 'position': 2}
+    with app.app_context():
+        assert Attempt.get_answers(attempt['id']) == {second: questions[second]['correct_ans']}
+
+def test_submit_and_score(app, client, started):
+    attempt, questions = started
+    ids = attempt['question_ids']
+    assert [q['id'] for q in client.get('/api/attempt').get_json()['questions']] == list(ids)
+
+    # Two answers synced while answering, the last one sent with the submission
+    response = client.post('/api/attempt/answers', json={'answers': [
+        {'question_id': ids[0], 'answer': questions[ids[0]]['correct_ans']},
+        {'question_id': ids[1], 'answer': wrong_answer(questions[ids[1]])},
+    ], 'position': 2})
+    assert response.get_json() == {'saved': 2, 'position': 2}
+    response = client.post('/api/attempt/finish', json={'answers': [
+        {'question_id': ids[2], 'answer': questions[ids[2]]['correct_ans']},
+    ]})
+    assert response.status_code == 200
+    graded = response.get_json()
+    assert (graded['score'], graded['total'], graded['percentage']) == (2, 4, 50)
+    assert [r['is_correct'] for r in graded['results']] == [True, False, True, False]
+    assert graded['results'][3]['user_answer'] == ''
+
+    with app.app_context():
+        assert Attempt.get(attempt['id']) is None
+        history, _ = Result.get_history(2)
+        assert [(row['score'], row['total']) for row in history] == [(2, 4)]
+    # The attempt is closed: it can be neither answered nor submitted again
+    assert client.post('/api/attempt/finish', json={}).status_code == 404
+    assert client.post('/api/attempt/answers', json={'answers': []}).status_code == 404
+
+def test_late_answers_are_not_scored(app, client, started):
+    attempt, questions = started
+    question_id = attempt['question_ids'][0]
+    with app.app_context():
+        with db_connection() as conn:
+            conn.execute("UPDATE attempts SET expires_at = ? WHERE id = ?", (int(time.time()) - 60, attempt['id']))
+            conn.commit()
+
+    answers = {'answers': [{'question_id': question_id, 'answer': questions[question_id]['correct_ans']}]}
+    assert client.post('/api/attempt/answers', json=answers).status_code == 409
+    graded = client.post('/api/attempt/finish', json=answers).get_json()
+    assert (graded['score'], graded['total']) == (0, 4)
+
+def test_only_logged_in_quiz_takers(app):
+    client = app.test_client()
+    assert client.get('/api/attempt').status_code == 401
+    login_admin(client)
+    assert client.post('/api/attempt/finish', json={}).status_code == 403
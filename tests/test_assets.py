@@ -0,0 +1,55 @@
+import os
+import pytest
+import assets
+import caching
+
+@pytest.fixture
+def built(app, tmp_path, monkeypatch):
+    """Assets built from a small stylesheet into a temporary static folder"""
+    static_folder = tmp_path / 'static'
+    (static_folder / 'css').mkdir(parents=True)
+    (static_folder / 'css' / 'style.css').write_text('body { color: red; }')
+    monkeypatch.setattr(app, 'static_folder', str(static_folder))
+    manifest = assets.build_assets(str(static_folder), sources=('css/style.css',))
+    monkeypatch.setattr(assets, '_manifest', manifest)
+    return manifest
+
+def test_fingerprinted_files_are_immutable(app, built):
+    client = app.test_client()
+    name = built['css/style.css']['file']
+    response = client.get(f'/assets/{name}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == assets.IMMUTABLE_CACHE_CONTROL
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+
+def test_other_build_files_are_not_served(app, built):
+    client = app.test_client()
+    name = built['css/style.css']['file']
+    assert os.path.exists(os.path.join(app.static_folder, assets.BUILD_DIR, assets.MANIFEST_NAME))
+    for path in (assets.MANIFEST_NAME, f'{name}.gz', 'css/style.css', 'css/style.0123456789.css'):
+        assert client.get(f'/assets/{path}').status_code == 404
+
+def test_build_id_changes_with_the_manifest(monkeypatch):
+    monkeypatch.setattr(caching, 'BUILD_ID', caching.BUILD_ID)
+    caching.set_asset_manifest({'css/style.css': {'file': 'css/style.0123456789.css', 'src': 'css/style.css'}})
+    first = caching.make_etag('page')
+    caching.set_asset_manifest({'css/style.css': {'file': 'css/style.abcdefabcd.css', 'src': 'css/style.css'}})
+    assert caching.make_etag('page') != first
+
+def test_build_id_follows_template_contents_not_mtimes(tmp_path, monkeypatch):
+    # Two hosts with the same release checked out in different places at different times
+    for host in ('a', 'b'):
+        (tmp_path / host / 'partials').mkdir(parents=True)
+        (tmp_path / host / 'base.html').write_text('<html>{% block body %}{% endblock %}</html>')
+        (tmp_path / host / 'partials' / 'nav.html').write_text('<nav></nav>')
+    os.utime(tmp_path / 'b' / 'base.html', (0, 0))
+
+    build_ids = []
+    for host in ('a', 'b'):
+        monkeypatch.setattr(caching, 'TEMPLATE_DIR', str(tmp_path / host))
+        build_ids.append(caching._build_id())
+    assert build_ids[0] == build_ids[1]
+
+    (tmp_path / 'b' / 'partials' / 'nav.html').write_text('<nav>Quiz</nav>')
+    assert caching._build_id() != build_ids[0]
@@ -0,0 +1,62 @@
+import time
+import scoring
+from database import db_connection
+from models import Attempt, Question
+from conftest import register
+
+def test_logout_deletes_the_unfinished_attempt(app, client):
+    register(client)
+    assert client.get('/start-quiz').status_code == 302
+    with client.session_transaction() as session:
+        attempt_id = session['attempt_id']
+
+    client.get('/logout')
+    with app.app_context():
+        assert Attempt.get(attempt_id) is None
+
+def test_abandoned_untimed_attempts_are_purged(app):
+    with app.app_context():
+        old = Attempt.create(1, [1, 2])
+        Attempt.save_answer(old, 1, 'A', 1)
+        timed = Attempt.create(1, [1, 2], duration=60)
+        recent = Attempt.create(1, [1, 2])
+        with db_connection() as conn:
+            conn.execute(
+                "UPDATE attempts SET started_at = datetime('now', '-2 days') WHERE id IN (?, ?)", (old, timed)
+            )
+            conn.commit()
+
+        assert scoring.purge_abandoned(86400, batch_size=1) == 1
+        assert Attempt.get(old) is None
+        assert Attempt.get_answers(old) == {}
+        # Timed attempts are left to the finalizer, which scores them
+        assert Attempt.get(timed) is not None
+        assert Attempt.get(recent) is not None
+        assert scoring.purge_abandoned(86400, now=time.time() + 2 * 86400) == 1
+        assert Attempt.get(timed) is not None
+
+def test_form_answers_must_be_options_of_the_quiz_questions(app, client):
+    register(client)
+    client.get('/start-quiz')
+    with client.session_transaction() as session:
+        attempt_id = session['attempt_id']
+    with app.app_context():
+        attempt = Attempt.get(attempt_id)
+        first = Question.get_by_id(attempt['question_ids'][0])
+        outside = next(id for id in range(1, 10) if id not in attempt['question_ids'])
+
+    for form in (
+        {'question_id': outside, 'answer': 'A'},
+        {'question_id': first['id'], 'answer': 'not an option'},
+    ):
+        response = client.post('/question', data=form)
+        assert response.status_code == 200
+        assert b'Please choose one of the answers shown' in response.data
+    with app.app_context():
+        assert Attempt.get_answers(attempt_id) == {}
+        assert Attempt.get(attempt_id)['current_question'] == 0
+
+    client.post('/question', data={'question_id': first['id'], 'answer': first['option_a']})
+    with app.app_context():
+        assert Attempt.get_answers(attempt_id) == {first['id']: first['option_a']}
+        assert Attempt.get(attempt_id)['current_question'] == 1
@@ -0,0 +1,115 @@
+import sqlite3
+import pytest
+import events
+from database import db_connection
+from models import EventLog, Quiz, Result
+from conftest import migrate_to, wait_for
+
+def totals():
+    """quiz_totals as {quiz_id: (attempts, percentage_sum, best_percentage)}"""
+    return {
+        quiz_id: (row['attempts'], row['percentage_sum'], row['best_percentage'])
+        for quiz_id, row in Quiz.get_totals().items()
+    }
+
+def position():
+    with db_connection() as conn:
+        return EventLog.get_position(conn, 'quiz_totals')
+
+def save_results(results):
+    for score, total, quiz_id in results:
+        Result.save(1, score, total, quiz_id=quiz_id)
+
+# (score, total, quiz_id); results without a quiz or without questions are not counted
+RESULTS = [(3, 4, 1), (1, 4, 1), (5, 5, 2), (2, 4, None), (0, 0, 1)]
+TOTALS = {1: (2, 100.0, 75.0), 2: (1, 100.0, 100.0)}
+
+def caught_up():
+    return events.get_lag()['quiz_totals'] == 0
+
+def test_batches_are_checkpointed(app):
+    with app.app_context():
+        save_results(RESULTS)
+        assert events.get_lag()['quiz_totals'] == len(RESULTS)
+
+        assert events.process_batch('quiz_totals', batch_size=2) == 2
+        assert position() == EventLog.get_last_id() - 3
+        assert totals() == {1: (2, 100.0, 75.0)}
+        assert events.drain('quiz_totals', batch_size=2) == 3
+        assert caught_up()
+        assert events.drain('quiz_totals') == 0
+        assert totals() == TOTALS
+
+def test_failed_batch_is_applied_once_on_retry(app, monkeypatch):
+    with app.app_context():
+        save_results(RESULTS[:2])
+        events.drain('quiz_totals')
+        checkpoint = position()
+        save_results([(4, 4, 1)])
+
+        def fail(conn, batch):
+            events.update_quiz_totals(conn, batch)
+            raise sqlite3.OperationalError('disk I/O error')
+
+        monkeypatch.setitem(events.CONSUMERS, 'quiz_totals', (fail, events.reset_quiz_totals))
+        with pytest.raises(sqlite3.OperationalError):
+            events.drain('quiz_totals')
+        assert position() == checkpoint
+        assert totals() == {1: (2, 100.0, 75.0)}
+
+        monkeypatch.undo()
+        assert events.drain('quiz_totals') == 1
+        assert totals() == {1: (3, 200.0, 100.0)}
+
+def test_replay_rebuilds_from_the_start(app):
+    with app.app_context():
+        save_results(RESULTS)
+        events.drain('quiz_totals')
+        with db_connection() as conn:
+            conn.execute("UPDATE quiz_totals SET attempts = 99, best_percentage = 0")
+            conn.execute("INSERT INTO quiz_totals VALUES (7, 1, 50.0, 50.0, '2024-01-01 10:00:00')")
+            conn.commit()
+
+        assert events.replay('quiz_totals', batch_size=2) == len(RESULTS)
+        assert totals() == TOTALS
+        assert position() == EventLog.get_last_id()
+
+def test_restarted_consumers_continue_from_their_checkpoint(app, monkeypatch):
+    monkeypatch.setattr(events, 'MIN_PASS_INTERVAL', 0.01)
+    pool = events.ConsumerPool(interval=0.05, batch_size=2)
+    with app.app_context():
+        try:
+            save_results(RESULTS[:3])
+            pool.start()
+            assert wait_for(caught_up)
+            pool.stop()
+
+            save_results(RESULTS[3:])
+            assert events.get_lag()['quiz_totals'] == 2
+            pool.start()
+            assert wait_for(caught_up)
+        finally:
+            pool.stop()
+        # Events handled before the restart were not applied again
+        assert totals() == TOTALS
+
+def test_quiz_totals_from_results_before_the_log(make_app, tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'quiz.db')
+    # Results saved by a release with quizzes but without the user_summary trigger
+    migrate_to(conn, 10, monkeypatch)
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('A', 'a@example.com', '-')")
+    conn.executemany(
+        "INSERT INTO results (user_id, score, total, quiz_id, quiz_date) VALUES (1, ?, ?, ?, ?)",
+        [(score, total, quiz_id, f'2024-01-0{day} 10:00:00') for day, (score, total, quiz_id) in enumerate(RESULTS, 1)]
+    )
+    conn.commit()
+    conn.close()
+
+    app = make_app()
+    with app.app_context():
+        # Migration 12 logged every earlier result; the consumer builds the totals from them
+        assert events.get_lag()['quiz_totals'] == len(RESULTS)
+        assert events.drain('quiz_totals') == len(RESULTS)
+        assert totals() == TOTALS
+        assert Quiz.get_totals()[2]['last_attempt_at'] == '2024-01-03 10:00:00'
+        assert Quiz.get_totals()[1]['last_attempt_at'] == '2024-01-02 10:00:00'
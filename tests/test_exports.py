@@ -0,0 +1,34 @@
+import csv
+import io
+import question_io
+from database import db_connection
+from models import Question, Result, User
+from conftest import login_admin
+
+def test_question_export_quotes_formulas_and_imports_back(app):
+    with app.app_context():
+        Question.create('=1+1', '-1', '+2', '@3', 'four', 'four')
+        exported = ''.join(question_io.export_questions('csv'))
+        row = list(csv.DictReader(io.StringIO(exported)))[-1]
+        assert [row[field] for field in question_io.QUESTION_FIELDS[:5]] == ["'=1+1", "'-1", "'+2", "'@3", 'four']
+
+        with db_connection() as conn:
+            conn.execute("DELETE FROM questions")
+            conn.commit()
+        report = question_io.import_questions(io.StringIO(exported))
+        assert report['inserted'] == 5
+        with db_connection() as conn:
+            question = conn.execute("SELECT * FROM questions WHERE question = ?", ('=1+1',)).fetchone()
+        assert (question['option_a'], question['option_b'], question['option_c']) == ('-1', '+2', '@3')
+
+def test_results_export_quotes_formulas(app, client):
+    with app.app_context():
+        User.create('=HYPERLINK("http://example.com")', 'formula@example.com', 'secret1')
+        with db_connection() as conn:
+            user_id = conn.execute("SELECT id FROM users WHERE email = ?", ('formula@example.com',)).fetchone()['id']
+        Result.save(user_id, 1, 2)
+    login_admin(client)
+
+    rows = list(csv.DictReader(io.StringIO(client.get('/admin/results/export').get_data(as_text=True))))
+    assert rows[0]['name'] == '\'=HYPERLINK("http://example.com")'
+    assert rows[0]['email'] == 'formula@example.com'
@@ -0,0 +1,47 @@
+import time
+import finalizer
+from database import db_connection
+from models import Attempt, Quiz
+from conftest import register, wait_for
+
+def test_expired_attempt_of_timed_quiz_is_finalized(make_app, monkeypatch):
+    # No global QUIZ_DURATION: only the quiz has a time limit
+    monkeypatch.setattr(finalizer, '_finalizer', None)
+    app = make_app(QUIZ_DURATION=None, FINALIZER_INTERVAL=0.05)
+    client = app.test_client()
+    assert finalizer._finalizer is not None
+
+    try:
+        with app.app_context():
+            quiz_id = Quiz.create('Timed', '', [1, 2], duration=1)
+        register(client)
+        response = client.get(f'/start-quiz/{quiz_id}')
+        assert response.status_code == 302
+        with client.session_transaction() as session:
+            attempt_id = session['attempt_id']
+
+        with app.app_context():
+            attempt = Attempt.get(attempt_id)
+            assert attempt['expires_at'] is not None
+            # Move the deadline past the grace period instead of waiting for it
+            with db_connection() as conn:
+                conn.execute("UPDATE attempts SET expires_at = ? WHERE id = ?", (int(time.time()) - 60, attempt_id))
+                conn.commit()
+
+        def finalized():
+            with app.app_context():
+                with db_connection() as conn:
+                    return conn.execute(
+                        "SELECT COUNT(*) FROM results WHERE quiz_id = ?", (quiz_id,)
+                    ).fetchone()[0] == 1
+
+        assert wait_for(finalized)
+        with app.app_context():
+            assert Attempt.get(attempt_id) is None
+    finally:
+        finalizer._finalizer.stop()
+
+def test_finalizer_can_be_turned_off(make_app, monkeypatch):
+    monkeypatch.setattr(finalizer, '_finalizer', None)
+    make_app(FINALIZER_INTERVAL=0)
+    assert finalizer._finalizer is None
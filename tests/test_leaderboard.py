@@ -0,0 +1,103 @@
+import datetime
+import pytest
+import migrations
+from database import db_connection
+from models import Leaderboard
+from repositories import BACKENDS, get_repository, result_row
+from conftest import migrate_to
+
+# (score, total, date) of one user; 2024-01-01 is a Monday
+RESULTS = [
+    (5, 10, '2024-01-01 10:00:00'),
+    (8, 10, '2024-01-03 10:00:00'),
+    (3, 10, '2024-01-03 12:00:00'),
+    (6, 10, '2024-01-08 10:00:00'),
+]
+
+# Best (score, total, achieved_at) per window of RESULTS
+EXPECTED = {
+    ('all', ''): (8, 10, '2024-01-03 10:00:00'),
+    ('week', '2024-01-01'): (8, 10, '2024-01-03 10:00:00'),
+    ('week', '2024-01-08'): (6, 10, '2024-01-08 10:00:00'),
+    ('day', '2024-01-01'): (5, 10, '2024-01-01 10:00:00'),
+    ('day', '2024-01-03'): (8, 10, '2024-01-03 10:00:00'),
+    ('day', '2024-01-08'): (6, 10, '2024-01-08 10:00:00'),
+}
+
+@pytest.fixture(params=BACKENDS)
+def board(request, make_app):
+    """A repository of each backend on a fresh database, and a user without results"""
+    app = make_app(RESULTS_BACKEND=request.param, RESULTS_SHARDS=3)
+    with app.app_context():
+        with db_connection() as conn:
+            user_id = conn.execute(
+                "INSERT INTO users (name, email, password) VALUES ('Board User', 'board@example.com', '-')"
+            ).lastrowid
+            conn.commit()
+        yield get_repository(), user_id
+
+def entry(repo, period, period_start, user_id):
+    row = repo.get_leaderboard_rank(period, period_start, user_id)
+    return row and (row['best_score'], row['best_total'], row['achieved_at'])
+
+def test_results_update_every_window(board):
+    repo, user_id = board
+    for score, total, date in RESULTS:
+        repo.add([result_row(user_id, score, total, quiz_date=date)])
+
+    for (period, period_start), best in EXPECTED.items():
+        assert entry(repo, period, period_start, user_id) == best
+    assert entry(repo, 'week', '2023-12-25', user_id) is None
+    assert [row['user_id'] for row in repo.get_leaderboard('week', '2024-01-08', 10)] == [user_id]
+
+def test_only_a_better_result_replaces_the_best(board):
+    repo, user_id = board
+    repo.add([result_row(user_id, 8, 10, quiz_date='2024-01-03 10:00:00')])
+    # The same percentage later keeps the earlier result, which ranks higher on ties
+    repo.add([result_row(user_id, 4, 5, quiz_date='2024-01-03 11:00:00')])
+    repo.add([result_row(user_id, 1, 10, quiz_date='2024-01-03 12:00:00')])
+    assert entry(repo, 'day', '2024-01-03', user_id) == (8, 10, '2024-01-03 10:00:00')
+
+    repo.add([result_row(user_id, 9, 10, quiz_date='2024-01-03 13:00:00')])
+    for period, period_start in (('all', ''), ('week', '2024-01-01'), ('day', '2024-01-03')):
+        assert entry(repo, period, period_start, user_id) == (9, 10, '2024-01-03 13:00:00')
+        assert repo.get_leaderboard_rank(period, period_start, user_id)['best_percentage'] == 90.0
+
+def test_results_without_questions_are_left_out(board):
+    repo, user_id = board
+    repo.add([result_row(user_id, 0, 0, quiz_date='2024-01-03 10:00:00')])
+    for period, period_start in (('all', ''), ('week', '2024-01-01'), ('day', '2024-01-03')):
+        assert repo.get_leaderboard(period, period_start, 10) == []
+        assert entry(repo, period, period_start, user_id) is None
+
+def test_backfill_matches_the_triggers(conn, monkeypatch):
+    migrate_to(conn, 6, monkeypatch)
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('A', 'a@example.com', '-')")
+    conn.executemany(
+        "INSERT INTO results (user_id, score, total, quiz_date) VALUES (1, ?, ?, ?)",
+        RESULTS + [(0, 0, '2024-01-09 10:00:00')]
+    )
+    conn.commit()
+    migrations.migrate(conn)
+
+    rows = conn.execute(
+        "SELECT period, period_start, best_score, best_total, achieved_at FROM leaderboard WHERE user_id = 1"
+    ).fetchall()
+    assert {(row[0], row[1]): tuple(row[2:]) for row in rows} == EXPECTED
+
+    # Later results go through the triggers on top of the backfilled rows
+    conn.execute("INSERT INTO results (user_id, score, total, quiz_date) VALUES (1, 7, 10, '2024-01-08 11:00:00')")
+    assert tuple(conn.execute(
+        "SELECT best_score, achieved_at FROM leaderboard WHERE period = 'week' AND period_start = '2024-01-08'"
+    ).fetchone()) == (7, '2024-01-08 11:00:00')
+    assert conn.execute(
+        "SELECT best_score FROM leaderboard WHERE period = 'all'"
+    ).fetchone()[0] == 8
+
+def test_period_start_matches_the_triggers(conn):
+    migrations.migrate(conn)
+    now = datetime.datetime(2024, 1, 7, 23, 59)
+    (week,) = conn.execute("SELECT date('2024-01-07 23:59:00', 'weekday 0', '-6 days')").fetchone()
+    assert Leaderboard.period_start('week', now) == week == '2024-01-01'
+    assert Leaderboard.period_start('day', now) == '2024-01-07'
+    assert Leaderboard.period_start('all', now) == ''
@@ -0,0 +1,11 @@
+def test_metrics_are_disabled_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+
+def test_metrics_need_the_bearer_token(make_app):
+    client = make_app(METRICS_TOKEN='scrape-me').test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert 'quiz_http_requests_total' in response.get_data(as_text=True)
@@ -0,0 +1,33 @@
+import migrations
+from models import UserSummary
+from conftest import migrate_to
+
+def test_user_summary_backfill_skips_results_without_questions(conn, monkeypatch):
+    migrate_to(conn, 10, monkeypatch)
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('A', 'a@example.com', '-')")
+    conn.executemany(
+        "INSERT INTO results (user_id, score, total, quiz_date) VALUES (1, ?, ?, ?)",
+        [(3, 4, '2024-01-01 10:00:00'), (0, 0, '2024-01-02 10:00:00')]
+    )
+    conn.commit()
+    migrations.migrate(conn)
+
+    row = conn.execute("SELECT * FROM user_summary WHERE user_id = 1").fetchone()
+    assert (row['attempts'], row['last_score'], row['last_total']) == (1, 3, 4)
+    # New results without questions no longer fail the insert
+    conn.execute("INSERT INTO results (user_id, score, total) VALUES (1, 0, 0)")
+    assert conn.execute("SELECT attempts FROM user_summary WHERE user_id = 1").fetchone()[0] == 1
+
+def test_user_summary_of_an_empty_last_result(app, monkeypatch):
+    row = {
+        'attempts': 1, 'total_score': 0, 'total_questions': 0, 'recent_percentage': 0.0,
+        'best_score': 0, 'best_total': 0, 'best_percentage': 0.0, 'last_score': 0, 'last_total': 0,
+        'last_quiz_date': '2024-01-01 10:00:00', 'streak_days': 1, 'streak_last_day': '2024-01-01',
+    }
+
+    class Repository:
+        def get_user_summary(self, user_id):
+            return row
+
+    monkeypatch.setattr('models.get_repository', Repository)
+    assert UserSummary.get(1)['last_percentage'] == 0
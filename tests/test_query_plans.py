@@ -0,0 +1,115 @@
+import time
+import pytest
+import database
+import instrumentation
+import scoring
+from database import db_connection
+from models import Attempt, EventLog, Leaderboard, Question, Quiz, Result, User, UserSummary
+
+# Read and write paths that run on most requests and must be answered from an index.
+# Listings ordered by rowid with a LIMIT (Question.get_recent) read only the rows they
+# return; search goes through FTS5; exports, analytics and filtered summaries read
+# every matching result by design. None of those are listed.
+HOT_CALLS = [
+    ('User.authenticate', lambda ids: User.authenticate('admin@example.com', 'admin123')),
+    ('User.get_by_id', lambda ids: User.get_by_id(ids['user'])),
+    ('init_db admin check', lambda ids: database.init_db()),
+    ('Question.get_by_id', lambda ids: Question.get_by_id(1)),
+    ('Question.get_bank_version', lambda ids: Question.get_bank_version()),
+    ('Quiz.get_by_id', lambda ids: Quiz.get_by_id(ids['quiz'])),
+    ('Quiz.get_question_ids', lambda ids: Quiz.get_question_ids(ids['quiz'])),
+    ('Result.get_version', lambda ids: Result.get_version()),
+    ('Result.get_stats', lambda ids: Result.get_stats()),
+    ('Result.get_summary', lambda ids: Result.get_summary()),
+    ('Result.get_recent', lambda ids: Result.get_recent()),
+    ('Result.get_history', lambda ids: Result.get_history(ids['user'], ('9999-12-31', 0), 10)),
+    ('Result.get_page', lambda ids: Result.get_page(('9999-12-31', 0), 50)),
+    ('Result.get_page (user)', lambda ids: Result.get_page(None, 50, user_id=ids['user'])),
+    ('Result.get_page (quiz)', lambda ids: Result.get_page(None, 50, quiz_id=ids['quiz'])),
+    ('Result.save', lambda ids: Result.save(ids['user'], 1, 2)),
+    ('UserSummary.get', lambda ids: UserSummary.get(ids['user'])),
+    ('Leaderboard.get_top', lambda ids: Leaderboard.get_top()),
+    ('Leaderboard.get_rank', lambda ids: Leaderboard.get_rank(ids['user'])),
+    ('Attempt.get', lambda ids: Attempt.get(ids['attempt'])),
+    ('Attempt.get_answers', lambda ids: Attempt.get_answers(ids['attempt'])),
+    ('Attempt.save_answer', lambda ids: Attempt.save_answer(ids['attempt'], 1, 'A', 1)),
+    ('finalize_expired', lambda ids: scoring.finalize_expired(now=time.time() + 86400)),
+    ('purge_abandoned', lambda ids: scoring.purge_abandoned(86400)),
+    ('EventLog', lambda ids: read_events()),
+]
+
+def read_events():
+    with db_connection() as conn:
+        EventLog.read(conn, 0, 500)
+        EventLog.get_position(conn, 'quiz_totals')
+
+# Index walks that stop after the first rows: the newest results under a LIMIT,
+# and a probe for any question at all
+BOUNDED_SCANS = {
+    'Result.get_recent': 'SCAN r USING INDEX idx_results_date',
+    'init_db admin check': 'SCAN questions USING ',
+}
+
+def plan_problems(name, conn, sql, params):
+    """Plan steps that scan a table or index or sort in a temporary B-tree"""
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        # A SELECT without FROM "scans" a single constant row
+        scan = detail.startswith('SCAN ') and detail != 'SCAN CONSTANT ROW'
+        if scan and name in BOUNDED_SCANS and detail.startswith(BOUNDED_SCANS[name]):
+            scan = False
+        if scan or 'TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Every statement run through an instrumented cursor, as (sql, parameters)"""
+    statements = []
+    execute = instrumentation.InstrumentedCursor.execute
+    executemany = instrumentation.InstrumentedCursor.executemany
+
+    def capture(self, sql, parameters=()):
+        statements.append((sql, parameters))
+        return execute(self, sql, parameters)
+
+    def capture_many(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        statements.extend((sql, parameters) for parameters in seq_of_parameters)
+        return executemany(self, sql, seq_of_parameters)
+
+    monkeypatch.setattr(instrumentation.InstrumentedCursor, 'execute', capture)
+    monkeypatch.setattr(instrumentation.InstrumentedCursor, 'executemany', capture_many)
+    return statements
+
+@pytest.mark.parametrize('backend', ['sqlite', 'sharded'])
+def test_hot_queries_use_indexes(make_app, captured, backend):
+    app = make_app(INSTRUMENTATION=True, RESULTS_BACKEND=backend, RESULTS_SHARDS=2)
+    with app.app_context():
+        User.create('Plan User', 'plan@example.com', 'secret1')
+        with db_connection() as conn:
+            user_id = conn.execute("SELECT id FROM users WHERE email = ?", ('plan@example.com',)).fetchone()['id']
+        quiz_id = Quiz.create('Plans', '', [1, 2, 3], duration=60)
+        Result.save(user_id, 3, 4, quiz_id=quiz_id)
+        ids = {
+            'user': user_id,
+            'quiz': quiz_id,
+            'attempt': Attempt.create(user_id, [1, 2, 3], duration=60, quiz_id=quiz_id),
+        }
+
+        # The question bank is loaded with one full read after each change, then cached
+        Question.get_bank()
+
+        problems = []
+        for name, call in HOT_CALLS:
+            del captured[:]
+            call(ids)
+            assert captured, f"{name} ran no instrumented statements"
+            with db_connection() as conn:
+                for sql, params in captured:
+                    if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'UPDATE', 'DELETE'):
+                        continue
+                    problems.extend(f"{name}: {detail}\n{' '.join(sql.split())}"
+                                    for detail in plan_problems(name, conn, sql, params))
+    assert not problems, '\n'.join(problems)
@@ -0,0 +1,159 @@
+import sqlite3
+import pytest
+from database import db_connection
+from models import Attempt, EventLog
+from repositories import BACKENDS, _round_half_up, get_repository, result_row
+
+# (user, score, total, quiz, date); every percentage differs so the leaderboard order is fixed
+SAVED = [
+    (0, 9, 10, 1, '2024-01-01 10:00:00'),
+    (1, 5, 10, None, '2024-01-02 10:00:00'),
+    (2, 2, 10, 1, '2024-01-03 10:00:00'),
+    (0, 7, 10, None, '2024-01-04 10:00:00'),
+    (1, 13, 20, 1, '2024-01-05 10:00:00'),
+    (0, 3, 4, None, '2024-01-05 10:00:00'),
+]
+
+@pytest.fixture(params=BACKENDS)
+def stored(request, make_app):
+    """A repository of each backend on a fresh database, holding SAVED for three users
+
+    Yields the repository, the user IDs and SAVED with user indexes replaced by IDs.
+    """
+    app = make_app(RESULTS_BACKEND=request.param, RESULTS_SHARDS=3)
+    with app.app_context():
+        with db_connection() as conn:
+            user_ids = [
+                conn.execute(
+                    "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+                    (f"Check User {n}", f"check{n}@storage.test", '-')
+                ).lastrowid
+                for n in range(3)
+            ]
+            conn.commit()
+        saved = [(user_ids[user], score, total, quiz, date) for user, score, total, quiz, date in SAVED]
+
+        repo = get_repository()
+        repo.add([result_row(user, score, total, b'ids', b'answers', quiz, date)
+                  for user, score, total, quiz, date in saved[:3]])
+        for user, score, total, quiz, date in saved[3:]:
+            repo.add([result_row(user, score, total, quiz_id=quiz, quiz_date=date)])
+        yield repo, user_ids, saved
+
+def walk(fetch):
+    """Follow the cursors of a listing to its end"""
+    rows, cursor = fetch(None)
+    collected = list(rows)
+    while cursor is not None:
+        rows, cursor = fetch(cursor)
+        collected.extend(rows)
+    return collected
+
+def test_counters(stored):
+    repo, _, saved = stored
+    assert repo.get_version() == len(saved)
+    stats = repo.get_stats()
+    assert stats['total_quizzes'] == len(saved)
+    assert stats['unique_users'] == 3
+    assert stats['percentage_sum'] == pytest.approx(sum(score * 100.0 / total for _, score, total, _, _ in saved))
+
+def test_pages(stored):
+    repo, user_ids, saved = stored
+    # One row at a time to exercise the cursors
+    everything = walk(lambda cursor: repo.get_page(cursor, 1))
+    assert len({row['id'] for row in everything}) == len(saved)
+    assert [row['quiz_date'] for row in everything] == sorted((r[4] for r in saved), reverse=True)
+    keys = [(row['quiz_date'], row['id']) for row in everything]
+    assert keys == sorted(keys, reverse=True)
+    assert sorted(row['name'] for row in everything) == sorted(f"Check User {user_ids.index(r[0])}" for r in saved)
+    assert repo.get_page(None, len(saved))[1] is None
+
+    first = user_ids[0]
+    history = walk(lambda cursor: repo.get_history(first, cursor, 2))
+    newest_first = sorted(saved, key=lambda r: r[4], reverse=True)
+    assert [(row['score'], row['total']) for row in history] == [(r[1], r[2]) for r in newest_first if r[0] == first]
+
+@pytest.mark.parametrize('make_filters, expected', [
+    (lambda ids: {'user_id': ids[1]}, lambda ids, r: r[0] == ids[1]),
+    (lambda ids: {'email': 'check2@storage.test'}, lambda ids, r: r[0] == ids[2]),
+    (lambda ids: {'email': 'nobody@storage.test'}, lambda ids, r: False),
+    (lambda ids: {'quiz_id': 1}, lambda ids, r: r[3] == 1),
+    (lambda ids: {'min_percentage': 60, 'max_percentage': 80}, lambda ids, r: 60 <= round(r[1] * 100 / r[2]) < 80),
+    (lambda ids: {'date_from': '2024-01-02', 'date_to': '2024-01-04'}, lambda ids, r: '2024-01-02' <= r[4] < '2024-01-05'),
+], ids=['user_id', 'email', 'unknown email', 'quiz_id', 'percentage', 'dates'])
+def test_filters(stored, make_filters, expected):
+    repo, user_ids, saved = stored
+    filters = make_filters(user_ids)
+    matching = [r for r in saved if expected(user_ids, r)]
+
+    rows = walk(lambda cursor: repo.get_page(cursor, 2, **filters))
+    assert sorted((row['score'], row['total']) for row in rows) == sorted((r[1], r[2]) for r in matching)
+    assert repo.get_summary(**filters)['total_quizzes'] == len(matching)
+
+def test_summary(stored):
+    repo, _, saved = stored
+    percentages = [int(round(score * 100.0 / total)) for _, score, total, _, _ in saved]
+    expected = {
+        'total_quizzes': len(saved),
+        'average': _round_half_up(sum(percentages) / len(percentages), 1),
+        'highest': max(percentages),
+        'lowest': min(percentages),
+        'excellent': sum(p >= 80 for p in percentages),
+        'good': sum(60 <= p < 80 for p in percentages),
+        'average_band': sum(40 <= p < 60 for p in percentages),
+        'poor': sum(p < 40 for p in percentages),
+    }
+    # From the counters, and aggregated with a filter every result matches
+    assert repo.get_summary() == expected
+    assert repo.get_summary(date_from='2000-01-01') == expected
+
+def test_user_summary_and_leaderboard(stored):
+    repo, user_ids, _ = stored
+    first, second, third = user_ids
+    user_summary = repo.get_user_summary(first)
+    assert user_summary['attempts'] == 3
+    assert (user_summary['best_score'], user_summary['best_total']) == (9, 10)
+    assert repo.get_user_summary(-1) is None
+
+    top = repo.get_leaderboard('all', '', 10)
+    assert [(row['user_id'], row['name']) for row in top] == [
+        (first, 'Check User 0'), (second, 'Check User 1'), (third, 'Check User 2'),
+    ]
+    assert len(repo.get_leaderboard('all', '', 2)) == 2
+    for rank, user in enumerate(user_ids, 1):
+        assert repo.get_leaderboard_rank('all', '', user)['rank'] == rank
+    assert repo.get_leaderboard_rank('all', '', -1) is None
+
+def test_iter_answers(stored):
+    repo, _, _ = stored
+    assert len(list(repo.iter_answers(2))) == 3
+
+def test_results_without_questions_are_saved_but_not_summarised(stored):
+    repo, user_ids, saved = stored
+    first = user_ids[0]
+    repo.add([result_row(first, 0, 0, quiz_date='2024-01-06 10:00:00')])
+    assert repo.get_version() == len(saved) + 1
+    assert repo.get_user_summary(first)['attempts'] == 3
+    assert repo.get_leaderboard_rank('all', '', first)['rank'] == 1
+
+def test_finalizing_again_after_a_failed_transaction_saves_one_result(stored, monkeypatch):
+    repo, user_ids, saved = stored
+    attempt_id = Attempt.create(user_ids[0], [1, 2])
+
+    def grade(attempt, answers):
+        return {'score': 1, 'total': 2, 'question_ids': None, 'answers': None}
+
+    def fail(conn, events):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    # The main database transaction fails after the results were added
+    with monkeypatch.context() as patch:
+        patch.setattr(EventLog, 'append', staticmethod(fail))
+        with pytest.raises(sqlite3.OperationalError):
+            Attempt.finalize(grade, attempt_id=attempt_id)
+    assert Attempt.get(attempt_id) is not None
+
+    assert len(Attempt.finalize(grade, attempt_id=attempt_id)) == 1
+    assert Attempt.get(attempt_id) is None
+    assert repo.get_version() == len(saved) + 1
+    assert repo.get_user_summary(user_ids[0])['attempts'] == 4
@@ -0,0 +1,58 @@
+import pytest
+from models import QuestionBank, QuestionRecord
+from sampling import QuizConfig, sample_question_ids
+
+def make_bank(categories):
+    """A bank with one question per entry of categories, IDs from 1"""
+    questions = []
+    for question_id, category in enumerate(categories, 1):
+        row = dict.fromkeys(QuestionRecord.__slots__)
+        row.update(id=question_id, category=category, difficulty='easy')
+        questions.append(QuestionRecord(row))
+    return QuestionBank(1, questions)
+
+BANK = make_bank(['Science'] * 20 + ['History'] * 20 + ['Art'] * 60)
+
+def categories(question_ids):
+    counts = {}
+    for question_id in question_ids:
+        category = BANK.by_id[question_id].category
+        counts[category] = counts.get(category, 0) + 1
+    return counts
+
+@pytest.mark.parametrize('seed', range(20))
+def test_quotas_are_always_met(seed):
+    config = QuizConfig(size=10, seed=seed, quotas={'Science': 4, 'History': 6})
+    question_ids = sample_question_ids(config, BANK)
+    assert len(question_ids) == len(set(question_ids)) == 10
+    assert categories(question_ids) == {'Science': 4, 'History': 6}
+
+def test_quotas_are_filled_from_the_whole_bank():
+    question_ids = sample_question_ids(QuizConfig(size=30, quotas={'Science': 15}), BANK)
+    assert len(set(question_ids)) == 30
+    assert categories(question_ids)['Science'] >= 15
+
+def test_a_small_group_gives_what_it_has():
+    bank = make_bank(['Science'] * 2 + ['Art'] * 10)
+    question_ids = sample_question_ids(QuizConfig(size=5, quotas={'Science': 4}), bank)
+    assert len(set(question_ids)) == 5
+    assert {1, 2} <= set(question_ids)
+
+def test_quotas_larger_than_the_quiz_are_rejected():
+    with pytest.raises(ValueError):
+        QuizConfig(size=5, quotas={'Science': 4, 'History': 3})
+    with pytest.raises(ValueError):
+        QuizConfig(size=5, quotas={'Science': -1})
+
+def test_the_app_rejects_quotas_larger_than_the_quiz(make_app):
+    with pytest.raises(ValueError):
+        make_app(QUIZ_SIZE=5, QUIZ_QUOTAS={'Science': 6})
+
+def test_a_seed_gives_the_same_draw():
+    config = QuizConfig(size=10, seed=42, quotas={'Science': 3})
+    first = sample_question_ids(config, BANK)
+    assert sample_question_ids(config, BANK) == first
+    assert sample_question_ids(QuizConfig(size=10, seed=43, quotas={'Science': 3}), BANK) != first
+
+def test_without_size_or_quotas_the_whole_bank_is_used_in_order():
+    assert sample_question_ids(QuizConfig(), BANK) == list(BANK.ids)
@@ -0,0 +1,82 @@
+import pytest
+import models
+from models import Question
+from conftest import login_admin
+
+# Besides the sample bank; 'pacific' is in the text of one question and an option of the other
+QUESTIONS = [
+    ('Which ocean is the largest?', 'Atlantic', 'Indian', 'Arctic', 'Pacific', 'Pacific', 'Geography', None),
+    ('Where does the Pacific salmon spawn?', 'In rivers', 'At sea', 'In lakes', 'On reefs', 'In rivers', 'Nature', None),
+]
+
+@pytest.fixture(params=['fts', 'scan'])
+def bank(request, app, monkeypatch):
+    """The sample bank plus QUESTIONS, searched through FTS5 or by scanning the cached bank"""
+    with app.app_context():
+        Question.bulk_create(QUESTIONS)
+        if request.param == 'scan':
+            monkeypatch.setattr(models, '_has_search_index', False)
+        else:
+            with models.db_connection() as conn:
+                assert models._search_index_available(conn)
+        ids = {question['question']: question['id'] for question in Question.get_all()}
+        yield ids
+
+def search(query, **kwargs):
+    questions, total = Question.search(query, **kwargs)
+    return [question['question'] for question in questions], total
+
+def test_question_text_matches_rank_first(bank):
+    assert search('pacific') == (['Where does the Pacific salmon spawn?', 'Which ocean is the largest?'], 2)
+    assert search('pac') == search('pacific')
+    assert search('PACIFIC salmon') == (['Where does the Pacific salmon spawn?'], 1)
+    assert search('pacific', page=2, per_page=1) == (['Which ocean is the largest?'], 2)
+    assert search('pacific', page=3, per_page=1) == ([], 2)
+
+def test_queries_are_never_search_syntax(bank):
+    for query in ('"pacific', 'pacific OR NOT salmon', 'question : ocean', 'ocean*)', '  '):
+        Question.search(query)
+    assert search('ocean*)') == (['Which ocean is the largest?'], 1)
+    assert search('  ') == ([], 0)
+
+def test_index_follows_question_updates_and_deletes(bank):
+    salmon = bank['Where does the Pacific salmon spawn?']
+    Question.update(salmon, 'Where do trout spawn?', 'In rivers', 'At sea', 'In lakes', 'On reefs', 'In rivers')
+    assert search('pacific') == (['Which ocean is the largest?'], 1)
+    assert search('salmon') == ([], 0)
+    assert search('trout') == (['Where do trout spawn?'], 1)
+
+    Question.delete(bank['Which ocean is the largest?'])
+    assert search('pacific') == ([], 0)
+    assert search('rivers') == (['Where do trout spawn?'], 1)
+
+def test_near_duplicates_are_found(bank):
+    red_planet = bank['Which planet is known as the Red Planet?']
+    similar = Question.find_similar('which planet is known as the red planet')
+    assert [(question.id, similarity) for question, similarity in similar] == [(red_planet, 1.0)]
+    # Seven of the eight distinct words are shared
+    assert [question.id for question, _ in Question.find_similar('Which planet is known as the Red Star?')] == [red_planet]
+    # Five of eight
+    assert Question.find_similar('Which planet is called the Red Planet?') == []
+    assert Question.find_similar('Which planet is called the Red Planet?', threshold=0.6)[0][0].id == red_planet
+    assert Question.find_similar('Which planet is known as the Red Planet?', exclude_id=red_planet) == []
+    assert Question.find_similar('') == []
+
+    Question.update(red_planet, 'Which planet has the most moons?', 'Venus', 'Jupiter', 'Mars', 'Saturn', 'Saturn')
+    assert Question.find_similar('Which planet is known as the Red Planet?') == []
+    assert [question.id for question, _ in Question.find_similar('which planet has the most moons')] == [red_planet]
+
+def test_adding_a_duplicate_needs_confirmation(app, client):
+    login_admin(client)
+    form = {
+        'question': 'What is the capital of France?', 'option_a': 'Lyon', 'option_b': 'Paris',
+        'option_c': 'Nice', 'option_d': 'Lille', 'correct_ans': 'Paris',
+    }
+    response = client.post('/admin/question/add', data=form)
+    assert b'A very similar question already exists' in response.data
+    with app.app_context():
+        assert len(Question.get_all()) == 4
+
+    client.post('/admin/question/add', data={**form, 'allow_duplicate': '1'})
+    with app.app_context():
+        assert len(Question.get_all()) == 5
@@ -0,0 +1,19 @@
+import pytest
+
+def failed_logins(client, count, forwarded_for):
+    statuses = []
+    for n in range(count):
+        response = client.post(
+            '/login', data={'email': f'nobody{n}@example.com', 'password': 'wrong'},
+            headers={'X-Forwarded-For': forwarded_for}, environ_base={'REMOTE_ADDR': '10.0.0.1'}
+        )
+        statuses.append(response.status_code)
+    return statuses
+
+@pytest.mark.parametrize('trusted_proxies, limited', [(0, True), (1, False)])
+def test_login_limit_keys_on_the_forwarded_address_behind_trusted_proxies(make_app, trusted_proxies, limited):
+    app = make_app(TRUSTED_PROXIES=trusted_proxies, LOGIN_IP_BURST=2, LOGIN_IP_PER_MINUTE=1)
+    client = app.test_client()
+    assert failed_logins(client, 2, '203.0.113.1') == [200, 200]
+    # Another client behind the same proxy
+    assert (failed_logins(client, 1, '203.0.113.2') == [429]) == limited
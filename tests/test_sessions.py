@@ -0,0 +1,43 @@
+import pytest
+from database import db_connection
+from conftest import register
+
+def session_ids(app):
+    with app.app_context():
+        with db_connection() as conn:
+            return {row['id'] for row in conn.execute("SELECT id FROM sessions")}
+
+def current_sid(app, client):
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    return app.session_interface._get_signer(app).unsign(cookie.value).decode()
+
+def test_server_session_id_changes_on_login_and_logout(make_app):
+    app = make_app(SESSION_BACKEND='server')
+    client = app.test_client()
+    # A session that exists before logging in, as a planted one would
+    with client.session_transaction() as session:
+        session['seen'] = True
+    before = current_sid(app, client)
+
+    register(client)
+    logged_in = current_sid(app, client)
+    assert logged_in != before
+    assert before not in session_ids(app)
+    assert logged_in in session_ids(app)
+
+    client.get('/logout')
+    after = current_sid(app, client)
+    assert after != logged_in
+    assert session_ids(app) == {after}
+
+@pytest.mark.parametrize('backend', ['cookie', 'server'])
+def test_sessions_signed_with_a_fallback_key_are_accepted(make_app, backend):
+    app = make_app(SESSION_BACKEND=backend, SECRET_KEY='old')
+    client = app.test_client()
+    register(client)
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+
+    rotated = make_app(SESSION_BACKEND=backend, SECRET_KEY='new', SECRET_KEY_FALLBACKS=['old'])
+    client = rotated.test_client()
+    client.set_cookie(rotated.config['SESSION_COOKIE_NAME'], cookie)
+    assert client.get('/dashboard').status_code == 200
@@ -0,0 +1,20 @@
+import pytest
+import writer
+from database import db_connection
+from models import EventLog, Result
+
+@pytest.mark.parametrize('backend', ['sqlite', 'sharded'])
+def test_group_commit_saves_results_with_their_events(make_app, backend):
+    app = make_app(GROUP_COMMIT=True, GROUP_COMMIT_MAX_BATCH=10, RESULTS_BACKEND=backend, RESULTS_SHARDS=2)
+    assert writer.ENABLED and writer.MAX_BATCH == 10
+    with app.app_context():
+        Result.save(1, 3, 4)
+        Result.save(1, 1, 4)
+        assert writer.get_writer()._thread is not None
+        assert Result.get_stats()['total_quizzes'] == 2
+        with db_connection() as conn:
+            events = EventLog.read(conn, 0, 10)
+        assert [(event['type'], event['score']) for event in events] == [('result_saved', 3), ('result_saved', 1)]
+
+def test_group_commit_is_off_by_default(app):
+    assert not writer.ENABLED
@@ -0,0 +1,150 @@
+from concurrent.futures import Future
+import atexit
+import os
+import queue
+import threading
+import time
+from database import get_db_connection
+
+# Whether result writes go through the writer thread, how long it waits for more
+# writes before committing, and the largest batch; set from the GROUP_COMMIT
+# settings by init_app
+ENABLED = False
+FLUSH_INTERVAL = 0.005
+MAX_BATCH = 500
+
+# Acknowledged writes survive power loss; batching keeps the fsync cost per write low
+WRITER_SYNCHRONOUS = 'FULL'
+
+class GroupCommitWriter:
+    """Background writer that commits writes from many requests in one transaction"""
+
+    def __init__(self, flush_interval=None, max_batch=None):
+        self.flush_interval = FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_batch = MAX_BATCH if max_batch is None else max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread if it is not running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Commit everything still queued and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, write, wait=True):
+        """Queue write(conn) for the next batch
+
+        With wait=True, block until the batch is committed and return the
+        write's return value (or raise its error). Otherwise return a Future.
+        """
+        future = Future()
+        self.start()
+        self._queue.put((write, future))
+        if wait:
+            return future.result()
+        return future
+
+    def _run(self):
+        conn = get_db_connection()
+        # Transactions are managed explicitly so each batch is exactly one commit
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA synchronous = {WRITER_SYNCHRONOUS}")
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+
+                # Gather whatever else arrives within the flush interval
+                batch = [item]
+                stopping = False
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                self._flush(conn, batch)
+                if stopping:
+                    break
+        finally:
+            conn.close()
+
+    def _flush(self, conn, batch):
+        """Run a batch of writes in a single transaction"""
+        done = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # A savepoint per write keeps one failing write from aborting the batch
+                conn.execute("SAVEPOINT batch_write")
+                try:
+                    value = write(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO batch_write")
+                    conn.execute("RELEASE batch_write")
+                    future.set_exception(e)
+                else:
+                    conn.execute("RELEASE batch_write")
+                    done.append((future, value))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for write, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Acknowledge only once the batch is committed
+        for future, value in done:
+            future.set_result(value)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _reset_after_fork():
+    # The writer thread does not survive a fork; the child starts its own on first use
+    global _writer, _writer_lock
+    _writer = None
+    _writer_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_writer():
+    """Get the process-wide group commit writer"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+                atexit.register(_writer.stop)
+    return _writer
+
+def init_app(app):
+    """Use the group commit settings of the app"""
+    global ENABLED, FLUSH_INTERVAL, MAX_BATCH
+    ENABLED = bool(app.config.get('GROUP_COMMIT'))
+    FLUSH_INTERVAL = app.config.get('GROUP_COMMIT_INTERVAL', FLUSH_INTERVAL)
+    MAX_BATCH = app.config.get('GROUP_COMMIT_MAX_BATCH', MAX_BATCH)